@@ -39,6 +39,11 @@ class Settings(BaseSettings):
     # 基础配置
     ENVIRONMENT: str = "development"
     DEBUG: bool = False
+    SERVICE_WARMUP_ENABLED: bool = Field(True, description="启动后是否在后台线程中预先初始化各服务")
+
+    # 多进程部署配置组
+    WEB_WORKERS: int = Field(1, description="工作进程数，大于1时由主进程预先准备只读数据后 fork 出工作进程")
+    SHARED_DATA_DIR: str = Field("", description="只读数据快照目录（各工作进程以 mmap 方式共享），为空时使用临时目录")
 
     # API配置组
     OPENAI_API_KEY: str = Field(..., description="OpenAI API密钥")
@@ -57,6 +62,114 @@ class Settings(BaseSettings):
     SYSTEM_PROMPT: str = Field("", description="系统提示词")
     USE_WEB_SEARCH: bool = Field(False, description="是否启用网络搜索")
     USE_INTENT_DETECTION: bool = Field(True, description="是否启用意图识别")
+    MODEL_ROUTING_ENABLED: bool = Field(True, description="是否按意图路由模型与输出长度")
+    ROUTE_OPENAI_LIGHT_MODEL: str = Field("gpt-4o-mini", description="OpenAI 轻量档模型")
+    ROUTE_OPENAI_HEAVY_MODEL: str = Field("gpt-4o", description="OpenAI 重型档模型")
+    ROUTE_DEEPSEEK_LIGHT_MODEL: str = Field("deepseek-chat", description="DeepSeek 轻量档模型")
+    ROUTE_DEEPSEEK_HEAVY_MODEL: str = Field("deepseek-chat", description="DeepSeek 重型档模型")
+    SPECULATIVE_GENERATION_ENABLED: bool = Field(False, description="是否在意图识别期间按通用闲聊提示词推测生成")
+
+    # 请求时间预算配置组
+    CHAT_REQUEST_BUDGET: float = Field(30.0, description="单次聊天请求的总时间预算（秒）")
+    GENERATION_RESERVE_SECONDS: float = Field(12.0, description="为回复生成预留的时间，可选阶段只能使用剩余部分（秒）")
+    INTENT_STAGE_TIMEOUT: float = Field(6.0, description="意图识别阶段的超时上限（秒）")
+    RETRIEVAL_STAGE_TIMEOUT: float = Field(4.0, description="文档检索阶段的超时上限（秒）")
+
+    # 网络搜索配置组
+    WEB_SEARCH_BACKEND: str = Field("duckduckgo", description="网络搜索后端（duckduckgo / local）")
+    WEB_SEARCH_TIMEOUT: float = Field(3.0, description="每个搜索来源的超时时间（秒）")
+    WEB_SEARCH_MAX_RESULTS: int = Field(8, description="每个搜索来源返回的最大结果数")
+    WEB_SEARCH_CACHE_TTL: float = Field(600.0, description="搜索结果缓存有效期（秒）")
+    WEB_SEARCH_CACHE_SIZE: int = Field(1000, description="搜索结果缓存的最大条目数")
+    WEB_SEARCH_DEDUP_THRESHOLD: float = Field(0.6, description="摘要去重的相似度阈值（shingle Jaccard）")
+    WEB_SEARCH_DIGEST_TOKENS: int = Field(800, description="注入提示词的搜索摘要 token 上限")
+
+    # 准入控制配置组
+    ADMISSION_USER_RPM: int = Field(20, description="每个用户每分钟可发起的聊天请求数")
+    ADMISSION_USER_BURST: int = Field(5, description="每个用户允许的突发请求数")
+    ADMISSION_MAX_CONCURRENT: int = Field(32, description="同时处理的聊天请求上限")
+    ADMISSION_MAX_QUEUE: int = Field(64, description="等待处理的聊天请求队列上限")
+    ADMISSION_MAX_WAIT: float = Field(5.0, description="聊天请求最长排队时间（秒）")
+    ADMISSION_LATENCY_TARGET: float = Field(15.0, description="聊天请求目标平均耗时，超过其一半起逐级降级（秒）")
+    ADMISSION_LATENCY_WINDOW: float = Field(30.0, description="计算平均耗时的统计窗口（秒）")
+
+    # 批量聊天配置组
+    BATCH_CHAT_CONCURRENCY: int = Field(16, description="批量聊天任务同时处理的条目数")
+    BATCH_CHAT_MAX_ITEMS: int = Field(10000, description="单个批量聊天任务的最大条目数")
+    BATCH_CHAT_MAX_ACTIVE_JOBS: int = Field(2, description="每个用户同时进行的批量聊天任务上限")
+    BATCH_CHAT_ITEM_BUDGET: float = Field(120.0, description="批量任务中单个条目的时间预算（秒），包含排队等待额度的时间")
+    BATCH_CHAT_JOB_TTL: float = Field(3600.0, description="批量任务结束后保留结果以供续传的时间（秒）")
+
+    # 出站调用调度配置组（每分钟请求数 / token 数）
+    OPENAI_RPM: int = Field(500, description="OpenAI 每分钟请求数上限")
+    OPENAI_TPM: int = Field(200000, description="OpenAI 每分钟 token 数上限")
+    DEEPSEEK_RPM: int = Field(300, description="DeepSeek 每分钟请求数上限")
+    DEEPSEEK_TPM: int = Field(1000000, description="DeepSeek 每分钟 token 数上限")
+    SCHEDULER_MAX_RETRIES: int = Field(3, description="出站调用被限流后的最大重试次数")
+
+    # 向量嵌入配置组
+    EMBEDDING_MODEL: str = Field("text-embedding-ada-002", description="文档与检索使用的向量模型")
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = Field(8.0, description="向量请求合并的最长等待时间（毫秒）")
+    EMBEDDING_BATCH_MAX_SIZE: int = Field(64, description="单次批量向量请求的最大条数")
+
+    # 缓存配置组
+    HISTORY_CACHE_MAX_BYTES: int = Field(64 * 1024 * 1024, description="对话历史缓存容量上限（字节）")
+    CONVERSATION_OWNER_CACHE_TTL: float = Field(300.0, description="对话所有者缓存有效期（秒）")
+    CONVERSATION_OWNER_CACHE_SIZE: int = Field(10000, description="对话所有者缓存最大条目数")
+
+    RESPONSE_CACHE_ENABLED: bool = Field(False, description="是否启用首轮问题的语义回复缓存")
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD: float = Field(0.95, description="语义回复缓存命中的最低余弦相似度")
+    RESPONSE_CACHE_TTL: float = Field(3600.0, description="语义回复缓存有效期（秒）")
+    RESPONSE_CACHE_MAX_ENTRIES: int = Field(2000, description="语义回复缓存最大条目数")
+    RESPONSE_CACHE_MAX_HISTORY: int = Field(0, description="允许使用语义回复缓存的最大历史消息数")
+
+    QUERY_EMBEDDING_CACHE_TTL: float = Field(86400.0, description="查询向量缓存有效期（秒）")
+    QUERY_EMBEDDING_CACHE_SIZE: int = Field(5000, description="查询向量缓存最大条目数")
+    RETRIEVAL_CACHE_TTL: float = Field(300.0, description="文档检索结果缓存有效期（秒），用户文档变更时失效；local 模式下多进程部署时不缓存检索结果")
+    RETRIEVAL_CACHE_SIZE: int = Field(2000, description="文档检索结果缓存最大条目数")
+
+    # 共享缓存配置组
+    CACHE_MODE: str = Field("local", description="缓存层级：local（进程内）/ remote（共享）/ tiered（近端+共享）")
+    CACHE_REMOTE_URL: str = Field("redis://127.0.0.1:6379/0", description="共享缓存地址（Redis 或本地替身服务器）")
+    CACHE_REMOTE_TIMEOUT: float = Field(0.05, description="共享缓存连接与读写超时（秒）")
+    CACHE_REMOTE_POOL_SIZE: int = Field(16, description="共享缓存连接池大小")
+    CACHE_REMOTE_RETRY_INTERVAL: float = Field(5.0, description="共享缓存故障后暂停访问的时间（秒）")
+    CACHE_NEAR_TTL: float = Field(30.0, description="tiered 模式下近端条目的最长有效期（秒）")
+    CACHE_KEY_PREFIX: str = Field("ai_chat", description="共享缓存键前缀")
+
+    # 请求追踪配置组
+    TRACING_EXPORTER: str = Field("none", description="追踪导出器：none（只生成 trace ID）/ console（输出到日志）/ jsonl（写入文件）")
+    TRACING_FILE: str = Field("traces.jsonl", description="jsonl 导出器写入的文件路径")
+
+    # 意图识别缓存与批量配置组
+    INTENT_CACHE_TTL: float = Field(3600.0, description="意图识别结果缓存有效期（秒）")
+    INTENT_CACHE_SIZE: int = Field(10000, description="意图识别结果缓存最大条目数")
+    INTENT_BATCH_MAX_INPUTS: int = Field(2000, description="单次批量意图识别请求的最大文本数")
+    INTENT_BATCH_MAX_ITEMS: int = Field(50, description="打包进一次模型调用的最大文本数")
+    INTENT_BATCH_MAX_TOKENS: int = Field(6000, description="打包的单次模型调用 token 上限（输入 + 输出）")
+    INTENT_BATCH_TEXT_CHARS: int = Field(500, description="批量识别时每条文本截取的最大字符数")
+
+    # 消息持久化配置组
+    MESSAGE_PERSISTENCE_ENABLED: bool = Field(True, description="是否由服务端持久化用户消息和AI回复")
+    MESSAGE_WRITE_BATCH_SIZE: int = Field(50, description="消息批量写入的最大条数")
+    MESSAGE_WRITE_FLUSH_INTERVAL: float = Field(0.5, description="消息批量写入的最长等待时间（秒）")
+    MESSAGE_WRITE_MAX_RETRIES: int = Field(5, description="消息批量写入失败时的最大尝试次数")
+
+    # 文档处理配置组
+    PROGRESS_CHECKPOINT_PERCENT: int = Field(10, description="文档处理进度写入数据库的最小百分比间隔")
+    PROGRESS_CHECKPOINT_SECONDS: float = Field(5.0, description="文档处理进度写入数据库的最长时间间隔（秒）")
+    PROGRESS_POLL_INTERVAL: float = Field(5.0, description="多进程部署时进度订阅在无事件期间轮询数据库检查点的间隔（秒）")
+
+    # 长文档评估配置组
+    BID_EVAL_GROUP_TOKENS: int = Field(6000, description="长投标文件评估时每组内容的 token 上限")
+    BID_EVAL_CONCURRENCY: int = Field(4, description="长投标文件评估的并发模型调用数")
+    BID_EVAL_REDUCE_TOKENS: int = Field(8000, description="汇总评估报告时评审发现的 token 上限，超出时先分批压缩")
+
+    # 投标文件相似度配置组
+    BID_SIMILARITY_THRESHOLD: float = Field(0.85, description="疑似雷同投标文件的相似度阈值（MinHash 估算的 Jaccard）")
+    MINHASH_NUM_PERM: int = Field(128, description="MinHash 签名长度")
+    MINHASH_SHINGLE_SIZE: int = Field(5, description="计算 MinHash 使用的字符 shingle 长度")
+    LSH_BANDS: int = Field(16, description="LSH 分桶的 band 数，须整除签名长度")
 
     # 采购领域配置组
     CHAT_INTENT_ENABLED: bool = Field(True, description="是否启用闲聊意图功能")
@@ -86,6 +199,10 @@ class Settings(BaseSettings):
         default_factory=lambda: str(Path(__file__).parent / "resources/procurement_dicts/risk_rules.json"),
         description="本地风险规则路径"
     )
+    STATUTE_DIR: str = Field(
+        default_factory=lambda: str(Path(__file__).parent / "resources/statutes"),
+        description="本地法规库目录"
+    )
     POLICY_MONITOR_ENDPOINT: str = Field(
         "http://policy-monitor.procurement.internal",
         description="政策监控服务端点"
@@ -165,15 +282,3 @@ try:
 except Exception as e:
     logger.error(f"配置验证失败: {str(e)}")
     raise
-
-# 统一记录所有配置项的来源和信息
-log_config_item("SUPABASE_URL", settings.SUPABASE_URL)
-log_config_item("SUPABASE_SERVICE_KEY", settings.SUPABASE_SERVICE_KEY)
-log_config_item("OPENAI_API_KEY", settings.OPENAI_API_KEY)
-log_config_item("MODEL_NAME", settings.MODEL_NAME)
-log_config_item("MODEL_PROVIDER", settings.MODEL_PROVIDER)
-log_config_item("SERPAPI_API_KEY", settings.SERPAPI_API_KEY)
-log_config_item("SUPABASE_JWT_SECRET", settings.SUPABASE_JWT_SECRET)
-# log_config_item("OCR_API_KEY", settings.OCR_API_KEY)  # 暂时注释掉OCR相关配置
-
-logger.info("所有必需的配置项已加载完成")
@@ -1,25 +1,64 @@
 """
 API 层入口：实现与前端的交互接口，集成 Supabase 和 Chat 服务
 """
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from json.decoder import JSONDecodeError
+from contextlib import asynccontextmanager
+from typing import Optional, Tuple
+from datetime import datetime
+import asyncio
 import logging
+import uuid
 
 # 导入服务模块
 from app.services.supabase import supabase_service
 from app.services.chat_service import chat_service
+from app.services.history_cache import history_cache
+from app.services.message_writer import message_writer, utc_now_iso
+from app.config import settings
 from app.services.document_service import document_service
 from app.services.settings_service import settings_service, SettingsUpdateModel
+from app.services.progress_service import progress_broker, TERMINAL_STATUSES
+from app.services.admission_control import admission_controller, AdmissionRejected
+from app.services.bid_similarity import bid_similarity_service
+from app.services.bid_evaluation import bid_evaluation_service
+from app.services.batch_chat import batch_chat_service, BatchRejected
+from app.services.intentService import intent_service
+from app.services.metrics import metrics_registry, STAGE_LATENCY, CONTENT_TYPE
+from app.services.tracing import TraceMiddleware, tracer
+from app.utils.serialization import dumps, dumps_async, ndjson_line
+from app.utils.deadline import Deadline, DeadlineExceeded
+from app.utils.lazy import warm_up
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    应用生命周期：启动后台写入任务，并在后台线程中预先初始化各服务（不阻塞启动）；
+    关闭时写入剩余消息并释放客户端
+    """
+    message_writer.start()
+    warmup_task = None
+    if settings.SERVICE_WARMUP_ENABLED:
+        warmup_task = asyncio.ensure_future(asyncio.to_thread(warm_up))
+    try:
+        yield
+    finally:
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+        await message_writer.stop()
+        if intent_service.initialized:
+            await intent_service.http_client.aclose()
+
 # 创建FastAPI应用
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -44,6 +83,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 响应压缩（长对话历史、导出等大响应）
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# 请求追踪（最外层，链路覆盖整个请求；trace ID 通过 X-Trace-Id 响应头返回）
+app.add_middleware(TraceMiddleware)
+
+# 历史导出时每次从数据库读取的条数
+HISTORY_EXPORT_PAGE_SIZE = 500
+
 # 请求模型
 class ChatRequest(BaseModel):
     user_id: str
@@ -65,32 +113,220 @@ async def chat_endpoint(
     聊天API端点
     """
     try:
-        # 1. 获取对话历史
-        logger.info(f"获取对话{conversation_id}的历史消息")
-        history = supabase_service.get_conversation_messages(conversation_id, request.user_id)
+        received_at = utc_now_iso()
 
-        # 2. 生成AI回复
-        logger.info(f"正在为用户{request.user_id}生成回复")
-        ai_response = await chat_service.generate_response(request.message, history, request.user_id)
+        # 准入控制：按用户限流、有界排队，过载时关闭部分可选阶段
+        async with admission_controller.admit(request.user_id) as ticket:
+            deadline = Deadline(settings.CHAT_REQUEST_BUDGET, ticket.disabled_stages)
 
-        # 3. 返回响应
+            # 1. 获取对话历史（命中缓存时仅增量拉取新消息）
+            logger.info(f"获取对话{conversation_id}的历史消息")
+            with STAGE_LATENCY.time("history_fetch"), tracer.span("chat.history_fetch") as span:
+                history = await history_cache.get_history(conversation_id, request.user_id)
+                span.set_attribute("messages", len(history))
+
+            # 2. 生成AI回复（整个生成过程受请求时间预算约束）
+            logger.info(f"正在为用户{request.user_id}生成回复")
+            try:
+                ai_response = await asyncio.wait_for(
+                    chat_service.generate_response(request.message, history, request.user_id, deadline),
+                    deadline.remaining()
+                )
+            except (asyncio.TimeoutError, DeadlineExceeded) as e:
+                logger.warning(f"对话{conversation_id}回复生成超时: {str(e)}")
+                raise HTTPException(status_code=504, detail="回复生成超时，请稍后重试")
+
+        # 3. 持久化本轮用户消息与AI回复（写后队列，不阻塞响应）
+        if settings.MESSAGE_PERSISTENCE_ENABLED:
+            message_writer.enqueue(conversation_id, request.message, True, received_at)
+            message_writer.enqueue(conversation_id, ai_response, False)
+
+        # 4. 返回响应，注明因时间预算被跳过的阶段
+        if deadline.skipped_stages:
+            return {"response": ai_response, "skipped_stages": deadline.skipped_stages}
         return {"response": ai_response}
 
+    except AdmissionRejected as e:
+        logger.warning(f"用户{request.user_id}的聊天请求未被准入（{e.status_code}）: {e.reason}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.reason,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
     except Exception as e:
         logger.error(f"处理请求时发生错误: {str(e)}")
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=f"服务器内部错误: {str(e)}")
 
+async def _export_history_ndjson(conversation_id: str):
+    """按页读取对话历史并逐行输出 NDJSON"""
+    after_created_at, after_id = None, None
+    while True:
+        page = await asyncio.to_thread(
+            supabase_service.get_messages_page,
+            conversation_id,
+            HISTORY_EXPORT_PAGE_SIZE,
+            after_created_at,
+            after_id
+        )
+        for message in page:
+            yield ndjson_line(message)
+        if len(page) < HISTORY_EXPORT_PAGE_SIZE:
+            break
+        after_created_at, after_id = page[-1]["created_at"], page[-1]["id"]
+
+async def _batch_ndjson(job, after: int = 0):
+    """将批量任务的结果流编码为 NDJSON"""
+    async for line in batch_chat_service.stream(job, after):
+        yield ndjson_line(line)
+
+def _require_single_worker(feature: str) -> None:
+    """
+    任务与索引只保存在单个工作进程内的功能，多进程部署时不可用
+    （后续请求可能落到未持有该状态的工作进程）
+    """
+    if settings.WEB_WORKERS > 1:
+        raise HTTPException(status_code=503, detail=f"{feature}的状态保存在单个进程内，多进程部署（WEB_WORKERS>1）时不可用")
+
+@app.post("/api/batch/chat")
+async def submit_batch_chat(request: Request):
+    """
+    批量聊天：一次提交多个独立问题，结果按完成顺序以 NDJSON 流式返回
+
+    请求体：{"user_id": "...", "items": [{"id": "...", "message": "..."}], "job_id": "可选，续跑已有任务"}
+    """
+    _require_single_worker("批量聊天任务")
+    try:
+        body = await request.json()
+        user_id = body.get("user_id")
+        if not user_id:
+            raise HTTPException(status_code=400, detail="Missing user_id parameter")
+        job = batch_chat_service.submit(user_id, body.get("items") or [], body.get("job_id"))
+        return StreamingResponse(
+            _batch_ndjson(job),
+            media_type="application/x-ndjson",
+            headers={"X-Batch-Job-Id": job.job_id}
+        )
+
+    except HTTPException:
+        raise
+    except BatchRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.reason)
+    except (JSONDecodeError, ValueError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=f"批量请求格式无效: {str(e)}")
+    except Exception as e:
+        logger.error(f"提交批量聊天任务失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/batch/chat/{job_id}")
+async def resume_batch_chat(
+    job_id: str,
+    user_id: str,
+    after: int = Query(0, ge=0, description="跳过已收到的前 after 条结果")
+):
+    """重新订阅批量任务：先重放已完成的结果，再继续推送后续结果"""
+    _require_single_worker("批量聊天任务")
+    job = batch_chat_service.get(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="批量任务不存在或已过期")
+    return StreamingResponse(
+        _batch_ndjson(job, after),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Job-Id": job.job_id}
+    )
+
+@app.post("/api/intents/batch")
+async def classify_intents_batch(request: Request):
+    """
+    批量意图识别：请求体 {"texts": ["...", ...]}，结果与输入一一对应
+
+    用于历史对话的离线重新标注；多条文本打包为一次模型调用，结果写入意图缓存。
+    """
+    try:
+        body = await request.json()
+        texts = body.get("texts")
+        if not isinstance(texts, list) or not texts or not all(isinstance(t, str) for t in texts):
+            raise HTTPException(status_code=400, detail="texts 必须是非空字符串数组")
+        if len(texts) > settings.INTENT_BATCH_MAX_INPUTS:
+            raise HTTPException(status_code=413, detail=f"单次最多识别{settings.INTENT_BATCH_MAX_INPUTS}条文本")
+
+        results = await intent_service.classify_batch(texts)
+        return Response(
+            content=dumps({"results": [r.model_dump() for r in results]}),
+            media_type="application/json"
+        )
+
+    except HTTPException:
+        raise
+    except (JSONDecodeError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=f"请求格式无效: {str(e)}")
+    except Exception as e:
+        logger.error(f"批量意图识别失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _parse_history_cursor(
+    after_created_at: Optional[str], after_id: Optional[str]
+) -> Tuple[Optional[str], Optional[str]]:
+    """校验键集分页游标并规范化（游标会拼入数据库过滤表达式，不能原样使用）"""
+    if after_id is not None and after_created_at is None:
+        raise HTTPException(status_code=400, detail="分页游标 after_id 需与 after_created_at 同时提供")
+    try:
+        if after_created_at is not None:
+            after_created_at = datetime.fromisoformat(after_created_at.replace("Z", "+00:00")).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="分页游标 after_created_at 不是有效的 ISO 时间")
+    try:
+        if after_id is not None:
+            after_id = str(uuid.UUID(after_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="分页游标 after_id 不是有效的 UUID")
+    return after_created_at, after_id
+
 @app.get("/api/chat/{conversation_id}/history")
-async def get_chat_history(conversation_id: str):
+async def get_chat_history(
+    conversation_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页条数，不传时返回全部消息"),
+    after_created_at: Optional[str] = Query(None, description="分页游标：上一页最后一条消息的 created_at"),
+    after_id: Optional[str] = Query(None, description="分页游标：上一页最后一条消息的 id"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson 为流式导出模式")
+):
     """
     获取对话历史API端点
     """
     try:
-        # 获取对话历史
-        history = supabase_service.get_conversation_messages(conversation_id, None)
-        return history
+        # 流式导出：逐页读取、逐行输出，内存占用与对话长度无关
+        if format == "ndjson":
+            return StreamingResponse(
+                _export_history_ndjson(conversation_id),
+                media_type="application/x-ndjson"
+            )
+
+        # 键集分页
+        if limit is not None:
+            after_created_at, after_id = _parse_history_cursor(after_created_at, after_id)
+            page = await asyncio.to_thread(
+                supabase_service.get_messages_page,
+                conversation_id,
+                limit,
+                after_created_at,
+                after_id
+            )
+            next_cursor = None
+            if len(page) == limit:
+                next_cursor = {
+                    "after_created_at": page[-1]["created_at"],
+                    "after_id": page[-1]["id"]
+                }
+            body = await dumps_async({"messages": page, "next_cursor": next_cursor}, len(page))
+            return Response(content=body, media_type="application/json")
+
+        # 获取完整对话历史
+        history = await asyncio.to_thread(
+            supabase_service.get_conversation_messages, conversation_id, None
+        )
+        return Response(content=await dumps_async(history), media_type="application/json")
     except Exception as e:
         logger.error(f"获取对话历史时发生错误: {str(e)}")
         if isinstance(e, HTTPException):
@@ -104,6 +340,13 @@ async def health_check():
     """
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus 指标：各阶段耗时直方图、重试/缓存命中/提供商错误计数
+    """
+    return Response(metrics_registry.render(), media_type=CONTENT_TYPE)
+
 @app.post("/api/documents/process")
 async def process_document(
     request: Request,
@@ -133,7 +376,9 @@ async def process_document(
             document_service.process_file,
             file_id=file_id,
             file_url=file_url,
-            user_id=user_id
+            user_id=user_id,
+            project_id=body.get("project_id"),
+            bidder=body.get("bidder")
         )
 
         logger.info(f"文档处理任务已添加到后台: file_id={file_id}")
@@ -146,27 +391,241 @@ async def process_document(
         logger.error(f"处理文档请求时发生错误: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _fetch_file_status(file_id: str) -> Optional[dict]:
+    """从 files 表读取文件处理状态"""
+    result = supabase_service.client.table('files') \
+        .select('processing_status,error_message,progress,processed_at') \
+        .eq('id', file_id) \
+        .single() \
+        .execute()
+
+    if not result.data:
+        return None
+
+    return {
+        "status": result.data['processing_status'],
+        "error": result.data.get('error_message'),
+        "progress": result.data.get('progress', 0),
+        "processed_at": result.data.get('processed_at')
+    }
+
 @app.get("/api/documents/{file_id}/status")
 async def get_file_status(file_id: str):
     """获取文件处理状态"""
     try:
-        result = supabase_service.client.table('files') \
-            .select('processing_status,error_message,progress,processed_at') \
-            .eq('id', file_id) \
-            .single() \
-            .execute()
-            
-        if not result.data:
+        status = _fetch_file_status(file_id)
+        if not status:
             raise HTTPException(status_code=404, detail="文件不存在")
-            
+        return status
+    except Exception as e:
+        logger.error(f"获取文件状态失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _sse_event(data: dict) -> bytes:
+    """编码一条 SSE 事件"""
+    return b"data: " + dumps(data) + b"\n\n"
+
+def _fetch_active_files(user_id: str) -> list:
+    """从 files 表读取用户处理中的文件状态"""
+    result = supabase_service.client.table('files') \
+        .select('id,processing_status,error_message,progress') \
+        .eq('user_id', user_id) \
+        .in_('processing_status', ['pending', 'processing']) \
+        .execute()
+    return [
+        {"file_id": row['id'], "status": row['processing_status'],
+         "error": row.get('error_message'), "progress": row.get('progress', 0)}
+        for row in result.data or []
+    ]
+
+def _poll_progress(file_id: Optional[str], user_id: Optional[str], active: set) -> list:
+    """
+    从数据库轮询进度检查点（多进程部署时文件可能由其他工作进程处理，其进度事件不会发布到本进程）
+
+    用户级订阅跟踪处理中的文件，文件离开处理中状态后再单独读取一次，以推送其终态。
+    """
+    if file_id:
+        snapshot = _fetch_file_status(file_id)
+        return [{"file_id": file_id, **snapshot}] if snapshot else []
+    events = _fetch_active_files(user_id)
+    current = {event["file_id"] for event in events}
+    for finished_id in active - current:
+        snapshot = _fetch_file_status(finished_id)
+        if snapshot:
+            events.append({"file_id": finished_id, **snapshot})
+    active.clear()
+    active.update(current)
+    return events
+
+async def _progress_event_stream(key: str, file_id: Optional[str] = None, user_id: Optional[str] = None):
+    """
+    将进度事件编码为 SSE 流；文件级订阅在终态后结束
+
+    多进程部署（WEB_WORKERS > 1）时，无事件期间按 PROGRESS_POLL_INTERVAL 轮询数据库中的检查点，
+    由其他工作进程处理的文件也能推送进度与终态。
+    """
+    poll = settings.WEB_WORKERS > 1
+    # 文件ID -> 最近推送的 (状态, 进度)，本进程事件与轮询结果去重
+    pushed = {}
+    active = set()
+
+    def is_new(event: dict) -> bool:
+        state = (event.get("status"), event.get("progress"))
+        if pushed.get(event.get("file_id")) == state:
+            return False
+        pushed[event.get("file_id")] = state
+        return True
+
+    # 本进程内没有该文件的进度时，先推送数据库中的检查点状态
+    if file_id and progress_broker.latest(file_id) is None:
+        try:
+            snapshot = await asyncio.to_thread(_fetch_file_status, file_id)
+        except Exception as e:
+            logger.warning(f"读取文件状态快照失败: {str(e)}")
+            snapshot = None
+        if snapshot:
+            event = {"file_id": file_id, **snapshot}
+            is_new(event)
+            yield _sse_event(event)
+            if snapshot["status"] in TERMINAL_STATUSES:
+                return
+
+    heartbeat = settings.PROGRESS_POLL_INTERVAL if poll else 15.0
+    async for event in progress_broker.subscribe(key, heartbeat=heartbeat):
+        if event is None:
+            if poll:
+                try:
+                    polled = await asyncio.to_thread(_poll_progress, file_id, user_id, active)
+                except Exception as e:
+                    logger.warning(f"轮询文件进度失败: {str(e)}")
+                    polled = []
+                for polled_event in polled:
+                    if not is_new(polled_event):
+                        continue
+                    yield _sse_event(polled_event)
+                    if file_id and polled_event["status"] in TERMINAL_STATUSES:
+                        return
+            yield b": keep-alive\n\n"
+            continue
+        if not is_new(event):
+            continue
+        yield _sse_event(event)
+        if file_id and event.get("status") in TERMINAL_STATUSES:
+            return
+
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.get("/api/documents/{file_id}/progress")
+async def stream_file_progress(file_id: str):
+    """以 SSE 推送单个文件的处理进度，处理完成或失败后结束"""
+    return StreamingResponse(
+        _progress_event_stream(f"file:{file_id}", file_id),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS
+    )
+
+@app.get("/api/documents/progress/stream")
+async def stream_user_progress(user_id: str):
+    """以 SSE 推送某用户所有文件的处理进度"""
+    return StreamingResponse(
+        _progress_event_stream(f"user:{user_id}", user_id=user_id),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS
+    )
+
+@app.post("/api/risk/bid-analysis")
+async def analyze_bid_risk(request: Request, benchmark_price: Optional[float] = Query(None, gt=0)):
+    """
+    投标表批量风险分析
+
+    请求体为 CSV（Content-Type: text/csv，每行一个投标人），或 JSON：
+    {"bidders": [...], "items": [...], "similar_pairs": [...], "benchmark_price": 123.4}
+    """
+    # pandas 导入较慢，仅在使用该接口时导入
+    import pandas as pd
+    from app.services.bid_risk_service import bid_risk_service
+
+    try:
+        if request.headers.get("content-type", "").startswith("text/csv"):
+            content = (await request.body()).decode("utf-8-sig")
+            bidders = bid_risk_service.parse_csv(content)
+            items, similar_pairs = None, None
+        else:
+            body = await request.json()
+            if not isinstance(body, dict):
+                raise HTTPException(status_code=400, detail="请求体必须是JSON对象")
+            bidders = pd.DataFrame(body.get("bidders") or [])
+            items = pd.DataFrame(body["items"]) if body.get("items") else None
+            similar_pairs = pd.DataFrame(body["similar_pairs"]) if body.get("similar_pairs") else None
+            benchmark_price = benchmark_price or body.get("benchmark_price")
+
+        if bidders.empty:
+            raise HTTPException(status_code=400, detail="投标表为空")
+        return Response(
+            content=dumps(bid_risk_service.analyze(bidders, items, similar_pairs, benchmark_price)),
+            media_type="application/json"
+        )
+
+    except HTTPException:
+        raise
+    except (JSONDecodeError, ValueError, KeyError) as e:
+        logger.error(f"投标表解析失败: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"投标表格式无效: {str(e)}")
+    except Exception as e:
+        logger.error(f"投标风险分析失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _evaluation_event_stream(file_id: str, user_id: str):
+    """将长文档评估的进度事件编码为 SSE 流"""
+    try:
+        async for event in bid_evaluation_service.evaluate(file_id, user_id):
+            yield _sse_event({"file_id": file_id, **event})
+    except Exception as e:
+        logger.error(f"投标文件评估失败: {str(e)}")
+        yield _sse_event({"file_id": file_id, "stage": "error", "error": str(e)})
+
+@app.post("/api/evaluations/bid")
+async def evaluate_bid_document(request: Request):
+    """
+    按 file_id 评估已处理的长投标文件，以 SSE 推送分组评估进度，最后一条事件包含评估报告
+
+    请求体：{"file_id": "...", "user_id": "..."}
+    """
+    try:
+        body = await request.json()
+    except JSONDecodeError:
+        raise HTTPException(status_code=400, detail="无效的JSON格式")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="请求体必须是JSON对象")
+
+    file_id = body.get("file_id")
+    user_id = body.get("user_id")
+    if not file_id or not user_id:
+        raise HTTPException(status_code=400, detail="缺少必要参数 file_id 或 user_id")
+
+    return StreamingResponse(
+        _evaluation_event_stream(file_id, user_id),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS
+    )
+
+@app.get("/api/projects/{project_id}/similar-bids")
+async def get_similar_bids(project_id: str, threshold: Optional[float] = Query(None, gt=0, le=1)):
+    """
+    返回项目内疑似雷同的投标文件对（文件级或分块级相似度不低于阈值）
+
+    结果中的 bidder_a / bidder_b / similarity 可直接作为投标表风险分析的 similar_pairs。
+    """
+    _require_single_worker("投标文件相似度索引")
+    try:
+        pairs = await asyncio.to_thread(bid_similarity_service.similar_pairs, project_id, threshold)
         return {
-            "status": result.data['processing_status'],
-            "error": result.data.get('error_message'),
-            "progress": result.data.get('progress', 0),
-            "processed_at": result.data.get('processed_at')
+            "project_id": project_id,
+            "document_count": bid_similarity_service.document_count(project_id),
+            "pairs": pairs
         }
     except Exception as e:
-        logger.error(f"获取文件状态失败: {str(e)}")
+        logger.error(f"查询相似投标文件失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/")
@@ -191,7 +650,10 @@ async def get_settings():
 async def update_settings(settings: SettingsUpdateModel):
     """
     更新系统设置
+
+    设置只修改处理本请求的工作进程，多进程部署时不可用
     """
+    _require_single_worker("运行时设置")
     try:
         return await settings_service.update_settings(settings)
     except ValueError as e:
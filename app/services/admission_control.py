@@ -0,0 +1,202 @@
+"""
+准入控制模块：/api/chat 的按用户限流、有界排队与自适应降级
+
+- 每个用户一个令牌桶，超出速率返回 429；
+- 全局并发槽位用完后进入有界队列，队列已满或等待超时返回 503；
+- 按最近请求的平均耗时逐级关闭可选阶段（网络搜索 → 文档检索 → 意图识别），
+  仍然过载时不再排队，直接返回 503。拒绝响应均带 Retry-After。
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 按顺序逐级关闭的可选阶段（越靠前越先关闭）
+DEGRADABLE_STAGES = ("web_search", "retrieval", "intent_detection")
+
+# 用户令牌桶数量超过该值时清理已回满的桶
+MAX_TRACKED_USERS = 10000
+
+
+class AdmissionRejected(Exception):
+    """请求未被准入"""
+
+    def __init__(self, status_code: int, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+class _UserBucket:
+    """单个用户的令牌桶"""
+
+    def __init__(self, per_minute: int, burst: int):
+        self.capacity = float(burst)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def take(self) -> float:
+        """取一个令牌，成功返回 0，否则返回需等待的秒数"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    @property
+    def full(self) -> bool:
+        elapsed = time.monotonic() - self.updated_at
+        return self.tokens + elapsed * self.rate >= self.capacity
+
+
+class AdmissionTicket:
+    """准入凭证，携带本次请求需要关闭的可选阶段"""
+
+    def __init__(self, disabled_stages: List[str]):
+        self.disabled_stages = disabled_stages
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        user_rpm: int = None,
+        user_burst: int = None,
+        max_concurrent: int = None,
+        max_queue: int = None,
+        max_wait: float = None,
+        latency_target: float = None
+    ):
+        self.user_rpm = user_rpm or settings.ADMISSION_USER_RPM
+        self.user_burst = user_burst or settings.ADMISSION_USER_BURST
+        self.max_concurrent = max_concurrent or settings.ADMISSION_MAX_CONCURRENT
+        self.max_queue = max_queue if max_queue is not None else settings.ADMISSION_MAX_QUEUE
+        self.max_wait = max_wait or settings.ADMISSION_MAX_WAIT
+        self.latency_target = latency_target or settings.ADMISSION_LATENCY_TARGET
+        self._buckets: Dict[str, _UserBucket] = {}
+        self._inflight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # 最近完成请求的 (完成时刻, 耗时)
+        self._latencies: Deque[Tuple[float, float]] = deque()
+        self.admitted = 0
+        self.rejected_rate_limited = 0
+        self.rejected_overloaded = 0
+
+    @asynccontextmanager
+    async def admit(self, user_id: str) -> AsyncIterator[AdmissionTicket]:
+        """
+        申请处理一个聊天请求，退出上下文时释放槽位并记录耗时
+
+        Raises:
+            AdmissionRejected: 用户超出速率（429）或服务过载（503）
+        """
+        self._check_user_rate(user_id)
+        await self._acquire_slot()
+        started = time.monotonic()
+        self.admitted += 1
+        try:
+            yield AdmissionTicket(self.disabled_stages())
+        finally:
+            self._record_latency(time.monotonic() - started)
+            self._release_slot()
+
+    def disabled_stages(self) -> List[str]:
+        """按当前负载需要关闭的可选阶段"""
+        load = self.average_latency() / self.latency_target
+        # 平均耗时达到目标的 40%、60%、80% 时依次多关闭一个阶段
+        thresholds = (0.4, 0.6, 0.8)
+        return [stage for stage, threshold in zip(DEGRADABLE_STAGES, thresholds) if load >= threshold]
+
+    def average_latency(self) -> float:
+        """统计窗口内已完成请求的平均耗时，窗口内无请求时为 0"""
+        self._expire_latencies()
+        if not self._latencies:
+            return 0.0
+        return sum(latency for _, latency in self._latencies) / len(self._latencies)
+
+    def _check_user_rate(self, user_id: str) -> None:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_USERS:
+                self._buckets = {uid: b for uid, b in self._buckets.items() if not b.full}
+            bucket = _UserBucket(self.user_rpm, self.user_burst)
+            self._buckets[user_id] = bucket
+        wait = bucket.take()
+        if wait > 0:
+            self.rejected_rate_limited += 1
+            raise AdmissionRejected(429, wait, "请求过于频繁，请稍后再试")
+
+    async def _acquire_slot(self) -> None:
+        if self._inflight < self.max_concurrent and not self._waiters:
+            self._inflight += 1
+            return
+
+        # 已超过目标耗时说明排队只会更慢，直接拒绝
+        if self.average_latency() >= self.latency_target:
+            self.rejected_overloaded += 1
+            raise AdmissionRejected(503, self.latency_target, "服务繁忙，请稍后再试")
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_overloaded += 1
+            raise AdmissionRejected(503, self.max_wait, "服务繁忙，请稍后再试")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            # 槽位由 _release_slot 直接转交，future 完成即已持有槽位
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done():
+                # 超时与转交同时发生时已持有槽位；请求被取消则归还
+                if isinstance(e, asyncio.CancelledError):
+                    self._release_slot()
+                    raise
+                return
+            future.cancel()
+            self._waiters.remove(future)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected_overloaded += 1
+            logger.warning(f"聊天请求排队超过{self.max_wait:.1f}秒，拒绝处理")
+            raise AdmissionRejected(503, self.max_wait, "服务繁忙，请稍后再试")
+
+    def _release_slot(self) -> None:
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self._inflight -= 1
+
+    def _record_latency(self, seconds: float) -> None:
+        self._latencies.append((time.monotonic(), seconds))
+        self._expire_latencies()
+
+    def _expire_latencies(self) -> None:
+        cutoff = time.monotonic() - settings.ADMISSION_LATENCY_WINDOW
+        while self._latencies and self._latencies[0][0] < cutoff:
+            self._latencies.popleft()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "inflight": self._inflight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected_rate_limited": self.rejected_rate_limited,
+            "rejected_overloaded": self.rejected_overloaded,
+            "average_latency": round(self.average_latency(), 3),
+            "disabled_stages": self.disabled_stages(),
+        }
+
+
+# 全局实例
+admission_controller = AdmissionController()
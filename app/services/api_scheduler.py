@@ -0,0 +1,238 @@
+"""
+外部 API 调度模块：统一调度对 LLM / 向量接口的出站调用
+
+按提供商维护每分钟请求数（RPM）与每分钟 token 数（TPM）令牌桶，排队的调用按优先级
+（交互式请求优先于后台任务）依次放行；收到 429 时遵循 Retry-After 暂停该提供商的全部调用。
+"""
+import asyncio
+import heapq
+import logging
+import time
+from contextvars import ContextVar
+from enum import IntEnum
+from itertools import count
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.metrics import OUTBOUND_QUEUE_WAIT, PROVIDER_ERRORS, RETRIES
+
+logger = logging.getLogger(__name__)
+
+# 未返回 Retry-After 时的默认暂停时间（秒）
+DEFAULT_RETRY_AFTER = 2.0
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # 聊天、意图识别等用户正在等待的调用
+    BACKGROUND = 1   # 文档向量化等后台任务
+
+
+# 当前任务的最低调度优先级：批量任务中的调用即使声明为交互式也按后台任务排队
+priority_floor: ContextVar[Priority] = ContextVar("priority_floor", default=Priority.INTERACTIVE)
+
+
+class RateLimitExceeded(Exception):
+    """重试次数耗尽后仍被限流"""
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本 token 数：ASCII 约 4 字符/token，中文等约 1 字符/token"""
+    if not text:
+        return 0
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """判断异常是否为 429 限流错误"""
+    if getattr(exc, "status_code", None) == 429:
+        return True
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None) == 429
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """从限流异常的响应头中读取 Retry-After（秒）"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+class _TokenBucket:
+    """每分钟额度的令牌桶"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """获得 amount 额度还需等待的秒数"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class _ProviderState:
+    def __init__(self, rpm: int, tpm: int):
+        self.requests = _TokenBucket(rpm)
+        self.tokens = _TokenBucket(tpm)
+        self.blocked_until = 0.0
+        # (优先级, 序号, token 数, future)
+        self.queue: List[Tuple[int, int, int, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.granted = 0
+        self.rate_limited = 0
+        self.total_wait = 0.0
+
+
+class OutboundScheduler:
+    def __init__(self, limits: Optional[Dict[str, Tuple[int, int]]] = None, max_retries: int = None):
+        """
+        Args:
+            limits: 提供商 -> (RPM, TPM)，默认读取配置
+            max_retries: 被限流后的最大重试次数
+        """
+        self.limits = limits or {
+            "openai": (settings.OPENAI_RPM, settings.OPENAI_TPM),
+            "deepseek": (settings.DEEPSEEK_RPM, settings.DEEPSEEK_TPM),
+        }
+        self.max_retries = max_retries if max_retries is not None else settings.SCHEDULER_MAX_RETRIES
+        self._providers: Dict[str, _ProviderState] = {}
+        self._seq = count()
+
+    def partition(self, workers: int) -> None:
+        """多进程部署时每个工作进程只使用 1/workers 的提供商额度，合计不超过账户限额"""
+        self.limits = {
+            provider: (max(1, rpm // workers), max(1, tpm // workers))
+            for provider, (rpm, tpm) in self.limits.items()
+        }
+        self._providers.clear()
+
+    def _state(self, provider: str) -> _ProviderState:
+        state = self._providers.get(provider)
+        if state is None:
+            rpm, tpm = self.limits.get(provider, self.limits["openai"])
+            state = _ProviderState(rpm, tpm)
+            self._providers[provider] = state
+        return state
+
+    async def acquire(self, provider: str, tokens: int = 1, priority: Priority = Priority.INTERACTIVE) -> None:
+        """排队等待指定提供商的调用额度"""
+        state = self._state(provider)
+        priority = max(priority, priority_floor.get())
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(state.queue, (int(priority), next(self._seq), max(tokens, 1), future))
+        enqueued_at = time.monotonic()
+        self._pump(provider)
+        await future
+        waited = time.monotonic() - enqueued_at
+        state.total_wait += waited
+        OUTBOUND_QUEUE_WAIT.observe(waited, provider)
+
+    def block(self, provider: str, seconds: float) -> None:
+        """暂停提供商的调用（收到 429 时调用）"""
+        state = self._state(provider)
+        state.blocked_until = max(state.blocked_until, time.monotonic() + seconds)
+        # 已消耗的额度不代表真实余量，清空请求桶避免解除暂停后瞬间涌出
+        state.requests.tokens = 0.0
+        logger.warning(f"{provider} 触发限流，暂停调用{seconds:.1f}秒")
+
+    async def run(
+        self,
+        provider: str,
+        fn: Callable[[], Awaitable[Any]],
+        tokens: int = 1,
+        priority: Priority = Priority.INTERACTIVE
+    ) -> Any:
+        """
+        在额度内执行一次出站调用，被限流时按 Retry-After 暂停后重试
+
+        Args:
+            provider: 提供商名称（openai / deepseek）
+            fn: 返回协程的无参函数
+            tokens: 估算的 token 消耗（输入 + 最大输出）
+            priority: 调用优先级
+
+        Returns:
+            fn 的执行结果
+        """
+        state = self._state(provider)
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(provider, tokens, priority)
+            try:
+                return await fn()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    PROVIDER_ERRORS.inc(provider, "error")
+                    raise
+                state.rate_limited += 1
+                PROVIDER_ERRORS.inc(provider, "rate_limited")
+                self.block(provider, retry_after_seconds(e) or DEFAULT_RETRY_AFTER * (attempt + 1))
+                if attempt == self.max_retries:
+                    raise RateLimitExceeded(f"{provider} 限流重试{self.max_retries}次后仍失败: {str(e)}") from e
+                RETRIES.inc(provider, "rate_limit")
+
+    def _pump(self, provider: str) -> None:
+        """按优先级放行队首调用，额度不足时在可用时刻再次调度"""
+        state = self._providers[provider]
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+
+        while state.queue:
+            _, _, tokens, future = state.queue[0]
+            if future.done():
+                heapq.heappop(state.queue)
+                continue
+
+            now = time.monotonic()
+            wait = max(
+                state.blocked_until - now,
+                state.requests.wait_time(1, now),
+                state.tokens.wait_time(tokens, now)
+            )
+            if wait > 0:
+                state.timer = asyncio.get_running_loop().call_later(wait, self._pump, provider)
+                return
+
+            heapq.heappop(state.queue)
+            state.requests.consume(1)
+            state.tokens.consume(tokens)
+            state.granted += 1
+            future.set_result(None)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """返回各提供商的调度统计"""
+        return {
+            provider: {
+                "queued": sum(1 for item in state.queue if not item[3].done()),
+                "granted": state.granted,
+                "rate_limited": state.rate_limited,
+                "total_wait_seconds": round(state.total_wait, 3),
+            }
+            for provider, state in self._providers.items()
+        }
+
+
+# 全局实例
+api_scheduler = OutboundScheduler()
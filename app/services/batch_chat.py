@@ -0,0 +1,214 @@
+"""
+批量聊天任务：一次提交大量独立问题，有界并发处理，结果按完成顺序以 NDJSON 返回
+
+各条目直接调用 ChatService.generate_response（无历史消息），因此与在线聊天共享意图识别、
+查询向量与语义回复缓存，相同问题的条目合并为一次生成。条目的出站调用按后台优先级排队，
+吞吐由出站调度器的提供商额度决定，且不挤占在线聊天。
+
+任务保存在进程内，与发起请求的连接解耦：连接断开后任务继续执行，
+客户端可凭任务 ID 重新订阅，已完成的结果会先全部重放。
+"""
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.config import settings
+from app.services.api_scheduler import Priority, priority_floor
+from app.services.chat_service import chat_service
+from app.utils.deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+
+class BatchRejected(Exception):
+    """批量任务提交被拒绝"""
+
+    def __init__(self, status_code: int, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+
+
+@dataclass
+class BatchJob:
+    job_id: str
+    user_id: str
+    items: Dict[str, str]  # 条目 ID -> 问题
+    results: List[Dict] = field(default_factory=list)  # 按完成顺序
+    started_ids: set = field(default_factory=set)
+    done_ids: set = field(default_factory=set)
+    status: str = "running"
+    finished_at: Optional[float] = None
+    tasks: List[asyncio.Task] = field(default_factory=list)
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+
+    def summary(self) -> Dict:
+        failed = sum(1 for r in self.results if r["status"] == "error")
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total": len(self.items),
+            "completed": len(self.results),
+            "succeeded": len(self.results) - failed,
+            "failed": failed,
+        }
+
+
+class BatchChatService:
+    def __init__(self, concurrency: int = None, max_items: int = None, job_ttl: float = None):
+        self.concurrency = concurrency or settings.BATCH_CHAT_CONCURRENCY
+        self.max_items = max_items or settings.BATCH_CHAT_MAX_ITEMS
+        self.job_ttl = job_ttl if job_ttl is not None else settings.BATCH_CHAT_JOB_TTL
+        self._jobs: Dict[str, BatchJob] = {}
+
+    def _prune(self) -> None:
+        """清理已结束且超过保留时间的任务"""
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.job_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _normalize_items(items: List[Dict]) -> Dict[str, str]:
+        normalized: Dict[str, str] = {}
+        for i, item in enumerate(items):
+            if isinstance(item, str):
+                item = {"message": item}
+            message = (item.get("message") or "").strip()
+            if not message:
+                raise ValueError(f"第{i + 1}个条目缺少 message")
+            item_id = str(item.get("id", i))
+            if item_id in normalized:
+                raise ValueError(f"条目 ID 重复: {item_id}")
+            normalized[item_id] = message
+        return normalized
+
+    def get(self, job_id: str, user_id: str) -> Optional[BatchJob]:
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def submit(self, user_id: str, items: List[Dict], job_id: Optional[str] = None) -> BatchJob:
+        """
+        提交批量任务；指定已有任务 ID 时续跑该任务，只补充尚未提交的条目
+
+        新任务的 ID 总是由服务端生成，不使用客户端提供的 ID。
+
+        Raises:
+            ValueError: 条目为空、缺少内容或 ID 重复
+            BatchRejected: 条目过多，同一用户进行中的任务过多，或要续跑的任务不存在（不属于该用户）
+        """
+        self._prune()
+        normalized = self._normalize_items(items) if items else {}
+
+        if job_id:
+            job = self.get(job_id, user_id)
+            if job is None:
+                raise BatchRejected(404, "批量任务不存在或已过期")
+            new_items = {k: v for k, v in normalized.items() if k not in job.items}
+            if len(job.items) + len(new_items) > self.max_items:
+                raise BatchRejected(413, f"单个批量任务最多{self.max_items}个条目")
+            job.items.update(new_items)
+            if new_items:
+                job.status = "running"
+                job.finished_at = None
+                job.tasks.append(asyncio.ensure_future(self._run(job)))
+            logger.info(f"续跑批量任务{job.job_id}: 新增{len(new_items)}个条目")
+            return job
+
+        if not normalized:
+            raise ValueError("批量任务没有条目")
+        if len(normalized) > self.max_items:
+            raise BatchRejected(413, f"单个批量任务最多{self.max_items}个条目")
+        running = sum(1 for j in self._jobs.values() if j.user_id == user_id and j.status == "running")
+        if running >= settings.BATCH_CHAT_MAX_ACTIVE_JOBS:
+            raise BatchRejected(429, f"进行中的批量任务已达上限（{settings.BATCH_CHAT_MAX_ACTIVE_JOBS}个）")
+
+        job = BatchJob(job_id=uuid.uuid4().hex, user_id=user_id, items=normalized)
+        self._jobs[job.job_id] = job
+        job.tasks.append(asyncio.ensure_future(self._run(job)))
+        logger.info(f"创建批量任务{job.job_id}: 用户{user_id}，{len(normalized)}个条目")
+        return job
+
+    async def _run_item(self, job: BatchJob, item_id: str, message: str) -> Dict:
+        deadline = Deadline(settings.BATCH_CHAT_ITEM_BUDGET)
+        try:
+            response = await asyncio.wait_for(
+                chat_service.generate_response(message, [], job.user_id, deadline),
+                deadline.remaining()
+            )
+            result = {"id": item_id, "status": "ok", "response": response}
+            if deadline.skipped_stages:
+                result["skipped_stages"] = deadline.skipped_stages
+            return result
+        except asyncio.TimeoutError:
+            return {"id": item_id, "status": "error", "error": "回复生成超时"}
+        except Exception as e:
+            logger.error(f"批量任务{job.job_id}条目{item_id}失败: {str(e)}")
+            return {"id": item_id, "status": "error", "error": str(e)}
+
+    async def _run(self, job: BatchJob) -> None:
+        """有界并发处理任务中尚未完成的条目"""
+        # 本任务内的出站调用按后台优先级排队，让位于在线聊天
+        priority_floor.set(Priority.BACKGROUND)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def worker(item_id: str, message: str) -> None:
+            async with semaphore:
+                result = await self._run_item(job, item_id, message)
+            async with job.changed:
+                job.results.append(result)
+                job.done_ids.add(item_id)
+                job.changed.notify_all()
+
+        # 续跑时新增的条目由另一轮处理，每个条目只处理一次
+        pending = [(k, v) for k, v in job.items.items() if k not in job.started_ids]
+        job.started_ids.update(k for k, _ in pending)
+        started = time.monotonic()
+        try:
+            await asyncio.gather(*(worker(k, v) for k, v in pending))
+            if len(job.done_ids) == len(job.items):
+                job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        finally:
+            if job.status != "running":
+                job.finished_at = time.monotonic()
+            async with job.changed:
+                job.changed.notify_all()
+            elapsed = time.monotonic() - started
+            logger.info(
+                f"批量任务{job.job_id}结束({job.status}): {len(pending)}个条目，"
+                f"耗时{elapsed:.1f}秒（{len(pending) / max(elapsed, 1e-6):.1f}条/秒）"
+            )
+
+    async def stream(self, job: BatchJob, after: int = 0) -> AsyncIterator[Dict]:
+        """
+        先输出任务概况，再按完成顺序输出结果（从第 after 条开始，已完成的先重放），最后输出任务汇总
+        """
+        yield {"job_id": job.job_id, "total": len(job.items), "completed": len(job.results)}
+        position = after
+        while True:
+            async with job.changed:
+                while position >= len(job.results) and job.status == "running":
+                    await job.changed.wait()
+                ready = job.results[position:]
+                finished = job.status != "running"
+            for result in ready:
+                yield result
+            position += len(ready)
+            if finished and position >= len(job.results):
+                break
+        yield job.summary()
+
+
+# 全局实例
+batch_chat_service = BatchChatService()
@@ -0,0 +1,243 @@
+"""
+长投标文件的 map-reduce 评估
+
+按入库的文档块将整份投标文件分成若干组（每组不超过 BID_EVAL_GROUP_TOKENS），
+在并发上限内对每组按四个评估维度提取发现（map），再将各组发现合并为一份评估报告（reduce）。
+发现过多放不进一次 reduce 时，先按维度分批压缩后再合并。评估过程以事件流的形式推送进度。
+"""
+import asyncio
+import json
+import logging
+import re
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.config import settings
+from app.services.api_scheduler import api_scheduler, estimate_tokens, Priority
+from app.services.chat_service import chat_service, EVALUATION_DIMENSIONS, DEFAULT_OUTPUT_TOKENS
+from app.services.intentService import CoreIntentType
+from app.services.model_router import model_router
+from app.services.supabase import supabase_service
+
+logger = logging.getLogger(__name__)
+
+# 无法按维度解析的 map 输出归入该类
+OTHER_FINDINGS = "其他发现"
+# 压缩发现的最大轮数，防止模型输出不收敛
+MAX_REDUCE_ROUNDS = 3
+
+_MAP_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "你是政府采购投标文件评审专家。"),
+    ("human", "\n".join((
+        "以下是一份投标文件的第{index}/{total}部分。请仅根据这部分内容，按以下评估维度列出具体发现：",
+        "{dimensions}",
+        "只输出一个 JSON 对象，键为评估维度，值为发现列表（字符串数组，引用原文要点，没有发现则为空数组）。",
+        "文件内容：",
+        "{content}"
+    )))
+])
+
+_CONDENSE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "你是政府采购投标文件评审专家。"),
+    ("human", "\n".join((
+        "以下是对同一份投标文件“{dimension}”维度的多条评审发现，请合并重复项、保留具体依据，",
+        "压缩为不超过{limit}条要点，每行一条，以“- ”开头：",
+        "{findings}"
+    )))
+])
+
+_REDUCE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "你是政府采购投标文件评审专家。"),
+    ("human", "\n".join((
+        "以下是对一份投标文件分段评审得到的发现（共{total}部分），请汇总为一份完整的评估报告。",
+        "报告按以下维度分节，每节给出结论和主要依据，最后给出总体评价：",
+        "{dimensions}",
+        "评审发现：",
+        "{findings}"
+    )))
+])
+
+
+def group_chunks(chunks: List[str], max_tokens: int) -> List[str]:
+    """按顺序将文档块合并为不超过 max_tokens 的组（单个超长文档块单独成组）"""
+    groups: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for chunk in chunks:
+        tokens = estimate_tokens(chunk)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(chunk)
+        current_tokens += tokens
+    if current:
+        groups.append("\n".join(current))
+    return groups
+
+
+def parse_findings(text: str) -> Dict[str, List[str]]:
+    """解析 map 输出的 JSON 对象；无法解析时整体归入“其他发现”"""
+    match = re.search(r"\{.*\}", text, re.S)
+    if match:
+        try:
+            data = json.loads(match.group(0))
+            findings = {}
+            for dimension, items in data.items():
+                if isinstance(items, str):
+                    items = [items]
+                items = [str(item).strip() for item in items or [] if str(item).strip()]
+                key = dimension if dimension in EVALUATION_DIMENSIONS else OTHER_FINDINGS
+                findings.setdefault(key, []).extend(items)
+            return findings
+        except (json.JSONDecodeError, AttributeError):
+            pass
+    text = text.strip()
+    return {OTHER_FINDINGS: [text]} if text else {}
+
+
+class BidEvaluationService:
+    def __init__(self, model: Optional[BaseChatModel] = None, concurrency: int = None,
+                 group_tokens: int = None, reduce_tokens: int = None):
+        # 未指定模型时按投标评估意图的路由创建
+        self._model = model
+        self.concurrency = concurrency or settings.BID_EVAL_CONCURRENCY
+        self.group_tokens = group_tokens or settings.BID_EVAL_GROUP_TOKENS
+        self.reduce_tokens = reduce_tokens or settings.BID_EVAL_REDUCE_TOKENS
+
+    def _route(self):
+        return model_router.resolve_intent(CoreIntentType.EVALUATE_BID.value)
+
+    async def _invoke(self, prompt: ChatPromptTemplate, variables: Dict[str, object]) -> str:
+        """经出站调度器调用一次模型（按后台优先级排队，长文件评估的大量调用让位于在线聊天）"""
+        route = self._route()
+        model = self._model or chat_service._get_model(route)
+        chain = prompt | model
+        tokens = (
+            sum(estimate_tokens(str(v)) for v in variables.values())
+            + (route.max_tokens or DEFAULT_OUTPUT_TOKENS)
+        )
+        response = await api_scheduler.run(
+            route.provider,
+            lambda: chain.ainvoke(variables),
+            tokens=tokens,
+            priority=Priority.BACKGROUND
+        )
+        return getattr(response, "content", str(response))
+
+    async def _map_group(self, semaphore: asyncio.Semaphore, index: int, total: int,
+                         content: str) -> Tuple[int, Optional[Dict[str, List[str]]], Optional[Exception]]:
+        """评估一组内容，返回 (组序号, 发现, 异常)"""
+        try:
+            async with semaphore:
+                text = await self._invoke(_MAP_PROMPT, {
+                    "index": index + 1,
+                    "total": total,
+                    "dimensions": "\n".join(f"{i}. {d}" for i, d in enumerate(EVALUATION_DIMENSIONS, 1)),
+                    "content": content
+                })
+            return index, parse_findings(text), None
+        except Exception as e:
+            return index, None, e
+
+    @staticmethod
+    def _format_findings(findings: Dict[str, List[str]]) -> str:
+        sections = []
+        for dimension in (*EVALUATION_DIMENSIONS, OTHER_FINDINGS):
+            items = findings.get(dimension)
+            if items:
+                sections.append(f"## {dimension}\n" + "\n".join(f"- {item}" for item in items))
+        return "\n\n".join(sections)
+
+    async def _condense(self, semaphore: asyncio.Semaphore, dimension: str, items: List[str]) -> List[str]:
+        """将某一维度的发现分批压缩"""
+        batches = group_chunks([f"- {item}" for item in items], self.group_tokens)
+        if len(batches) == 1 and estimate_tokens(batches[0]) <= self.reduce_tokens // 2:
+            return items
+        limit = max(5, len(items) // (2 * len(batches)))
+
+        async def condense(batch: str) -> List[str]:
+            async with semaphore:
+                text = await self._invoke(_CONDENSE_PROMPT, {
+                    "dimension": dimension, "limit": limit, "findings": batch
+                })
+            return [line.lstrip("-• ").strip() for line in text.splitlines() if line.strip()]
+
+        results = await asyncio.gather(*(condense(batch) for batch in batches))
+        return [item for result in results for item in result]
+
+    async def evaluate(self, file_id: str, user_id: str) -> AsyncIterator[Dict]:
+        """
+        评估投标文件，逐步产出进度事件
+
+        事件依次为 {"stage": "map", ...}（每完成一组一次）、{"stage": "reduce", ...}，
+        最后为 {"stage": "done", "report": ..., "findings": ...} 或 {"stage": "error", "error": ...}。
+        """
+        chunks = await asyncio.to_thread(supabase_service.get_document_chunks, file_id, user_id)
+        if not chunks:
+            yield {"stage": "error", "error": "文件没有可评估的内容，请确认文件已处理完成"}
+            return
+
+        groups = group_chunks(chunks, self.group_tokens)
+        total = len(groups)
+        logger.info(f"开始评估文件{file_id}: {len(chunks)}个文档块，分为{total}组")
+        yield {"stage": "map", "total": total, "completed": 0, "failed": 0}
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [
+            asyncio.ensure_future(self._map_group(semaphore, i, total, content))
+            for i, content in enumerate(groups)
+        ]
+        findings: Dict[str, List[str]] = {}
+        failed_groups: List[int] = []
+        completed = 0
+        try:
+            for future in asyncio.as_completed(tasks):
+                index, group_findings, error = await future
+                if error is not None:
+                    failed_groups.append(index + 1)
+                    logger.error(f"文件{file_id}第{index + 1}组评估失败: {str(error)}")
+                else:
+                    for dimension, items in group_findings.items():
+                        findings.setdefault(dimension, []).extend(items)
+                completed += 1
+                yield {"stage": "map", "total": total, "completed": completed, "failed": len(failed_groups)}
+        finally:
+            # 客户端断开时取消尚未完成的分组
+            for task in tasks:
+                task.cancel()
+
+        if len(failed_groups) == total:
+            yield {"stage": "error", "error": "所有分组评估均失败"}
+            return
+
+        # 同一发现可能在重叠的文档块中重复出现
+        findings = {d: list(dict.fromkeys(items)) for d, items in findings.items()}
+        rounds = 0
+        while estimate_tokens(self._format_findings(findings)) > self.reduce_tokens and rounds < MAX_REDUCE_ROUNDS:
+            rounds += 1
+            yield {"stage": "reduce", "round": rounds}
+            condensed = await asyncio.gather(*(
+                self._condense(semaphore, dimension, items) for dimension, items in findings.items()
+            ))
+            findings = {d: list(dict.fromkeys(items)) for d, items in zip(findings, condensed)}
+
+        yield {"stage": "reduce", "round": rounds + 1, "final": True}
+        report = await self._invoke(_REDUCE_PROMPT, {
+            "total": total,
+            "dimensions": "\n".join(f"{i}. {d}" for i, d in enumerate(EVALUATION_DIMENSIONS, 1)),
+            "findings": self._format_findings(findings)
+        })
+        logger.info(f"文件{file_id}评估完成: {total}组，失败{len(failed_groups)}组")
+        yield {
+            "stage": "done",
+            "report": report,
+            "findings": findings,
+            "groups": total,
+            "failed_groups": sorted(failed_groups)
+        }
+
+
+# 全局实例
+bid_evaluation_service = BidEvaluationService()
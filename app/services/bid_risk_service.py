@@ -0,0 +1,254 @@
+"""
+投标表批量风险分析：对一个项目的全部投标人一次性评估 risk_rules.json 中的跨投标人规则
+
+输入为每行一个投标人的结构化表格（CSV / JSON），全部规则以 pandas 向量化运算评估，
+返回被标记的投标人及命中规则的 case_ref。缺少规则所需列时该规则记为跳过。
+"""
+import io
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 中文表头 -> 标准列名
+COLUMN_ALIASES = {
+    "投标人": "bidder",
+    "报价": "quote",
+    "投标报价": "quote",
+    "投标时间": "submitted_at",
+    "统一社会信用代码": "credit_code",
+    "发证机关行政区划码": "issuer_region_code",
+    "证书颁发时间": "cert_issued_at",
+    "加密证书颁发时间": "cert_issued_at",
+    "保证金开户行": "deposit_bank",
+    "保证金缴纳账户开户行": "deposit_bank",
+}
+
+# 规则标识 -> 在 risk_rules.json 的 match_condition 中定位该规则的关键词
+RULE_KEYWORDS = {
+    "similar_documents": "相似度",
+    "issuer_region_mismatch": "统一社会信用代码",
+    "benchmark_deviation": "基准价",
+    "unbalanced_pricing": "分项报价",
+    "cert_time_cluster": "加密证书",
+    "deposit_bank_concentration": "开户行集中度",
+}
+
+# 规则阈值（对应 risk_rules.json 中的条件）
+SIMILARITY_THRESHOLD = 0.85          # 技术方案/设备清单相似度>85%
+SUBMISSION_GAP_SECONDS = 2 * 3600    # 投标时间差<2小时
+BENCHMARK_MIN_BIDDERS = 7            # 投标人数量≥7
+BENCHMARK_DEVIATION_RANGE = (0.01, 0.03)  # 报价与基准价偏差±[1-3]%
+ITEM_MARKUP_RATIO = 3.0              # 分项单价超出市场价200%，即单价>市场价×3
+TOTAL_DEVIATION_LIMIT = 0.05         # 总价偏差<5%
+CERT_WINDOW_SECONDS = 5 * 60         # 加密证书颁发时间相差不超过5分钟
+BANK_CONCENTRATION_LIMIT = 0.6       # 开户行集中度>60%
+
+
+class BidRiskService:
+    def __init__(self, rules_path: str = None):
+        with open(rules_path or settings.LOCAL_RISK_RULES_PATH, "r", encoding="utf-8") as f:
+            rules = json.load(f)
+        self.risk_weights: Dict[str, float] = rules.get("risk_weights", {})
+        # 规则标识 -> {"risk_level", "case_ref", "condition"}
+        self.rules: Dict[str, Dict[str, str]] = {}
+        for pattern in rules.get("bid_abnormal_patterns", []):
+            for rule, keyword in RULE_KEYWORDS.items():
+                if keyword in pattern["match_condition"] and rule not in self.rules:
+                    self.rules[rule] = {
+                        "risk_level": pattern["risk_level"],
+                        "case_ref": pattern["case_ref"],
+                        "condition": pattern["match_condition"],
+                    }
+                    break
+
+    @staticmethod
+    def parse_csv(content: str) -> pd.DataFrame:
+        """解析 CSV 投标表"""
+        return pd.read_csv(io.StringIO(content), dtype={"统一社会信用代码": str, "credit_code": str})
+
+    def analyze(
+        self,
+        bidders: pd.DataFrame,
+        items: Optional[pd.DataFrame] = None,
+        similar_pairs: Optional[pd.DataFrame] = None,
+        benchmark_price: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        评估一个项目全部投标人的风险
+
+        Args:
+            bidders: 投标人表，必需列 bidder，可选列 quote / submitted_at / credit_code /
+                issuer_region_code / cert_issued_at / deposit_bank
+            items: 分项报价表，列 bidder / item / unit_price / market_price
+            similar_pairs: 投标文件相似对，列 bidder_a / bidder_b / similarity
+            benchmark_price: 评标基准价，默认取有效报价的平均值
+
+        Returns:
+            dict: 标记明细 flags、按投标人汇总的 bidders、跳过的规则 skipped_rules
+        """
+        df = bidders.rename(columns=COLUMN_ALIASES)
+        if "bidder" not in df.columns:
+            raise ValueError("投标表缺少 bidder（投标人）列")
+        df = df.dropna(subset=["bidder"]).drop_duplicates(subset=["bidder"]).reset_index(drop=True)
+        df["bidder"] = df["bidder"].astype(str)
+
+        deviation = self._benchmark_deviation(df, benchmark_price)
+        flags: List[pd.DataFrame] = []
+        skipped: List[Dict[str, str]] = []
+
+        def evaluate(rule: str, required: List[str], fn) -> None:
+            missing = [c for c in required if c not in df.columns]
+            if missing:
+                skipped.append({"rule": rule, "reason": f"缺少列: {', '.join(missing)}"})
+                return
+            result = fn()
+            if result is not None and not result.empty:
+                flags.append(result.assign(rule=rule))
+
+        evaluate("similar_documents", ["submitted_at"], lambda: self._similar_documents(df, similar_pairs))
+        evaluate("issuer_region_mismatch", ["credit_code", "issuer_region_code"], lambda: self._issuer_region_mismatch(df))
+        evaluate("benchmark_deviation", ["quote"], lambda: self._benchmark_rule(df, deviation))
+        evaluate("unbalanced_pricing", ["quote"], lambda: self._unbalanced_pricing(df, items, deviation))
+        evaluate("cert_time_cluster", ["cert_issued_at"], lambda: self._cert_time_cluster(df))
+        evaluate("deposit_bank_concentration", ["deposit_bank"], lambda: self._bank_concentration(df))
+
+        if flags:
+            flagged = pd.concat(flags, ignore_index=True)
+        else:
+            flagged = pd.DataFrame(columns=["bidder", "detail", "rule"])
+        meta = pd.DataFrame.from_dict(self.rules, orient="index")
+        flagged = flagged.join(meta[["risk_level", "case_ref"]], on="rule")
+        flagged["weight"] = flagged["risk_level"].map(self.risk_weights).fillna(0.0)
+
+        return {
+            "bidder_count": len(df),
+            "benchmark_price": None if deviation is None else round(float(deviation.attrs["benchmark"]), 2),
+            "flags": flagged[["bidder", "rule", "risk_level", "case_ref", "detail"]].to_dict("records"),
+            "bidders": self._summarize(flagged),
+            "skipped_rules": skipped,
+        }
+
+    def _summarize(self, flagged: pd.DataFrame) -> List[Dict[str, Any]]:
+        """按投标人汇总：同一规则只计一次权重，阈值与单条消息的本地风险评估一致"""
+        if flagged.empty:
+            return []
+        per_rule = flagged.drop_duplicates(subset=["bidder", "rule"])
+        summary = per_rule.groupby("bidder").agg(risk_score=("weight", "sum"), rules=("rule", list))
+        summary["risk_level"] = np.select(
+            [summary["risk_score"] >= 0.75, summary["risk_score"] >= 0.45], ["high", "medium"], "low"
+        )
+        summary["risk_score"] = summary["risk_score"].round(2)
+        summary = summary.sort_values("risk_score", ascending=False).reset_index()
+        return summary[["bidder", "risk_score", "risk_level", "rules"]].to_dict("records")
+
+    @staticmethod
+    def _benchmark_deviation(df: pd.DataFrame, benchmark_price: Optional[float]) -> Optional[pd.Series]:
+        """各投标人报价相对基准价的偏差比例"""
+        if "quote" not in df.columns:
+            return None
+        quotes = pd.to_numeric(df["quote"], errors="coerce")
+        benchmark = benchmark_price if benchmark_price else quotes.mean()
+        deviation = (quotes - benchmark) / benchmark
+        deviation.attrs["benchmark"] = benchmark
+        return deviation
+
+    @staticmethod
+    def _benchmark_rule(df: pd.DataFrame, deviation: pd.Series) -> Optional[pd.DataFrame]:
+        if deviation.notna().sum() < BENCHMARK_MIN_BIDDERS:
+            return None
+        low, high = BENCHMARK_DEVIATION_RANGE
+        mask = deviation.abs().between(low, high)
+        return pd.DataFrame({
+            "bidder": df.loc[mask, "bidder"],
+            "detail": "报价偏离基准价" + (deviation[mask] * 100).round(2).astype(str) + "%",
+        })
+
+    @staticmethod
+    def _issuer_region_mismatch(df: pd.DataFrame) -> pd.DataFrame:
+        # 统一社会信用代码第3-4位为登记机关所在省级行政区划码
+        code_province = df["credit_code"].astype(str).str.strip().str[2:4]
+        issuer_province = df["issuer_region_code"].astype(str).str.strip().str[:2]
+        valid = df["credit_code"].notna() & df["issuer_region_code"].notna()
+        mask = valid & (code_province != issuer_province)
+        return pd.DataFrame({
+            "bidder": df.loc[mask, "bidder"],
+            "detail": "信用代码行政区划" + code_province[mask] + "与发证机关" + issuer_province[mask] + "不一致",
+        })
+
+    @staticmethod
+    def _unbalanced_pricing(
+        df: pd.DataFrame, items: Optional[pd.DataFrame], deviation: pd.Series
+    ) -> Optional[pd.DataFrame]:
+        if items is None or items.empty:
+            return None
+        items = items.copy()
+        ratio = pd.to_numeric(items["unit_price"], errors="coerce") / pd.to_numeric(items["market_price"], errors="coerce")
+        items["over"] = ratio > ITEM_MARKUP_RATIO
+        over_counts = items.groupby(items["bidder"].astype(str))["over"].sum()
+        total_ok = pd.Series(deviation.abs().values < TOTAL_DEVIATION_LIMIT, index=df["bidder"])
+        candidates = over_counts[over_counts > 0].index.intersection(total_ok[total_ok].index)
+        return pd.DataFrame({
+            "bidder": candidates,
+            "detail": [f"{int(over_counts[b])}个分项单价超过市场价200%，总价偏差<5%" for b in candidates],
+        })
+
+    @staticmethod
+    def _cert_time_cluster(df: pd.DataFrame) -> pd.DataFrame:
+        issued = pd.to_datetime(df["cert_issued_at"], errors="coerce", utc=True, format="mixed")
+        order = issued.sort_values().dropna()
+        gaps = order.diff().dt.total_seconds()
+        # 与前一个或后一个证书的间隔，取较小值
+        nearest = pd.concat([gaps, gaps.shift(-1)], axis=1).min(axis=1)
+        mask = nearest <= CERT_WINDOW_SECONDS
+        index = nearest[mask].index
+        return pd.DataFrame({
+            "bidder": df.loc[index, "bidder"],
+            "detail": "加密证书与相邻投标人颁发时间相差" + nearest[mask].astype(int).astype(str) + "秒",
+        })
+
+    @staticmethod
+    def _bank_concentration(df: pd.DataFrame) -> Optional[pd.DataFrame]:
+        banks = df["deposit_bank"].dropna().astype(str).str.strip()
+        if len(banks) < 2:
+            return None
+        shares = banks.value_counts(normalize=True)
+        if shares.iloc[0] <= BANK_CONCENTRATION_LIMIT:
+            return None
+        top_bank = shares.index[0]
+        mask = df["deposit_bank"].astype(str).str.strip() == top_bank
+        return pd.DataFrame({
+            "bidder": df.loc[mask, "bidder"],
+            "detail": f"保证金开户行“{top_bank}”集中度{shares.iloc[0]:.0%}",
+        })
+
+    @staticmethod
+    def _similar_documents(df: pd.DataFrame, similar_pairs: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+        if similar_pairs is None or similar_pairs.empty:
+            return None
+        submitted = pd.Series(
+            pd.to_datetime(df["submitted_at"], errors="coerce", utc=True, format="mixed").values, index=df["bidder"]
+        )
+        pairs = similar_pairs[pd.to_numeric(similar_pairs["similarity"], errors="coerce") > SIMILARITY_THRESHOLD].copy()
+        pairs["gap"] = (
+            pairs["bidder_a"].astype(str).map(submitted) - pairs["bidder_b"].astype(str).map(submitted)
+        ).dt.total_seconds().abs()
+        pairs = pairs[pairs["gap"] < SUBMISSION_GAP_SECONDS]
+        if pairs.empty:
+            return None
+        detail = "投标文件相似度" + (pairs["similarity"] * 100).round(1).astype(str) + "%，投标时间相差" \
+            + (pairs["gap"] / 60).round(1).astype(str) + "分钟"
+        return pd.concat([
+            pd.DataFrame({"bidder": pairs["bidder_a"].astype(str), "detail": detail + "（与" + pairs["bidder_b"].astype(str) + "）"}),
+            pd.DataFrame({"bidder": pairs["bidder_b"].astype(str), "detail": detail + "（与" + pairs["bidder_a"].astype(str) + "）"}),
+        ], ignore_index=True)
+
+
+# 全局实例
+bid_risk_service = BidRiskService()
@@ -0,0 +1,233 @@
+"""
+投标文件相似度检测：MinHash 签名 + LSH 分桶找出疑似串标的近似重复投标文件
+
+文档入库时按文件和按分块各计算一个 MinHash 签名写入所属项目的 LSH 索引；查询时只比较
+落入同一分桶的候选对，整体复杂度近似线性，而不是对所有文件两两比较。
+分块级索引用于发现只有部分章节（如技术方案、设备清单）雷同的投标文件。
+"""
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# 计算签名时每批处理的 shingle 数，控制 (shingle 数 × 置换数) 中间矩阵的内存
+_SHINGLE_BLOCK = 8192
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = None, shingle_size: int = None, seed: int = 1):
+        self.num_perm = num_perm or settings.MINHASH_NUM_PERM
+        self.shingle_size = shingle_size or settings.MINHASH_SHINGLE_SIZE
+        rng = np.random.default_rng(seed)
+        # 固定种子，保证不同进程计算的签名可比
+        self._a = rng.integers(1, int(_MERSENNE_PRIME), self.num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_MERSENNE_PRIME), self.num_perm, dtype=np.uint64)
+        self._powers = np.array([31 ** i for i in range(self.shingle_size)][::-1], dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """字符 k-gram 的滚动哈希（去除空白与标点后计算），返回去重后的 uint64 数组"""
+        text = re.sub(r"[\s\W_]+", "", text.lower())
+        if not text:
+            return np.empty(0, dtype=np.uint64)
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        k = min(self.shingle_size, len(codes))
+        windows = np.lib.stride_tricks.sliding_window_view(codes, k)
+        hashes = (windows * self._powers[-k:]).sum(axis=1, dtype=np.uint64)
+        return np.unique(hashes)
+
+    def signature(self, text: str) -> np.ndarray:
+        """计算文本的 MinHash 签名（num_perm 个 uint32）"""
+        hashes = self.shingles(text)
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(hashes), _SHINGLE_BLOCK):
+            block = hashes[start:start + _SHINGLE_BLOCK, None]
+            # 按 uint64 溢出回绕计算，取高 32 位作为置换后的哈希值
+            permuted = ((block * self._a + self._b) >> np.uint64(32)) & _MAX_HASH
+            np.minimum(signature, permuted.min(axis=0), out=signature)
+        return signature.astype(np.uint32)
+
+
+def estimate_similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    """由签名估算 Jaccard 相似度"""
+    return float(np.count_nonzero(sig_a == sig_b)) / len(sig_a)
+
+
+class LSHIndex:
+    """按 band 分桶的 MinHash LSH 索引"""
+
+    def __init__(self, num_perm: int, bands: int):
+        if num_perm % bands:
+            raise ValueError("num_perm 必须能被 bands 整除")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: List[Dict[bytes, List[Hashable]]] = [{} for _ in range(bands)]
+        self.signatures: Dict[Hashable, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def _band_keys(self, signature: np.ndarray) -> Iterable[Tuple[int, bytes]]:
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, key: Hashable, signature: np.ndarray) -> None:
+        self.signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band].setdefault(band_key, []).append(key)
+
+    def remove(self, key: Hashable) -> None:
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, band_key in self._band_keys(signature):
+            bucket = self._buckets[band].get(band_key)
+            if bucket and key in bucket:
+                bucket.remove(key)
+                if not bucket:
+                    del self._buckets[band][band_key]
+
+    def candidate_pairs(self) -> Set[Tuple[Hashable, Hashable]]:
+        """至少在一个 band 上落入同一分桶的键对"""
+        pairs = set()
+        for buckets in self._buckets:
+            for keys in buckets.values():
+                if len(keys) < 2:
+                    continue
+                for i in range(len(keys)):
+                    for j in range(i + 1, len(keys)):
+                        a, b = keys[i], keys[j]
+                        pairs.add((a, b) if str(a) <= str(b) else (b, a))
+        return pairs
+
+
+@dataclass
+class _ProjectIndex:
+    documents: LSHIndex
+    chunks: LSHIndex
+    bidders: Dict[str, Optional[str]] = field(default_factory=dict)
+    chunk_counts: Dict[str, int] = field(default_factory=dict)
+
+
+class BidSimilarityService:
+    def __init__(self, num_perm: int = None, bands: int = None, shingle_size: int = None):
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.bands = bands or settings.LSH_BANDS
+        self._projects: Dict[str, _ProjectIndex] = {}
+        # 入库在线程池中执行，查询在事件循环中执行
+        self._lock = threading.Lock()
+
+    def _project(self, project_id: str) -> _ProjectIndex:
+        index = self._projects.get(project_id)
+        if index is None:
+            index = _ProjectIndex(
+                documents=LSHIndex(self.hasher.num_perm, self.bands),
+                chunks=LSHIndex(self.hasher.num_perm, self.bands)
+            )
+            self._projects[project_id] = index
+        return index
+
+    def add_document(
+        self, project_id: str, file_id: str, chunks: List[str], bidder: Optional[str] = None
+    ) -> None:
+        """
+        计算文件及其分块的签名并写入项目索引（CPU 密集，调用方应在线程池中执行）
+
+        Args:
+            project_id: 项目 ID，只在同一项目的投标文件之间比较
+            file_id: 文件 ID
+            chunks: 文件分块文本
+            bidder: 投标人名称
+        """
+        document_signature = self.hasher.signature("".join(chunks))
+        chunk_signatures = [self.hasher.signature(chunk) for chunk in chunks]
+
+        with self._lock:
+            index = self._project(project_id)
+            self._remove_locked(index, file_id)
+            index.documents.add(file_id, document_signature)
+            for i, signature in enumerate(chunk_signatures):
+                index.chunks.add((file_id, i), signature)
+            index.bidders[file_id] = bidder
+            index.chunk_counts[file_id] = len(chunks)
+        logger.info(f"项目{project_id}相似度索引已加入文件{file_id}（{len(chunks)}个分块）")
+
+    def remove_document(self, project_id: str, file_id: str) -> None:
+        with self._lock:
+            index = self._projects.get(project_id)
+            if index is not None:
+                self._remove_locked(index, file_id)
+
+    @staticmethod
+    def _remove_locked(index: _ProjectIndex, file_id: str) -> None:
+        index.documents.remove(file_id)
+        for i in range(index.chunk_counts.pop(file_id, 0)):
+            index.chunks.remove((file_id, i))
+        index.bidders.pop(file_id, None)
+
+    def document_count(self, project_id: str) -> int:
+        index = self._projects.get(project_id)
+        return len(index.documents) if index else 0
+
+    def similar_pairs(self, project_id: str, threshold: float = None) -> List[Dict]:
+        """
+        返回项目内相似度不低于阈值的投标文件对
+
+        Returns:
+            [{"file_a", "file_b", "bidder_a", "bidder_b", "similarity",
+              "document_similarity", "max_chunk_similarity", "matched_chunks"}]，按 similarity 降序
+        """
+        threshold = threshold if threshold is not None else settings.BID_SIMILARITY_THRESHOLD
+        with self._lock:
+            index = self._projects.get(project_id)
+            if index is None:
+                return []
+
+            pairs: Dict[Tuple[str, str], Dict] = {}
+
+            def entry(file_a: str, file_b: str) -> Dict:
+                key = (file_a, file_b) if file_a <= file_b else (file_b, file_a)
+                if key not in pairs:
+                    pairs[key] = {
+                        "file_a": key[0],
+                        "file_b": key[1],
+                        "bidder_a": index.bidders.get(key[0]),
+                        "bidder_b": index.bidders.get(key[1]),
+                        "document_similarity": round(estimate_similarity(
+                            index.documents.signatures[key[0]], index.documents.signatures[key[1]]
+                        ), 3),
+                        "max_chunk_similarity": 0.0,
+                        "matched_chunks": 0,
+                    }
+                return pairs[key]
+
+            for file_a, file_b in index.documents.candidate_pairs():
+                if estimate_similarity(index.documents.signatures[file_a], index.documents.signatures[file_b]) >= threshold:
+                    entry(file_a, file_b)
+
+            for chunk_a, chunk_b in index.chunks.candidate_pairs():
+                if chunk_a[0] == chunk_b[0]:
+                    continue
+                similarity = estimate_similarity(index.chunks.signatures[chunk_a], index.chunks.signatures[chunk_b])
+                if similarity >= threshold:
+                    pair = entry(chunk_a[0], chunk_b[0])
+                    pair["matched_chunks"] += 1
+                    pair["max_chunk_similarity"] = max(pair["max_chunk_similarity"], round(similarity, 3))
+
+        result = list(pairs.values())
+        for pair in result:
+            pair["similarity"] = max(pair["document_similarity"], pair["max_chunk_similarity"])
+        result.sort(key=lambda p: p["similarity"], reverse=True)
+        return result
+
+
+# 全局实例
+bid_similarity_service = BidSimilarityService()
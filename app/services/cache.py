@@ -0,0 +1,467 @@
+"""
+分层缓存：进程内 LRU（近端）与 RESP 协议（Redis 兼容）共享缓存（远端）的统一接口
+
+各服务按命名空间创建缓存，每个命名空间有独立的有效期、容量上限与命中统计。CACHE_MODE 决定使用的层级：
+- local：仅进程内 LRU（默认，与原先各服务自带的字典缓存等价）
+- remote：仅共享缓存，多个工作进程与节点共用
+- tiered：近端 LRU + 远端共享缓存。读先查近端，未命中再查远端并回填近端；写同时写两层。
+  近端条目的有效期不超过 CACHE_NEAR_TTL，其他节点更新或删除后，本节点最多在该时间内读到旧值
+
+远端不可用时按未命中处理，并在 CACHE_REMOTE_RETRY_INTERVAL 内不再尝试，缓存故障不影响请求。
+同步接口供线程中的代码使用；异步接口只在线程池中访问远端，不阻塞事件循环。
+"""
+import asyncio
+import hashlib
+import logging
+import queue
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+import orjson
+
+from app.config import settings
+from app.services.metrics import metrics_registry
+from app.utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+LOCAL = "local"
+REMOTE = "remote"
+TIERED = "tiered"
+CACHE_MODES = (LOCAL, REMOTE, TIERED)
+
+# 超过该长度的键在远端以哈希值存放
+MAX_REMOTE_KEY_LENGTH = 200
+
+
+class CacheUnavailable(Exception):
+    """远端缓存连接失败、超时或返回错误"""
+
+
+class RespError(Exception):
+    """RESP 错误回复（-ERR ...）"""
+
+
+def encode_command(*args: Any) -> bytes:
+    """将命令编码为 RESP 多条批量字符串"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode("utf-8")
+        elif isinstance(arg, int):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def read_reply(reader: BinaryIO) -> Any:
+    """读取一个 RESP 回复；错误回复以 RespError 实例返回（不抛出）"""
+    line = reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("连接已关闭")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode("utf-8")
+    if kind == b"-":
+        return RespError(body.decode("utf-8"))
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = reader.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError("连接已关闭")
+        return data[:-2]
+    if kind == b"*":
+        length = int(body)
+        return None if length < 0 else [read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"无法解析的回复: {line[:32]!r}")
+
+
+class _Connection:
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.reader = sock.makefile("rb")
+
+    def pipeline(self, commands: Sequence[Tuple]) -> List[Any]:
+        self.sock.sendall(b"".join(encode_command(*c) for c in commands))
+        return [read_reply(self.reader) for _ in commands]
+
+    def close(self) -> None:
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RespClient:
+    """RESP2 客户端（Redis 或 cache_server 中的替身服务器），连接池复用 TCP 连接"""
+
+    def __init__(self, url: str, timeout: float, pool_size: int):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._pool: "queue.LifoQueue[_Connection]" = queue.LifoQueue(pool_size)
+
+    def _connect(self) -> _Connection:
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = _Connection(sock)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            for reply in connection.pipeline(setup):
+                if isinstance(reply, RespError):
+                    connection.close()
+                    raise CacheUnavailable(str(reply))
+        return connection
+
+    def execute(self, *commands: Tuple) -> List[Any]:
+        """在一个连接上以流水线方式发送多条命令，返回各命令的回复"""
+        try:
+            connection = self._pool.get_nowait()
+        except queue.Empty:
+            connection = None
+        try:
+            if connection is None:
+                connection = self._connect()
+            replies = connection.pipeline(commands)
+        except (OSError, ValueError) as e:
+            if connection is not None:
+                connection.close()
+            raise CacheUnavailable(str(e) or type(e).__name__) from e
+
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+        errors = [r for r in replies if isinstance(r, RespError)]
+        if errors:
+            raise CacheUnavailable(str(errors[0]))
+        return replies
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class LocalLRU:
+    """进程内 LRU：条目各自过期，超过条目数上限时淘汰最久未使用的条目"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # 键 -> (值, 过期时间)，按最近使用排序
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RemoteCache:
+    """远端共享缓存：值为字节串；调用失败后熔断一段时间，期间直接按不可用处理"""
+
+    def __init__(self, url: str, timeout: float, pool_size: int, retry_interval: float):
+        self.client = RespClient(url, timeout, pool_size)
+        self.retry_interval = retry_interval
+        self._down_until = 0.0
+        self.errors = 0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _execute(self, *commands: Tuple) -> Optional[List[Any]]:
+        if not commands or not self.available:
+            return None
+        try:
+            return self.client.execute(*commands)
+        except CacheUnavailable as e:
+            self.errors += 1
+            self._down_until = time.monotonic() + self.retry_interval
+            logger.warning(f"远端缓存不可用，{self.retry_interval:.0f}秒内按未命中处理: {str(e)}")
+            return None
+
+    def get_many(self, keys: Sequence[str]) -> Optional[List[Optional[bytes]]]:
+        """批量读取；远端不可用时返回 None"""
+        replies = self._execute(("MGET", *keys))
+        return replies[0] if replies is not None else None
+
+    def set_many(self, items: Sequence[Tuple[str, bytes]], ttl: float) -> bool:
+        replies = self._execute(*(("SET", key, value, "PX", max(1, int(ttl * 1000))) for key, value in items))
+        return replies is not None
+
+    def delete(self, keys: Sequence[str]) -> bool:
+        return self._execute(("DEL", *keys)) is not None
+
+
+class CacheNamespace:
+    """一个命名空间的缓存：值不能为 None（None 表示未命中）"""
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_entries: int,
+        mode: str = LOCAL,
+        remote: Optional[RemoteCache] = None,
+        near_ttl: Optional[float] = None,
+        key_prefix: str = "",
+        encode: Optional[Callable[[Any], bytes]] = None,
+        decode: Optional[Callable[[bytes], Any]] = None
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"不支持的缓存模式: {mode}")
+        if mode != LOCAL and remote is None:
+            raise ValueError(f"缓存模式{mode}需要远端缓存")
+        self.name = name
+        self.ttl = ttl
+        self.mode = mode
+        self.near = LocalLRU(max_entries) if mode in (LOCAL, TIERED) else None
+        self.far = remote if mode in (REMOTE, TIERED) else None
+        self.near_ttl = near_ttl
+        self.key_prefix = f"{key_prefix}:{name}:" if key_prefix else f"{name}:"
+        self.encode = encode or dumps
+        self.decode = decode or orjson.loads
+        self.hits = 0
+        self.misses = 0
+        self.near_hits = 0
+        self.far_hits = 0
+        self.far_errors = 0
+        self.sets = 0
+
+    def _far_key(self, key: str) -> str:
+        if len(key) > MAX_REMOTE_KEY_LENGTH:
+            key = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.key_prefix + key
+
+    def _near_ttl(self, ttl: float) -> float:
+        if self.far is not None and self.near_ttl:
+            return min(ttl, self.near_ttl)
+        return ttl
+
+    def _get_near(self, keys: Sequence[str]) -> Tuple[List[Optional[Any]], List[int]]:
+        """查近端，返回 (结果, 未命中的下标)"""
+        if self.near is None:
+            return [None] * len(keys), list(range(len(keys)))
+        results = [self.near.get(key) for key in keys]
+        missing = [i for i, value in enumerate(results) if value is None]
+        self.near_hits += len(keys) - len(missing)
+        return results, missing
+
+    def _get_far(self, keys: Sequence[str], results: List[Optional[Any]], missing: List[int]) -> None:
+        """查远端补全未命中的结果，并回填近端"""
+        if not missing or self.far is None:
+            return
+        raw = self.far.get_many([self._far_key(keys[i]) for i in missing])
+        if raw is None:
+            self.far_errors += 1
+            return
+        for i, data in zip(missing, raw):
+            if data is None:
+                continue
+            try:
+                value = self.decode(data)
+            except Exception as e:
+                logger.warning(f"缓存{self.name}的远端条目解码失败: {str(e)}")
+                continue
+            results[i] = value
+            self.far_hits += 1
+            if self.near is not None:
+                self.near.set(keys[i], value, self._near_ttl(self.ttl))
+
+    def _count(self, results: List[Optional[Any]]) -> List[Optional[Any]]:
+        found = sum(1 for value in results if value is not None)
+        self.hits += found
+        self.misses += len(results) - found
+        return results
+
+    def _set_near(self, items: Dict[str, Any], ttl: float) -> None:
+        self.sets += len(items)
+        if self.near is not None:
+            for key, value in items.items():
+                self.near.set(key, value, self._near_ttl(ttl))
+
+    def _set_far(self, items: Dict[str, Any], ttl: float) -> None:
+        if self.far is None or not items:
+            return
+        if not self.far.set_many([(self._far_key(k), self.encode(v)) for k, v in items.items()], ttl):
+            self.far_errors += 1
+
+    @staticmethod
+    def _cacheable(items: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in items.items() if value is not None}
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        results, missing = self._get_near(keys)
+        self._get_far(keys, results, missing)
+        return self._count(results)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        items, ttl = self._cacheable(items), ttl or self.ttl
+        self._set_near(items, ttl)
+        self._set_far(items, ttl)
+
+    def delete(self, key: str) -> None:
+        if self.near is not None:
+            self.near.delete(key)
+        if self.far is not None and not self.far.delete([self._far_key(key)]):
+            self.far_errors += 1
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return (await self.aget_many([key]))[0]
+
+    async def aget_many(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        results, missing = self._get_near(keys)
+        if missing and self.far is not None:
+            await asyncio.to_thread(self._get_far, keys, results, missing)
+        return self._count(results)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self.aset_many({key: value}, ttl)
+
+    async def aset_many(self, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        items, ttl = self._cacheable(items), ttl or self.ttl
+        self._set_near(items, ttl)
+        if self.far is not None and items:
+            await asyncio.to_thread(self._set_far, items, ttl)
+
+    async def adelete(self, key: str) -> None:
+        if self.far is None:
+            self.delete(key)
+        else:
+            await asyncio.to_thread(self.delete, key)
+
+    def clear(self) -> None:
+        """清空近端（远端条目按有效期自然过期）"""
+        if self.near is not None:
+            self.near.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "ttl": self.ttl,
+            "size": len(self.near) if self.near is not None else None,
+            "max_entries": self.near.max_entries if self.near is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "near_hits": self.near_hits,
+            "far_hits": self.far_hits,
+            "far_errors": self.far_errors,
+            "sets": self.sets,
+            "evictions": self.near.evictions if self.near is not None else 0,
+        }
+
+
+class CacheManager:
+    """按配置创建命名空间，各命名空间共用一个远端连接池"""
+
+    def __init__(self):
+        self._namespaces: Dict[str, CacheNamespace] = {}
+        self._remote: Optional[RemoteCache] = None
+        self._lock = threading.Lock()
+
+    def _get_remote(self) -> RemoteCache:
+        with self._lock:
+            if self._remote is None:
+                self._remote = RemoteCache(
+                    settings.CACHE_REMOTE_URL,
+                    timeout=settings.CACHE_REMOTE_TIMEOUT,
+                    pool_size=settings.CACHE_REMOTE_POOL_SIZE,
+                    retry_interval=settings.CACHE_REMOTE_RETRY_INTERVAL
+                )
+            return self._remote
+
+    def namespace(
+        self,
+        name: str,
+        ttl: float,
+        max_entries: int,
+        near: bool = True,
+        encode: Optional[Callable[[Any], bytes]] = None,
+        decode: Optional[Callable[[bytes], Any]] = None
+    ) -> CacheNamespace:
+        """
+        创建命名空间（同名的命名空间在统计中被新实例替换）
+
+        Args:
+            ttl: 条目有效期（秒）
+            max_entries: 近端条目数上限
+            near: tiered 模式下是否使用近端；需要各节点立即看到更新的数据（如失效标记）应设为 False
+            encode / decode: 远端存储的编解码，默认 JSON
+        """
+        mode = settings.CACHE_MODE
+        if mode == TIERED and not near:
+            mode = REMOTE
+        namespace = CacheNamespace(
+            name, ttl, max_entries,
+            mode=mode,
+            remote=self._get_remote() if mode != LOCAL else None,
+            near_ttl=settings.CACHE_NEAR_TTL,
+            key_prefix=settings.CACHE_KEY_PREFIX,
+            encode=encode,
+            decode=decode
+        )
+        self._namespaces[name] = namespace
+        return namespace
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各命名空间的命中统计"""
+        return {name: namespace.stats() for name, namespace in self._namespaces.items()}
+
+
+# 全局实例
+cache_manager = CacheManager()
+metrics_registry.register_cache(cache_manager.stats)
@@ -0,0 +1,127 @@
+"""
+共享缓存的本地替身服务器：实现缓存层用到的 RESP 命令子集，便于在没有 Redis 的环境中开发与测试
+
+支持 PING / GET / MGET / SET（EX / PX）/ DEL / EXISTS / DBSIZE / FLUSHDB / AUTH / SELECT，
+数据只保存在内存中。生产环境请将 CACHE_REMOTE_URL 指向 Redis。
+
+    python -m app.services.cache_server --port 6380
+"""
+import argparse
+import logging
+import socketserver
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.cache import RespError, read_reply
+
+logger = logging.getLogger(__name__)
+
+
+def _encode_reply(reply: Any) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, RespError):
+        return f"-{reply}\r\n".encode("utf-8")
+    if isinstance(reply, bool):
+        return b"+OK\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(_encode_reply(r) for r in reply)
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+
+class _Store:
+    def __init__(self):
+        # 键 -> (值, 过期时间)
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] < time.monotonic():
+            del self._data[key]
+            return None
+        return entry[0]
+
+    def execute(self, args: List[bytes]) -> Any:
+        command = args[0].upper()
+        with self._lock:
+            if command == b"PING":
+                return b"PONG"
+            if command in (b"AUTH", b"SELECT"):
+                return True
+            if command == b"GET" and len(args) == 2:
+                return self._get(args[1])
+            if command == b"MGET" and len(args) >= 2:
+                return [self._get(key) for key in args[1:]]
+            if command == b"SET" and len(args) in (3, 5):
+                expires_at = None
+                if len(args) == 5:
+                    unit = args[3].upper()
+                    if unit not in (b"EX", b"PX"):
+                        return RespError("ERR syntax error")
+                    expires_at = time.monotonic() + int(args[4]) / (1000 if unit == b"PX" else 1)
+                self._data[args[1]] = (args[2], expires_at)
+                return True
+            if command == b"DEL" and len(args) >= 2:
+                deleted = 0
+                for key in args[1:]:
+                    if self._get(key) is not None:
+                        del self._data[key]
+                        deleted += 1
+                return deleted
+            if command == b"EXISTS" and len(args) >= 2:
+                return sum(1 for key in args[1:] if self._get(key) is not None)
+            if command == b"DBSIZE":
+                return len(self._data)
+            if command == b"FLUSHDB":
+                self._data.clear()
+                return True
+        return RespError(f"ERR unknown command '{args[0].decode('utf-8', 'replace')}'")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        while True:
+            try:
+                args = read_reply(self.rfile)
+            except (ConnectionError, ValueError):
+                return
+            if not isinstance(args, list) or not args:
+                self.wfile.write(_encode_reply(RespError("ERR protocol error")))
+                return
+            self.wfile.write(_encode_reply(self.server.store.execute(args)))
+
+
+class LocalCacheServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6380):
+        super().__init__((host, port), _Handler)
+        self.store = _Store()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start_in_thread(self) -> str:
+        """在后台线程中运行，返回连接地址"""
+        threading.Thread(target=self.serve_forever, name="local-cache-server", daemon=True).start()
+        return self.url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="共享缓存的本地替身服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    options = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    with LocalCacheServer(options.host, options.port) as server:
+        logger.info(f"本地缓存服务器已启动: {server.url}")
+        server.serve_forever()
@@ -2,28 +2,49 @@
 # -*- coding: utf-8 -*-
 
 import asyncio
+import hashlib
 import json
 import logging
 import os
 import re
+import time
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional, Tuple, Union
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Union
 
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+import numpy as np
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langchain_core.callbacks import BaseCallbackHandler
 
 from app.config import settings
 from app.services.intentService import intent_service,IntentService, IntentResult, CoreIntentType, AuxIntentType
 from app.services.supabase import SupabaseService,supabase_service
-from app.services.document_service import DocumentService
-from langchain_community.tools import Tool
-from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
-from langchain_community.vectorstores import SupabaseVectorStore
+from app.services.response_cache import response_cache
+from app.services.cache import cache_manager
+from app.services.metrics import RETRIES, STAGE_LATENCY, metrics_registry
+from app.services.tracing import current_span, traced, tracer
+from app.services.document_service import document_service
+from app.services.embedding_service import embedding_service
+from app.services.model_router import model_router, ResolvedRoute
+from app.services.web_search import web_search_service
+from app.services.statute_store import statute_store, Article
+from app.services.api_scheduler import api_scheduler, estimate_tokens, Priority, RateLimitExceeded
+from app.utils.single_flight import SingleFlight
+from app.utils.deadline import Deadline, DeadlineExceeded
+from app.utils.lazy import LazyService
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
 
 logger = logging.getLogger(__name__)
 
+# 未限制输出长度时，调度器按该值预估回复的 token 消耗
+DEFAULT_OUTPUT_TOKENS = 1024
+
+# 投标文件评估维度
+EVALUATION_DIMENSIONS = ("形式合规性", "技术响应度", "商务合理性", "风险提示")
+
 @dataclass
 class ReasoningStep:
     """推理步骤记录"""
@@ -33,6 +54,33 @@ class ReasoningStep:
     reasoning: str
     conclusion: Optional[str] = None
 
+@dataclass
+class _Speculation:
+    """与意图识别并行启动的推测生成"""
+    route: ResolvedRoute
+    query: str
+    prompt_tokens: int
+    task: asyncio.Task
+    chunks: List[str]
+
+
+class _FirstTokenTimer(BaseCallbackHandler):
+    """记录从发起模型调用到收到首个流式 token 的耗时"""
+    run_inline = True
+
+    def __init__(self, span: Any):
+        self.started = time.perf_counter()
+        self.recorded = False
+        self.span = span
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if not self.recorded:
+            self.recorded = True
+            elapsed = time.perf_counter() - self.started
+            STAGE_LATENCY.observe(elapsed, "llm_first_token")
+            self.span.set_attribute("first_token_ms", round(elapsed * 1000, 3))
+
+
 class ChatService:
     def _validate_api_keys(self):
         """验证API密钥是否正确配置"""
@@ -48,67 +96,56 @@ class ChatService:
         """
         try:
             self._validate_api_keys()
-            # 初始化向量嵌入模型
-            self.embeddings = OpenAIEmbeddings(
-                api_key=settings.OPENAI_API_KEY
+            # 相同查询的并发向量/回复生成请求合并为一次调用
+            self.embedding_flight = SingleFlight("查询向量")
+            self.response_flight = SingleFlight("回复生成")
+            # 查询向量与文档检索结果缓存（CACHE_MODE 为 remote / tiered 时各节点共享；
+            # 检索结果缓存依赖文档版本，local 模式下多进程部署时不使用，见 document_version）
+            self.query_embedding_cache = cache_manager.namespace(
+                "query_embedding",
+                ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+                max_entries=settings.QUERY_EMBEDDING_CACHE_SIZE,
+                encode=lambda embedding: np.asarray(embedding, dtype=np.float32).tobytes(),
+                decode=lambda data: np.frombuffer(data, dtype=np.float32).tolist()
             )
-
-            # 初始化工具列表
-            self.tools = []
-            
-            # 根据settings决定是否启用网络搜索
-            if settings.USE_WEB_SEARCH:
-                # 初始化搜索工具
-                general_search = DuckDuckGoSearchAPIWrapper(
-                    region="cn-zh",
-                    max_results=20,
-                    time='m',
-                    safesearch='moderate'
-                )
-
-                # 初始化商品搜索工具
-                product_search = DuckDuckGoSearchAPIWrapper(
-                    region="cn-zh",
-                    max_results=20,
-                    time='m',
-                    safesearch='moderate'
-                )
-
-                self.tools.extend([
-                    Tool(
-                        name="GeneralSearch",
-                        func=general_search.run,
-                        description="用于搜索一般信息的工具"
-                    ),
-                    Tool(
-                        name="ProductSearch",
-                        func=lambda q: product_search.run(f"site:https://www.1688.com/ OR site:jd.com OR site:https://www.yiwugo.com/ {q} 销量排行"),
-                        description="用于搜索商品信息的工具，会在主流电商平台搜索商品销量排行"
-                    )
-                ])
+            self.retrieval_cache = cache_manager.namespace(
+                "retrieval",
+                ttl=settings.RETRIEVAL_CACHE_TTL,
+                max_entries=settings.RETRIEVAL_CACHE_SIZE
+            )
+            # 推测生成统计
+            self.speculation_started = 0
+            self.speculation_hits = 0
+            self.speculation_wasted_tokens = 0
 
             logger.info("ChatService 初始化成功")
         except Exception as e:
             logger.error(f"ChatService 初始化失败: {str(e)}")
             raise
 
-    def _get_model(self) -> ChatOpenAI:
-        """根据当前设置获取对应的模型实例"""
+    def _get_model(self, route: Optional[ResolvedRoute] = None) -> "ChatOpenAI":
+        """根据路由（默认按当前设置）获取对应的模型实例"""
+        from langchain_openai import ChatOpenAI
+        route = route or model_router.resolve(None)
         try:
-            if settings.MODEL_PROVIDER == "openai":
+            if route.provider == "openai":
                 return ChatOpenAI(
-                    model=settings.MODEL_NAME,
-                    temperature=0.7,
+                    model=route.model,
+                    temperature=route.temperature,
+                    max_tokens=route.max_tokens,
                     streaming=True,
-                    api_key=settings.OPENAI_API_KEY
+                    api_key=settings.OPENAI_API_KEY,
+                    max_retries=0  # 限流重试由出站调度器统一处理
                 )
             else:  # deepseek
                 return ChatOpenAI(
-                    model='deepseek-chat',
+                    model=route.model,
                     api_key=settings.DEEPSEEK_API_KEY,  # 使用修正后的变量名
                     base_url='https://api.deepseek.com/v1',
-                    temperature=0.7,
-                    streaming=True
+                    temperature=route.temperature,
+                    max_tokens=route.max_tokens,
+                    streaming=True,
+                    max_retries=0
                 )
         except Exception as e:
             logger.error(f"模型初始化失败: {str(e)}")
@@ -191,14 +228,18 @@ class ChatService:
         return ChatPromptTemplate.from_messages(messages)
 
     def format_message_history(
-        self, messages: List[Dict[str, Any]]
+        self, messages: List[Union[Dict[str, Any], BaseMessage]]
     ) -> List[BaseMessage]:
         """
-        将消息历史记录格式化为模型所需的格式
+        将消息历史记录格式化为模型所需的格式（已格式化的 BaseMessage 直接保留）
         """
         formatted_messages = []
         try:
             for msg in messages:
+                if isinstance(msg, BaseMessage):
+                    formatted_messages.append(msg)
+                    continue
+
                 content = msg.get("content", "").strip()
                 if not content:
                     continue
@@ -309,10 +350,7 @@ class ChatService:
             # 投标文件评估
             CoreIntentType.EVALUATE_BID.value: lambda t: "\n".join((
                 "请评估以下投标文件：",
-                "1. 形式合规性",
-                "2. 技术响应度",
-                "3. 商务合理性",
-                "4. 风险提示",
+                *(f"{i}. {d}" for i, d in enumerate(EVALUATION_DIMENSIONS, 1)),
                 f"文件内容：{t}"
             )),
             # 采购流程咨询
@@ -401,20 +439,172 @@ class ChatService:
         
         return query
 
+    def _build_query(self, user_input: str, intent_result: Optional[IntentResult]) -> str:
+        """按意图识别结果构造发送给模型的查询，引用了本地法规库中的条文时附上原文"""
+        query = user_input
+        if intent_result and intent_result.core_intent:
+            query = self._process_core_intent(user_input, intent_result)
+            if intent_result.aux_intents:
+                query = self._enhance_with_aux_intents(query, intent_result)
+            elif isinstance(query, tuple):
+                # 推理说明仅用于日志，不进入提示词
+                query = query[0]
+
+        articles = statute_store.find_references(user_input)
+        if articles:
+            query = self._construct_statute_query(query, articles)
+        return query
+
+    def _construct_statute_query(self, query: str, articles: List[Article]) -> str:
+        """在查询前附上所引用法规条文的原文"""
+        statutes = "\n".join(article.format() for article in articles)
+        return (
+            f"以下为用户所引用法规条文的原文（来自本地法规库）：\n"
+            f"{statutes}\n"
+            f"请以上述原文为准进行解读：\n{query}"
+        )
+
+    def _can_speculate(
+        self,
+        message_history: List[Union[Dict[str, Any], BaseMessage]],
+        user_id: Optional[str],
+        deadline: Optional[Deadline]
+    ) -> bool:
+        """
+        是否可以在意图识别期间推测生成：
+        提示词需只取决于意图，启用网络搜索/文档检索或语义回复缓存时不推测
+        """
+        if not (settings.SPECULATIVE_GENERATION_ENABLED and settings.USE_INTENT_DETECTION):
+            return False
+        if settings.USE_WEB_SEARCH:
+            return False
+        if settings.RESPONSE_CACHE_ENABLED and len(message_history) <= settings.RESPONSE_CACHE_MAX_HISTORY:
+            return False
+        return deadline is None or "intent_detection" not in deadline.disabled_stages
+
+    def _start_speculation(self, user_input: str, formatted_history: List[BaseMessage]) -> _Speculation:
+        """按通用闲聊意图的提示词启动流式生成"""
+        chat_intent = IntentResult(
+            core_intent=CoreIntentType.CHAT_GENERAL.value,
+            aux_intents=[],
+            confidence_score=1.0,
+            risk_level="low"
+        )
+        route = model_router.resolve_intent(chat_intent.core_intent, chat_intent.risk_level)
+        query = self._build_query(user_input, chat_intent)
+        chain = self._get_prompt_template() | self._get_model(route)
+        prompt_tokens = (
+            estimate_tokens(settings.SYSTEM_PROMPT)
+            + estimate_tokens(query)
+            + sum(estimate_tokens(m.content) for m in formatted_history)
+        )
+        chunks: List[str] = []
+
+        async def stream() -> str:
+            with tracer.span("chat.speculative_llm", provider=route.provider, model=route.model,
+                             estimated_prompt_tokens=prompt_tokens) as span:
+                started = time.perf_counter()
+                async for chunk in chain.astream({"input": query, "history": formatted_history}):
+                    if not chunks:
+                        elapsed = time.perf_counter() - started
+                        STAGE_LATENCY.observe(elapsed, "llm_first_token")
+                        span.set_attribute("first_token_ms", round(elapsed * 1000, 3))
+                    chunks.append(chunk.content)
+                span.set_attribute("chunks", len(chunks))
+                return "".join(chunks)
+
+        task = asyncio.ensure_future(api_scheduler.run(
+            route.provider,
+            stream,
+            tokens=prompt_tokens + (route.max_tokens or DEFAULT_OUTPUT_TOKENS),
+            priority=Priority.INTERACTIVE
+        ))
+        self.speculation_started += 1
+        return _Speculation(route=route, query=query, prompt_tokens=prompt_tokens, task=task, chunks=chunks)
+
+    def _cancel_speculation(self, speculation: _Speculation) -> None:
+        """取消推测生成并记录浪费的 token（已发送的提示词 + 已生成的部分）"""
+        if speculation.task.done():
+            if not speculation.task.cancelled():
+                speculation.task.exception()  # 取出异常，避免未处理异常告警
+        else:
+            speculation.task.cancel()
+        # 尚未开始输出时请求可能仍在调度器排队，未产生实际消耗
+        if speculation.chunks:
+            wasted_output = "".join(speculation.chunks)
+            self.speculation_wasted_tokens += speculation.prompt_tokens + estimate_tokens(wasted_output)
+
+    def speculation_stats(self) -> Dict[str, float]:
+        """推测生成的命中率与浪费的 token 数"""
+        return {
+            "started": self.speculation_started,
+            "hits": self.speculation_hits,
+            "hit_rate": round(self.speculation_hits / self.speculation_started, 3) if self.speculation_started else 0.0,
+            "wasted_tokens": self.speculation_wasted_tokens,
+        }
+
+    async def _embed_query(self, text: str) -> List[float]:
+        """生成查询向量：先查缓存，相同文本的并发请求合并，不同文本由向量服务微批发送"""
+        with STAGE_LATENCY.time("query_embedding"), tracer.span("chat.query_embedding") as span:
+            key = f"{settings.EMBEDDING_MODEL}:{text}"
+            embedding = await self.query_embedding_cache.aget(key)
+            span.set_attribute("cache_hit", embedding is not None)
+            if embedding is not None:
+                return embedding
+
+            async def embed() -> List[float]:
+                result = await embedding_service.embed_query(text)
+                await self.query_embedding_cache.aset(key, result)
+                return result
+
+            return await self.embedding_flight.do(text, embed)
+
     async def _get_relevant_docs(
-        self, query: str, user_id: str
+        self, query: str, user_id: str, deadline: Optional[Deadline] = None
     ) -> List[Dict]:
         """
-        获取相关文档片段
+        获取相关文档片段，剩余时间预算不足或检索超时时返回空列表
         """
-        try:
-            # 使用 self.embeddings 来生成嵌入
-            query_embedding = await asyncio.to_thread(
-                self.embeddings.embed_query,
-                query
+        timeout = None
+        if deadline is not None:
+            timeout = deadline.stage_budget(
+                "retrieval", settings.RETRIEVAL_STAGE_TIMEOUT, reserve=settings.GENERATION_RESERVE_SECONDS
             )
-            
-            # 将同步的 Supabase RPC 调用包装在 asyncio.to_thread 中执行
+            if timeout is None:
+                logger.info("剩余时间不足，跳过文档检索")
+                return []
+
+        try:
+            return await asyncio.wait_for(self._match_documents(query, user_id), timeout)
+        except asyncio.TimeoutError:
+            # 未设预算时超时来自检索内部（如下游调用超时），按检索失败处理
+            if deadline is not None:
+                logger.warning(f"文档检索超过{timeout:.1f}秒，跳过")
+                deadline.skip("retrieval")
+            else:
+                logger.error("文档检索超时")
+            return []
+        except Exception as e:
+            logger.error(f"获取相关文档失败: {str(e)}")
+            return []
+
+    @traced("chat.retrieval")
+    async def _match_documents(self, query: str, user_id: str) -> List[Dict]:
+        """向量检索用户文档，结果按用户的文档版本缓存（文档处理完成后旧结果不再命中）"""
+        version = await document_service.document_version(user_id)
+        key = f"{user_id}:{version}:{query}"
+        # 文档版本不可靠（local 模式且多进程部署）时不缓存
+        cached = await self.retrieval_cache.aget(key) if version is not None else None
+        current_span().set_attribute("cache_hit", cached is not None)
+        if cached is not None:
+            current_span().set_attribute("docs", len(cached))
+            return cached
+
+        # 生成查询向量
+        query_embedding = await self._embed_query(query)
+        
+        # 将同步的 Supabase RPC 调用包装在 asyncio.to_thread 中执行
+        with STAGE_LATENCY.time("match_documents"), tracer.span("supabase.match_documents"):
             result = await asyncio.to_thread(
                 lambda: supabase_service.client.rpc(
                     'match_documents',
@@ -426,13 +616,12 @@ class ChatService:
                     }
                 ).execute()
             )
-            
-            if result.data:
-                return result.data
-            return []
-        except Exception as e:
-            logger.error(f"获取相关文档失败: {str(e)}")
-            return []
+        
+        docs = result.data or []
+        current_span().set_attribute("docs", len(docs))
+        if version is not None:
+            await self.retrieval_cache.aset(key, docs)
+        return docs
 
     def _construct_doc_query(self, user_input: str, docs: List[Dict]) -> str:
         """构造基于文档的查询"""
@@ -454,6 +643,31 @@ class ChatService:
             f"3. 需要补充时，可以使用搜索工具"
         )
 
+    @traced("chat.web_search")
+    async def _get_search_digest(self, query: str, deadline: Optional[Deadline] = None) -> str:
+        """网络搜索摘要，剩余时间预算不足时跳过"""
+        timeout = None
+        if deadline is not None:
+            timeout = deadline.stage_budget(
+                "web_search", settings.WEB_SEARCH_TIMEOUT, reserve=settings.GENERATION_RESERVE_SECONDS
+            )
+            if timeout is None:
+                logger.info("剩余时间不足，跳过网络搜索")
+                return ""
+        try:
+            return await web_search_service.build_context(query, timeout=timeout)
+        except Exception as e:
+            logger.error(f"网络搜索失败: {str(e)}")
+            return ""
+
+    def _construct_search_query(self, query: str, digest: str) -> str:
+        """在查询后附加网络搜索摘要"""
+        return (
+            f"{query}\n\n"
+            f"网络搜索结果摘要（已去除重复内容，仅供参考）：\n"
+            f"{digest}"
+        )
+
     def _extract_response(self, response: Any) -> str:
         """从响应中提取有效内容并优化可读性"""
         try:
@@ -509,59 +723,196 @@ class ChatService:
         cleaned = re.sub(r'\n\s*\n', '\n\n', text.strip())
         return cleaned
 
+    def _system_prompt_hash(self) -> str:
+        """当前系统提示词的哈希，用于区分不同配置下的生成结果"""
+        return hashlib.sha256(settings.SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:16]
+
+    def _response_flight_key(self, user_input: str, user_id: Optional[str]) -> Tuple:
+        """
+        无历史消息时的请求合并键：输入相同且生成配置相同的请求视为相同请求
+        启用文档检索时检索结果与用户相关，键中需包含 user_id
+        """
+        return (
+            settings.MODEL_PROVIDER,
+            settings.MODEL_NAME,
+            self._system_prompt_hash(),
+            settings.USE_INTENT_DETECTION,
+            settings.USE_WEB_SEARCH,
+            user_id if settings.USE_WEB_SEARCH else None,
+            user_input
+        )
+
+    def _response_cache_bucket(self, intent_result: Optional[IntentResult], user_id: Optional[str]) -> Tuple:
+        """
+        语义回复缓存分桶键：(系统提示词哈希, 核心意图, 模型提供商)
+        启用文档检索时回复依赖用户文档，需按用户隔离
+        """
+        return (
+            self._system_prompt_hash(),
+            intent_result.core_intent if intent_result else None,
+            model_router.resolve(intent_result).provider,
+            user_id if settings.USE_WEB_SEARCH else None
+        )
+
     async def generate_response(
         self, 
         user_input: str, 
-        message_history: List[Dict[str, Any]], 
-        user_id: Optional[str] = None
+        message_history: List[Union[Dict[str, Any], BaseMessage]], 
+        user_id: Optional[str] = None,
+        deadline: Optional[Deadline] = None
     ) -> str:
-        """根据用户输入和历史消息生成 AI 回复"""
+        """
+        根据用户输入和历史消息生成 AI 回复
+
+        Args:
+            deadline: 请求截止时间；预算不足时跳过可选阶段，被跳过的阶段记录在 deadline.skipped_stages
+        """
+        with tracer.span("chat.generate", history_messages=len(message_history)) as span:
+            # 无历史消息时回复只取决于输入，相同问题的并发请求共享一次生成
+            if not message_history:
+                async def generate_shared() -> Tuple[str, List[str]]:
+                    # 跟随者等待的是首个请求的生成，各阶段 span 只出现在首个请求的链路中
+                    span.set_attribute("shared_flight_leader", True)
+                    response = await self._generate_response(user_input, message_history, user_id, deadline)
+                    return response, list(deadline.skipped_stages) if deadline else []
+
+                response, skipped_stages = await self.response_flight.do(
+                    self._response_flight_key(user_input, user_id),
+                    generate_shared
+                )
+                # 合并请求共享同一份降级记录
+                if deadline is not None:
+                    for stage in skipped_stages:
+                        deadline.skip(stage)
+            else:
+                response = await self._generate_response(user_input, message_history, user_id, deadline)
+            if deadline is not None and deadline.skipped_stages:
+                span.set_attribute("skipped_stages", list(deadline.skipped_stages))
+            return response
+
+    async def _generate_response(
+        self,
+        user_input: str,
+        message_history: List[Union[Dict[str, Any], BaseMessage]],
+        user_id: Optional[str] = None,
+        deadline: Optional[Deadline] = None
+    ) -> str:
+        """生成 AI 回复的具体实现（含重试）"""
         max_retries = 3
         last_error = None
+        # 上一次尝试实际调用的提供商（路由解析前沿用全局设置），用于重试计数与日志
+        provider = settings.MODEL_PROVIDER
         
         for attempt in range(max_retries):
+            # 重试前确认剩余时间仍够完成一次生成，避免重试叠加超出预算
+            if deadline is not None and attempt > 0 and not deadline.allows(settings.GENERATION_RESERVE_SECONDS / 2):
+                raise DeadlineExceeded(f"剩余时间不足，放弃第{attempt + 1}次尝试: {str(last_error)}")
+            if attempt > 0:
+                RETRIES.inc(provider, "generation")
+                current_span().add_event("retry", attempt=attempt + 1, error=str(last_error))
+            speculation = None
             try:
-                # 获取当前设置对应的模型实例
-                model = self._get_model()
-                
+                # 首次尝试时按通用闲聊提示词推测生成，与意图识别并行
+                formatted_history = self.format_message_history(message_history)
+                if attempt == 0 and self._can_speculate(message_history, user_id, deadline):
+                    speculation = self._start_speculation(user_input, formatted_history)
+
                 # 1. 意图识别
                 intent_result = None
                 if settings.USE_INTENT_DETECTION:
-                    intent_result = await intent_service.classify_intent(user_input)
+                    with STAGE_LATENCY.time("intent_detection"):
+                        intent_result = await intent_service.classify_intent(user_input, deadline=deadline)
+
+                # 按意图选择模型与输出上限
+                route = model_router.resolve(intent_result)
+                provider = route.provider
+                model = self._get_model(route)
+                current_span().set_attributes(route=route.name, provider=route.provider, model=route.model)
+
+                # 语义回复缓存：仅用于无历史或历史很短的对话
+                cache_bucket, cache_embedding = None, None
+                if settings.RESPONSE_CACHE_ENABLED and len(message_history) <= settings.RESPONSE_CACHE_MAX_HISTORY:
+                    try:
+                        cache_bucket = self._response_cache_bucket(intent_result, user_id)
+                        cache_embedding = await self._embed_query(user_input)
+                        cached_response = response_cache.lookup(cache_bucket, cache_embedding)
+                        current_span().set_attribute("response_cache_hit", cached_response is not None)
+                        if cached_response is not None:
+                            return cached_response
+                    except Exception as e:
+                        logger.warning(f"语义回复缓存查询失败，继续生成: {str(e)}")
+                        cache_bucket = None
                 
                 # 2. 处理查询
-                query_input = user_input
-                if intent_result and intent_result.core_intent:  # 修复 && 为 and
-                    query_input = self._process_core_intent(user_input, intent_result)
-                    if intent_result.aux_intents:
-                        query_input = self._enhance_with_aux_intents(query_input, intent_result)
-            
-                # 3. 格式化历史消息
-                formatted_history = self.format_message_history(message_history)
-                
-                # 4. 相关文档检索
-                if settings.USE_WEB_SEARCH and user_id:  # 修复 && 为 and
+                query_input = self._build_query(user_input, intent_result)
+
+                # 推测生成的提示词与模型和实际一致时直接沿用，否则取消后按意图重新生成
+                if speculation is not None:
+                    if speculation.route == route and speculation.query == query_input:
+                        self.speculation_hits += 1
+                        current_span().set_attribute("speculation_hit", True)
+                        logger.debug("推测生成命中，沿用已开始的生成")
+                    else:
+                        self._cancel_speculation(speculation)
+                        speculation = None
+
+                # 3. 相关文档检索与网络搜索（并发执行）
+                if settings.USE_WEB_SEARCH:
                     try:
-                        docs = await self._get_relevant_docs(query_input, user_id)
+                        docs, search_digest = await asyncio.gather(
+                            self._get_relevant_docs(query_input, user_id, deadline) if user_id else asyncio.sleep(0, []),
+                            self._get_search_digest(user_input, deadline)
+                        )
                         if docs:
                             query_input = self._construct_doc_query(query_input, docs)
+                        if search_digest:
+                            query_input = self._construct_search_query(query_input, search_digest)
                     except Exception as e:
                         logger.warning(f"文档检索失败，继续处理: {str(e)}")
                         # 文档检索失败不影响主流程
             
-                # 5. 创建 prompt 并生成回复
+                # 4. 创建 prompt 并生成回复
+                assembly_started = time.perf_counter()
                 prompt = self._get_prompt_template()
                 chain = prompt | model
                 
                 # 记录调试信息
-                logger.debug(f"尝试 {attempt + 1}: 发送请求到 {settings.MODEL_PROVIDER}")
+                logger.debug(f"尝试 {attempt + 1}: 发送请求到 {route.provider}/{route.model}（路由 {route.name}）")
                 logger.debug(f"Query input: {query_input}")
                 
-                # 发送请求并等待响应
-                response = await chain.ainvoke({
-                    "input": query_input,
-                    "history": formatted_history
-                })
+                # 发送请求并等待响应（经出站调度器排队，限流时遵循 Retry-After）
+                request_tokens = (
+                    estimate_tokens(settings.SYSTEM_PROMPT)
+                    + estimate_tokens(query_input)
+                    + sum(estimate_tokens(m.content) for m in formatted_history)
+                    + (route.max_tokens or DEFAULT_OUTPUT_TOKENS)
+                )
+                STAGE_LATENCY.observe(time.perf_counter() - assembly_started, "prompt_assembly")
+                with tracer.span("chat.llm", attempt=attempt + 1, speculative=speculation is not None,
+                                 estimated_tokens=request_tokens, max_tokens=route.max_tokens) as llm_span:
+                    llm_started = time.monotonic()
+                    if speculation is not None:
+                        llm_call = speculation.task
+                    else:
+                        first_token_timer = _FirstTokenTimer(llm_span)
+                        llm_call = api_scheduler.run(
+                            route.provider,
+                            lambda: chain.ainvoke(
+                                {"input": query_input, "history": formatted_history},
+                                config={"callbacks": [first_token_timer]}
+                            ),
+                            tokens=request_tokens,
+                            priority=Priority.INTERACTIVE
+                        )
+                    if deadline is not None:
+                        try:
+                            response = await asyncio.wait_for(llm_call, deadline.remaining())
+                        except asyncio.TimeoutError:
+                            raise DeadlineExceeded(f"回复生成超过{deadline.budget:.1f}秒时间预算")
+                    else:
+                        response = await llm_call
+                    model_router.record_latency(route, time.monotonic() - llm_started)
+                    STAGE_LATENCY.observe(time.monotonic() - llm_started, "llm_total")
                 
                 # 验证响应
                 if not response:
@@ -583,23 +934,37 @@ class ChatService:
                 
                 if not content.strip():
                     raise ValueError("无有效内容")
+                llm_span.set_attribute("estimated_output_tokens", estimate_tokens(content))
                 
                 # 清理响应文本
                 cleaned_response = self._clean_response_text(content)
-                logger.info(f"成功从{settings.MODEL_PROVIDER}获得响应")
+                logger.info(f"成功从{provider}获得响应")
+                # 有阶段被跳过（检索、搜索超时或过载降级）时回复不完整，不写入缓存
+                if cache_bucket is not None and not (deadline is not None and deadline.skipped_stages):
+                    response_cache.store(cache_bucket, user_input, cache_embedding, cleaned_response)
                 return cleaned_response
                 
+            except DeadlineExceeded:
+                if speculation is not None:
+                    self._cancel_speculation(speculation)
+                raise
+
             except (json.JSONDecodeError, ValueError) as e:
                 last_error = e
-                logger.warning(f"{settings.MODEL_PROVIDER} 响应解析错误 (尝试 {attempt + 1}): {str(e)}")
+                if speculation is not None:
+                    self._cancel_speculation(speculation)
+                logger.warning(f"{provider} 响应解析错误 (尝试 {attempt + 1}): {str(e)}")
                 if attempt < max_retries - 1:
                     await asyncio.sleep(1 * (attempt + 1))
                 continue
                 
             except Exception as e:
                 last_error = e
-                logger.warning(f"{settings.MODEL_PROVIDER} 请求失败 (尝试 {attempt + 1}): {str(e)}")
-                if attempt < max_retries - 1:
+                if speculation is not None:
+                    self._cancel_speculation(speculation)
+                logger.warning(f"{provider} 请求失败 (尝试 {attempt + 1}): {str(e)}")
+                # 限流已由调度器按 Retry-After 暂停，无需再额外等待
+                if attempt < max_retries - 1 and not isinstance(e, RateLimitExceeded):
                     await asyncio.sleep(1 * (attempt + 1))
                 continue
 
@@ -609,4 +974,29 @@ class ChatService:
         raise Exception(error_msg)
 
 # 全局服务实例
-chat_service = ChatService()
+chat_service = LazyService(ChatService, "chat_service")
+
+
+def _speculation_samples(key: str) -> List[Tuple[Tuple[str, ...], float]]:
+    """推测生成统计（服务尚未构造时不导出，避免抓取指标触发初始化）"""
+    if not chat_service.initialized:
+        return []
+    return [((), chat_service.speculation_stats()[key])]
+
+
+metrics_registry.register_family(
+    "speculation_started_total", "counter", "推测生成的启动次数", [],
+    lambda: _speculation_samples("started")
+)
+metrics_registry.register_family(
+    "speculation_hits_total", "counter", "推测生成被采用的次数", [],
+    lambda: _speculation_samples("hits")
+)
+metrics_registry.register_family(
+    "speculation_hit_rate", "gauge", "推测生成命中率", [],
+    lambda: _speculation_samples("hit_rate")
+)
+metrics_registry.register_family(
+    "speculation_wasted_tokens_total", "counter", "未被采用的推测生成消耗的 token 数（估算）", [],
+    lambda: _speculation_samples("wasted_tokens")
+)
@@ -1,9 +1,10 @@
 import asyncio
 import logging
 import os
+import time
+import uuid
 from enum import Enum
-from typing import List
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
+from typing import List, Optional
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -15,30 +16,83 @@ class FileProcessingStatus(Enum):
     completed = "completed"
     error = "error"  # 将 failed 改为 error 以匹配数据库约束
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 import tempfile
 import httpx
 from app.config import settings
 from app.services.supabase import supabase_service
+from app.services.progress_service import progress_broker
+from app.services.embedding_service import embedding_service
+from app.services.api_scheduler import Priority
+from app.services.bid_similarity import bid_similarity_service
+from app.services.cache import cache_manager
+from app.services.metrics import INGESTION_CHUNK_LATENCY
+from app.services.tracing import current_span, current_trace_id, tracer
+from app.utils.lazy import LazyService
 
 class DocumentService:
     def __init__(self):
-        self.embeddings = OpenAIEmbeddings(api_key=settings.OPENAI_API_KEY)
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             length_function=len,
         )
+        # 用户 -> 文档版本；检索结果缓存键包含版本，文档处理完成后更新版本即令旧结果失效。
+        # 有效期与检索缓存一致，版本过期时旧版本的检索结果也已过期；不使用近端，
+        # CACHE_MODE 为 remote / tiered 时各节点立即看到新版本，local 模式下版本只在本进程内有效
+        self._document_versions = cache_manager.namespace(
+            "document_version",
+            ttl=settings.RETRIEVAL_CACHE_TTL,
+            max_entries=settings.RETRIEVAL_CACHE_SIZE,
+            near=False
+        )
+
+    async def document_version(self, user_id: str) -> Optional[str]:
+        """
+        用户文档的当前版本
+
+        local 模式且多进程部署时返回 None：其他工作进程处理的上传不会更新本进程的版本，
+        调用方不应按版本缓存检索结果。
+        """
+        if self._document_versions.mode == "local" and settings.WEB_WORKERS > 1:
+            return None
+        return await self._document_versions.aget(user_id) or "0"
+
+    async def _bump_document_version(self, user_id: str) -> None:
+        await self._document_versions.aset(user_id, uuid.uuid4().hex)
+
+    def _publish_status(self, file_id: str, user_id: str, status: FileProcessingStatus,
+                        progress: int = None, error: str = None):
+        """向订阅者推送文件处理状态"""
+        event = {"status": status.value}
+        if progress is not None:
+            event["progress"] = progress
+        if error:
+            event["error"] = error
+        progress_broker.publish(file_id, user_id, event)
+
+    async def process_file(self, file_id: str, file_url: str, user_id: str,
+                           project_id: str = None, bidder: str = None):
+        """
+        处理上传的文件
 
-    async def process_file(self, file_id: str, file_url: str, user_id: str):
-        """处理上传的文件"""
+        指定 project_id 时，同时将文件写入该项目的投标文件相似度索引（与向量生成并行计算）。
+        处理在请求结束后的后台任务中运行，单独作为一条链路记录，沿用上传请求的 trace ID。
+        """
+        with tracer.trace("document.process", trace_id=current_trace_id(), file_id=file_id, project_id=project_id):
+            await self._process_file(file_id, file_url, user_id, project_id, bidder)
+
+    async def _process_file(self, file_id: str, file_url: str, user_id: str,
+                            project_id: str = None, bidder: str = None):
+        """处理上传文件的具体实现"""
         logger.info(f"开始处理文件: file_id={file_id}, url={file_url}")
         temp_path = None
 
         try:
             # 获取文件扩展名并验证
             file_extension = os.path.splitext(file_url)[1].lower()
+            # 文档加载器依赖较重，仅在处理文档时导入
+            from langchain_community.document_loaders import PyPDFLoader, TextLoader
             supported_extensions = {
                 '.pdf': PyPDFLoader,
                 '.txt': TextLoader
@@ -54,21 +108,25 @@ class DocumentService:
             except Exception as e:
                 logger.error(f"更新文件状态失败: {str(e)}")
                 return
+            self._publish_status(file_id, user_id, FileProcessingStatus.processing, progress=0)
 
             # 下载文件，增加重试和超时控制
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                for attempt in range(3):
-                    try:
-                        response = await client.get(file_url)
-                        response.raise_for_status()
-                        if len(response.content) == 0:
-                            raise ValueError("Downloaded file is empty")
-                        logger.info(f"文件下载成功: {file_url}, size: {len(response.content)} bytes")
-                        break
-                    except Exception as e:
-                        if attempt == 2:
-                            raise Exception(f"文件下载失败: {str(e)}")
-                        await asyncio.sleep(1 * (attempt + 1))
+            with tracer.span("document.download") as span:
+                async with httpx.AsyncClient(timeout=30.0) as client:
+                    for attempt in range(3):
+                        try:
+                            response = await client.get(file_url)
+                            response.raise_for_status()
+                            if len(response.content) == 0:
+                                raise ValueError("Downloaded file is empty")
+                            logger.info(f"文件下载成功: {file_url}, size: {len(response.content)} bytes")
+                            span.set_attributes(bytes=len(response.content), attempts=attempt + 1)
+                            break
+                        except Exception as e:
+                            span.add_event("retry", attempt=attempt + 1, error=str(e))
+                            if attempt == 2:
+                                raise Exception(f"文件下载失败: {str(e)}")
+                            await asyncio.sleep(1 * (attempt + 1))
 
             # 保存到临时文件，增加文件大小限制
             try:
@@ -89,33 +147,71 @@ class DocumentService:
                 raise e
 
             # 使用对应的加载器
-            loader_class = supported_extensions[file_extension]
-            loader = loader_class(temp_path)
-            if file_extension == '.txt':
-                loader = TextLoader(temp_path, encoding='utf-8', autodetect_encoding=True)
-            documents = loader.load()
+            with tracer.span("document.load_and_split", file_type=file_extension) as span:
+                loader_class = supported_extensions[file_extension]
+                loader = loader_class(temp_path)
+                if file_extension == '.txt':
+                    loader = TextLoader(temp_path, encoding='utf-8', autodetect_encoding=True)
+                documents = loader.load()
+
+                # 分块
+                chunks = self.text_splitter.split_documents(documents)
+                span.set_attributes(pages=len(documents), chunks=len(chunks))
+            current_span().set_attribute("chunks", len(chunks))
 
-            # 分块
-            chunks = self.text_splitter.split_documents(documents)
+            similarity_task = None
+            # 相似度索引保存在进程内，多进程部署时查询接口不可用，不再写入
+            if project_id and settings.WEB_WORKERS == 1:
+                similarity_task = asyncio.ensure_future(asyncio.to_thread(
+                    bid_similarity_service.add_document,
+                    project_id, file_id, [c.page_content for c in chunks], bidder
+                ))
 
             # 生成向量嵌入并存储
             total_chunks = len(chunks)
+            # 每块都推送进度事件，数据库中的 progress 仅按检查点写入
+            last_checkpoint_progress = 0
+            last_checkpoint_time = time.monotonic()
+            # 向量按组批量请求，组大小与向量服务的单批上限一致
+            group_size = embedding_service.max_batch_size
+            group_embeddings = []
             for i, chunk in enumerate(chunks):
                 try:
                     logger.info(f"处理文档块 {i+1}/{total_chunks}")
-                    embedding = await self.embeddings.aembed_query(chunk.page_content)
+                    chunk_started = time.perf_counter()
+                    if i % group_size == 0:
+                        group = [c.page_content for c in chunks[i:i + group_size]]
+                        with tracer.span("document.embed_group", first_chunk=i, chunks=len(group)):
+                            group_embeddings = await embedding_service.embed_documents(
+                                group,
+                                priority=Priority.BACKGROUND
+                            )
+                    embedding = group_embeddings[i % group_size]
                     await supabase_service.store_document_chunk(
                         file_id=file_id,
                         user_id=user_id,
                         content=chunk.page_content,
                         embedding=embedding
                     )
+                    # 分组请求向量的耗时计入每组第一块
+                    INGESTION_CHUNK_LATENCY.observe(time.perf_counter() - chunk_started)
                     # 更新处理进度
                     progress = int(((i + 1) / total_chunks) * 100)
-                    await supabase_service.update_file_progress(file_id, progress)
+                    self._publish_status(file_id, user_id, FileProcessingStatus.processing, progress=progress)
+                    if (
+                        progress - last_checkpoint_progress >= settings.PROGRESS_CHECKPOINT_PERCENT
+                        or time.monotonic() - last_checkpoint_time >= settings.PROGRESS_CHECKPOINT_SECONDS
+                        or i + 1 == total_chunks
+                    ):
+                        await supabase_service.update_file_progress(file_id, progress)
+                        last_checkpoint_progress = progress
+                        last_checkpoint_time = time.monotonic()
                     logger.info(f"成功保存文档块 {i+1}, 进度: {progress}%")
                 except Exception as e:
                     logger.error(f"处理文档块 {i+1} 失败: {str(e)}")
+                    if i > 0:
+                        # 已入库的文档块会出现在检索结果中
+                        await self._bump_document_version(user_id)
                     # 更新文件状态为错误，并记录具体错误信息
                     await supabase_service.update_file_status(
                         file_id, 
@@ -124,12 +220,23 @@ class DocumentService:
                     )
                     raise
 
+            await self._bump_document_version(user_id)
+
+            if similarity_task is not None:
+                try:
+                    await similarity_task
+                except Exception as e:
+                    # 相似度索引失败不影响文档入库
+                    logger.error(f"文件{file_id}写入相似度索引失败: {str(e)}")
+
             # 更新文件状态为完成
             await supabase_service.update_file_status(file_id, FileProcessingStatus.completed.value)
+            self._publish_status(file_id, user_id, FileProcessingStatus.completed, progress=100)
 
         except Exception as e:
             # 更新文件状态为失败
             logger.error(f"处理文件失败: {str(e)}")
+            self._publish_status(file_id, user_id, FileProcessingStatus.error, error=str(e))
             await supabase_service.update_file_status(file_id, FileProcessingStatus.error.value)
             raise e
         finally:
@@ -141,4 +248,4 @@ class DocumentService:
                 except Exception as e:
                     logger.error(f"清理临时文件失败: {str(e)}")
 
-document_service = DocumentService()
+document_service = LazyService(DocumentService, "document_service")
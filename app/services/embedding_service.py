@@ -0,0 +1,159 @@
+"""
+向量嵌入服务：跨请求动态微批（micro-batching）的共享 embedding 调用
+
+并发的 embed_query 请求在短时间窗口（默认数毫秒）内或攒够 N 条后合并为一次批量 API 调用，
+再将结果分发回各调用方，避免高并发下大量单条请求触发限流。
+"""
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.api_scheduler import api_scheduler, estimate_tokens, Priority
+from app.services.metrics import metrics_registry
+
+if TYPE_CHECKING:
+    from langchain_openai import OpenAIEmbeddings
+
+logger = logging.getLogger(__name__)
+
+# 批大小分布统计的区间上界
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, float("inf"))
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else str(int(bound))
+
+
+class EmbeddingService:
+    def __init__(self, max_wait_ms: float = None, max_batch_size: int = None):
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else settings.EMBEDDING_BATCH_MAX_WAIT_MS) / 1000
+        self.max_batch_size = max_batch_size or settings.EMBEDDING_BATCH_MAX_SIZE
+        self._clients: Dict[str, "OpenAIEmbeddings"] = {}
+        # (模型, 优先级) -> 待发送的 (文本, future) 列表；不同优先级分开成批，以便调度器优先放行交互请求
+        self._pending: Dict[Tuple[str, Priority], List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[Tuple[str, Priority], asyncio.TimerHandle] = {}
+        # 批大小统计
+        self.batches = 0
+        self.inputs = 0
+        self.max_observed_batch = 0
+        self.batch_size_counts = {bound: 0 for bound in BATCH_SIZE_BUCKETS}
+
+    def _get_client(self, model: str) -> "OpenAIEmbeddings":
+        client = self._clients.get(model)
+        if client is None:
+            from langchain_openai import OpenAIEmbeddings
+            # 限流重试由调度器统一处理
+            client = OpenAIEmbeddings(model=model, api_key=settings.OPENAI_API_KEY, max_retries=0)
+            self._clients[model] = client
+        return client
+
+    async def embed_query(
+        self,
+        text: str,
+        model: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE
+    ) -> List[float]:
+        """
+        获取单条文本的向量，与同一时间窗口内的其他请求合并发送
+
+        Args:
+            text: 待向量化文本
+            model: 向量模型名称，默认使用 EMBEDDING_MODEL
+            priority: 调用优先级，后台任务使用 Priority.BACKGROUND
+
+        Returns:
+            List[float]: 向量
+        """
+        key = (model or settings.EMBEDDING_MODEL, priority)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((text, future))
+
+        if len(pending) >= self.max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+
+        return await future
+
+    async def embed_documents(
+        self,
+        texts: List[str],
+        model: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE
+    ) -> List[List[float]]:
+        """批量获取多条文本的向量（同样参与跨请求合并）"""
+        return list(await asyncio.gather(*(self.embed_query(text, model, priority) for text in texts)))
+
+    def _flush(self, key: Tuple[str, Priority]) -> None:
+        """取出当前待发送批次并异步执行"""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, [])
+        if batch:
+            asyncio.ensure_future(self._run_batch(key, batch))
+
+    async def _run_batch(self, key: Tuple[str, Priority], batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """经调度器执行一次批量调用，相同文本只发送一次"""
+        model, priority = key
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        self._record_batch(len(unique_texts))
+
+        try:
+            vectors = await api_scheduler.run(
+                "openai",
+                lambda: self._get_client(model).aembed_documents(unique_texts),
+                tokens=sum(estimate_tokens(text) for text in unique_texts),
+                priority=priority
+            )
+        except Exception as e:
+            logger.error(f"批量获取向量失败（{len(unique_texts)}条）: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(unique_texts, vectors))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def _record_batch(self, size: int) -> None:
+        self.batches += 1
+        self.inputs += size
+        self.max_observed_batch = max(self.max_observed_batch, size)
+        for bound in BATCH_SIZE_BUCKETS:
+            if size <= bound:
+                self.batch_size_counts[bound] += 1
+                break
+        logger.debug(f"批量向量请求: {size}条")
+
+    def stats(self) -> Dict[str, float]:
+        """返回批大小统计"""
+        return {
+            "batches": self.batches,
+            "inputs": self.inputs,
+            "avg_batch_size": round(self.inputs / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_observed_batch,
+            "batch_size_counts": dict(self.batch_size_counts)
+        }
+
+
+# 全局实例
+embedding_service = EmbeddingService()
+metrics_registry.register_family(
+    "embedding_batches_total", "counter", "批量向量请求次数（size：批大小所在区间的上界）", ["size"],
+    lambda: [((_format_bound(bound),), count) for bound, count in embedding_service.stats()["batch_size_counts"].items()
+             if count]
+)
+metrics_registry.register_family(
+    "embedding_batch_inputs_total", "counter", "批量向量请求中的文本总数（除以批次数即平均批大小）", [],
+    lambda: [((), embedding_service.stats()["inputs"])]
+)
+metrics_registry.register_family(
+    "embedding_batch_size_max", "gauge", "观测到的最大批大小", [],
+    lambda: [((), embedding_service.stats()["max_batch_size"])]
+)
@@ -0,0 +1,212 @@
+"""
+对话历史缓存模块：按对话缓存已格式化的 BaseMessage 列表
+
+每轮对话只按 created_at 键集增量拉取新消息并追加，缓存按总字节数做 LRU 淘汰，
+将每轮 O(对话长度) 的数据库读取降为 O(新消息数)。
+
+多进程部署（WEB_WORKERS > 1）时不启用：其他进程排队中尚未落库的消息可能早于本进程已读到的
+消息，键集游标越过它们后这些消息将永远拉取不到，因此每轮都全量读取数据库。
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+
+from app.config import settings
+from app.services.metrics import metrics_registry
+from app.services.supabase import supabase_service
+from app.services.tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+# 每条消息除正文外的估算开销（对象头、字段等）
+MESSAGE_OVERHEAD_BYTES = 64
+
+
+def _parse_timestamp(value: str) -> datetime:
+    """解析 Supabase 返回的 ISO 时间戳"""
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _to_message(row: Dict[str, Any]) -> Optional[BaseMessage]:
+    """将 messages 表记录转换为 BaseMessage，空内容返回 None"""
+    content = (row.get("content") or "").strip()
+    if not content:
+        return None
+    if row.get("is_user"):
+        return HumanMessage(content=content)
+    return AIMessage(content=content)
+
+
+def _message_size(message: BaseMessage) -> int:
+    return len(message.content.encode("utf-8")) + MESSAGE_OVERHEAD_BYTES
+
+
+@dataclass
+class _HistoryEntry:
+    """单个对话的缓存项"""
+    messages: List[BaseMessage] = field(default_factory=list)
+    last_created_at: Optional[str] = None
+    # 与 last_created_at 相同时间戳的消息 id，用于键集查询去重
+    boundary_ids: Set[str] = field(default_factory=set)
+    size: int = 0
+
+    def apply(self, rows: List[Dict[str, Any]]) -> int:
+        """追加比当前游标更新的消息，返回实际追加条数"""
+        appended = 0
+        last_ts = _parse_timestamp(self.last_created_at) if self.last_created_at else None
+        for row in rows:
+            created_at = row.get("created_at")
+            if not created_at:
+                continue
+            ts = _parse_timestamp(created_at)
+            if last_ts is not None:
+                if ts < last_ts:
+                    continue
+                if ts == last_ts and row.get("id") in self.boundary_ids:
+                    continue
+
+            if last_ts is None or ts > last_ts:
+                last_ts = ts
+                self.last_created_at = created_at
+                self.boundary_ids = set()
+            if row.get("id"):
+                self.boundary_ids.add(row["id"])
+
+            message = _to_message(row)
+            if message is None:
+                continue
+            self.messages.append(message)
+            self.size += _message_size(message)
+            appended += 1
+        return appended
+
+
+class ConversationHistoryCache:
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes if max_bytes is not None else settings.HISTORY_CACHE_MAX_BYTES
+        self._entries: "OrderedDict[str, _HistoryEntry]" = OrderedDict()
+        # 各缓存项计入总量时的字节数（缓存项会被原地追加，不能直接用 entry.size 扣减）
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        """仅单进程部署时缓存：多进程下各进程的写入队列互不可见，增量游标会跳过其他进程的消息"""
+        return settings.WEB_WORKERS == 1
+
+    async def get_history(self, conversation_id: str, user_id: Optional[str] = None) -> List[BaseMessage]:
+        """
+        获取对话的格式化历史消息
+
+        命中缓存时仅增量拉取新消息；未命中时全量拉取并建立缓存项。
+
+        Args:
+            conversation_id (str): 对话ID
+            user_id (str, optional): 用户ID，用于权限验证
+
+        Returns:
+            List[BaseMessage]: 按时间顺序排列的历史消息
+        """
+        if not self.enabled:
+            rows = await asyncio.to_thread(
+                supabase_service.get_conversation_messages, conversation_id, user_id
+            )
+            return [message for message in map(_to_message, rows) if message is not None]
+
+        entry = self._entries.get(conversation_id)
+
+        if entry is None:
+            self.misses += 1
+            current_span().set_attribute("cache_hit", False)
+            rows = await asyncio.to_thread(
+                supabase_service.get_conversation_messages, conversation_id, user_id
+            )
+            # 全量拉取期间可能已有其他请求建立了缓存项
+            entry = self._entries.get(conversation_id) or _HistoryEntry()
+            entry.apply(rows)
+            self._store(conversation_id, entry)
+            logger.debug(f"对话{conversation_id}历史缓存未命中，已加载{len(entry.messages)}条消息")
+            return list(entry.messages)
+
+        self.hits += 1
+        current_span().set_attribute("cache_hit", True)
+        # 权限校验与增量拉取在同一次查询中完成
+        if entry.last_created_at:
+            rows = await asyncio.to_thread(
+                supabase_service.get_messages_since, conversation_id, entry.last_created_at, user_id
+            )
+        else:
+            rows = await asyncio.to_thread(
+                supabase_service.get_conversation_messages, conversation_id, user_id
+            )
+
+        # 拉取期间缓存项可能已被淘汰，此时重新放入
+        current = self._entries.get(conversation_id, entry)
+        appended = current.apply(rows)
+        current_span().set_attribute("new_messages", appended)
+        self._store(conversation_id, current)
+        logger.debug(f"对话{conversation_id}历史缓存命中，增量追加{appended}条消息")
+        return list(current.messages)
+
+    def append(self, conversation_id: str, rows: List[Dict[str, Any]]) -> None:
+        """
+        将本进程写入的消息追加到已缓存的对话中（对话未缓存时忽略）
+
+        Args:
+            conversation_id (str): 对话ID
+            rows (list): 包含 id, content, is_user, created_at 字段的消息记录
+        """
+        entry = self._entries.get(conversation_id)
+        if entry is None or not self.enabled:
+            return
+        entry.apply(rows)
+        self._store(conversation_id, entry)
+
+    def invalidate(self, conversation_id: str) -> None:
+        """移除指定对话的缓存项"""
+        self._entries.pop(conversation_id, None)
+        self._total_bytes -= self._sizes.pop(conversation_id, 0)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._sizes.clear()
+        self._total_bytes = 0
+
+    def _store(self, conversation_id: str, entry: _HistoryEntry) -> None:
+        """写入缓存项并按总字节数执行 LRU 淘汰"""
+        self.invalidate(conversation_id)
+
+        # 单个对话超过容量上限时不缓存
+        if entry.size > self.max_bytes:
+            return
+
+        self._entries[conversation_id] = entry
+        self._sizes[conversation_id] = entry.size
+        self._total_bytes += entry.size
+
+        while self._total_bytes > self.max_bytes and self._entries:
+            evicted_id, _ = self._entries.popitem(last=False)
+            evicted_size = self._sizes.pop(evicted_id, 0)
+            self._total_bytes -= evicted_size
+            logger.debug(f"历史缓存淘汰对话{evicted_id}，释放{evicted_size}字节")
+
+
+# 全局实例
+history_cache = ConversationHistoryCache()
+metrics_registry.register_cache(lambda: {"conversation_history": {
+    "hits": history_cache.hits, "misses": history_cache.misses, "size": len(history_cache)
+}})
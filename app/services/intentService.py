@@ -2,16 +2,32 @@
 # -*- coding: utf-8 -*-
 
 from enum import Enum
-from typing import Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 from pydantic import BaseModel
 import logging
 import json
+import orjson
 import re
+import warnings
+from functools import lru_cache
 from pydantic import BaseModel, Field
 from app.config import settings
 import httpx
 from datetime import datetime
-from openai import OpenAI
+import asyncio
+from app.utils.single_flight import SingleFlight
+from app.utils.serialization import dumps
+from app.services.cache import cache_manager
+from app.services.metrics import INTENT_CALL_LATENCY
+from app.services.tracing import current_span, traced, tracer
+from app.services.embedding_service import embedding_service
+from app.services.api_scheduler import api_scheduler, estimate_tokens, Priority
+from app.utils.deadline import Deadline
+from app.services.statute_store import statute_store, ARTICLE_PATTERN
+from app.utils.lazy import LazyService
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +58,34 @@ class AuxIntentType(str, Enum):
     UNCERTAINTY_DECLARE = "不确定性声明"  
     DEEP_REASONING = "深度推理请求"            
 
+# 信息冲突检测规则：(正则, 冲突分)
+CONFLICT_PATTERNS = [
+    (r"(虽然|尽管).*?(但是|然而)", 0.3),    # 转折连词
+    (r"(\d+%?[^-]{0,20}不同[^-]{0,20}\d+%?)", 0.4),  # 数值矛盾
+    (r"(应当|必须).*?(禁止|不得)", 0.5),     # 规范冲突
+    (r"((前者|前者).*?(后者|后者))", 0.2)    # 对立表述
+]
+
+# 批量识别时每条文本的格式开销与输出预估（token）
+BATCH_ITEM_INPUT_OVERHEAD = 12
+BATCH_ITEM_OUTPUT_TOKENS = 30
+
+# 意图识别流程异常时的默认结果（不写入缓存）
+_FALLBACK_RESULT = IntentResult(
+    core_intent=CoreIntentType.PROCUREMENT_CONSULT.value,
+    aux_intents=[AuxIntentType.UNCERTAINTY_DECLARE.value],
+    confidence_score=0.5,
+    risk_level="high"
+)
+
+
+@lru_cache(maxsize=None)
+def load_json_resource(path: str) -> dict:
+    """读取只读 JSON 资源（领域词典、风险规则），进程内只解析一次；多进程部署时在 fork 前预加载"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
 class ProcurementConfig(BaseModel):
     domain_dict_path: str = Field(settings.PROCUREMENT_DOMAIN_DICT_PATH)
     chat_intent_enabled: bool = Field(settings.CHAT_INTENT_ENABLED)
@@ -56,7 +100,21 @@ class IntentService:
         self.config = ProcurementConfig()
         self.domain_terms = self._load_domain_dict()
         self.http_client = httpx.AsyncClient(timeout=30.0)
-        self.oai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        from openai import OpenAI
+        # 限流重试由出站调度器统一处理
+        self.oai_client = OpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0)
+        # 相同文本的并发意图识别/向量请求合并为一次调用
+        self.intent_flight = SingleFlight("意图识别")
+        self.embedding_flight = SingleFlight("意图向量")
+        # 文本 -> 意图识别结果
+        self._intent_cache = cache_manager.namespace(
+            "intent",
+            ttl=settings.INTENT_CACHE_TTL,
+            max_entries=settings.INTENT_CACHE_SIZE,
+            encode=lambda result: dumps(result.model_dump()),
+            decode=lambda data: IntentResult(**orjson.loads(data))
+        )
+        self._risk_rules = None
         
         # 动态生成系统提示词
         core_intent_desc = "\n".join([f"{it.value} ({it.name})" for it in CoreIntentType])
@@ -86,19 +144,29 @@ class IntentService:
 }}
 ```
 请确保JSON格式正确，数值精度保留两位小数。
+"""
+
+        # 批量识别：一次调用识别多条文本，输出 JSON 数组
+        self.batch_system_prompt = f"""
+您是一个采购招投标领域专业意图识别引擎。输入为多行 JSON，每行一条待识别文本（i 为序号，law_ref 表示包含法律条款引用）。
+请为每条文本选择一个核心意图（与天气、问候等日常对话为通用闲聊；包含法律条款引用的优先匹配法规条款解读）：
+{core_intent_desc}
+
+并判断其风险等级(low/medium/high)。只输出一个 JSON 数组，按输入顺序每条一个对象：
+[{{"i": 0, "core_intent": "意图中文名称", "risk_level": "low"}}]
 """
 
     def _load_domain_dict(self) -> Dict[str, List[str]]:
         """加载采购领域专业词典"""
         try:
-            with open(self.config.domain_dict_path, 'r', encoding='utf-8') as f:
-                domain_data = json.load(f)
-                logger.info(f"成功加载领域词典，包含{len(domain_data)}个类别，总计{sum(len(v) for v in domain_data.values())}个术语")
-                return domain_data
+            domain_data = load_json_resource(self.config.domain_dict_path)
+            logger.info(f"成功加载领域词典，包含{len(domain_data)}个类别，总计{sum(len(v) for v in domain_data.values())}个术语")
+            return domain_data
         except Exception as e:
             logger.error(f"领域词典加载失败: {str(e)}")
             return {"risk_keywords": ["围标", "串标", "恶意低价", "资质造假"]}  # 默认风险关键词
 
+    @traced("intent.policy_check")
     async def _check_policy_updates(self) -> bool:
         """检查政策更新状态"""
         if not self.config.policy_monitor_endpoint:
@@ -150,14 +218,37 @@ class IntentService:
                 logger.error(f"OCR处理失败：{str(e)}")
         return ocr_text.strip()
 
-    def _get_embeddings(self, text: str) -> List[float]:
-        """获取OpenAI文本嵌入向量"""
+    async def _chat_completion(self, messages: List[Dict], temperature: float, max_tokens: int,
+                               priority: Priority = Priority.INTERACTIVE):
+        """经出站调度器调用意图识别模型（同步客户端在线程池中执行）"""
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        span = current_span()
+        span.set_attributes(model="gpt-4o-mini", estimated_prompt_tokens=prompt_tokens, max_tokens=max_tokens)
+        response = await api_scheduler.run(
+            "openai",
+            lambda: asyncio.to_thread(
+                self.oai_client.chat.completions.create,
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            ),
+            tokens=prompt_tokens + max_tokens,
+            priority=priority
+        )
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            span.set_attributes(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+        return response
+
+    async def _get_embeddings(self, text: str) -> List[float]:
+        """获取OpenAI文本嵌入向量，相同文本的并发请求合并"""
         try:
-            response = self.oai_client.embeddings.create(
-                input=text,
-                model=self.config.embedding_model
-            )
-            return response.data[0].embedding
+            with INTENT_CALL_LATENCY.time("embedding"), tracer.span("intent.embedding"):
+                return await self.embedding_flight.do(
+                    text,
+                    lambda: embedding_service.embed_query(text, self.config.embedding_model)
+                )
         except Exception as e:
             logger.error(f"获取文本向量失败: {str(e)}")
             return [0.0] * 1536  # text-embedding-3-small 默认维度
@@ -165,17 +256,62 @@ class IntentService:
     async def classify_intent(
         self, 
         text: str, 
-        files: Optional[List[Dict]] = None
-    ) -> IntentResult:
+        files: Optional[List[Dict]] = None,
+        deadline: Optional[Deadline] = None
+    ) -> Optional[IntentResult]:
         """
         层次化意图分类
         
         Args:
             text: 用户输入文本
             files: 可选的附件文件列表 [{"path": "文件路径", "type": "文件类型"}, ...]
+            deadline: 请求截止时间，剩余预算不足或识别超时时跳过意图识别
             
         Returns:
-            IntentResult: 意图识别结果
+            IntentResult | None: 意图识别结果；因时间预算被跳过时返回 None，调用方按未识别意图处理
+        """
+        with tracer.span("intent.classify", text_chars=len(text), files=len(files or [])) as span:
+            # 无附件时结果只取决于文本：先查缓存，相同文本的并发请求共享一次识别
+            if not files:
+                cached = await self._get_cached_intent(text)
+                span.set_attribute("cache_hit", cached is not None)
+                if cached is not None:
+                    span.set_attributes(core_intent=cached.core_intent, risk_level=cached.risk_level)
+                    return cached
+                classify = lambda: self.intent_flight.do(text, lambda: self._classify_and_cache(text))
+            else:
+                classify = lambda: self._classify_with_attachments(text, files)
+
+            if deadline is None:
+                result = await classify()
+            else:
+                timeout = deadline.stage_budget(
+                    "intent_detection", settings.INTENT_STAGE_TIMEOUT, reserve=settings.GENERATION_RESERVE_SECONDS
+                )
+                if timeout is None:
+                    logger.info("剩余时间不足，跳过意图识别")
+                    span.set_attribute("skipped", True)
+                    return None
+                try:
+                    result = await asyncio.wait_for(classify(), timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"意图识别超过{timeout:.1f}秒，按未识别意图处理")
+                    deadline.skip("intent_detection")
+                    span.set_attribute("timed_out", True)
+                    return None
+            span.set_attributes(core_intent=result.core_intent, risk_level=result.risk_level)
+            return result
+
+    async def _classify_intent(
+        self,
+        text: str,
+        files: Optional[List[Dict]] = None
+    ) -> Tuple[IntentResult, bool]:
+        """
+        层次化意图分类的具体实现
+
+        Returns:
+            (IntentResult, bool): 识别结果，以及是否有步骤因异常退回默认值（此时结果不可缓存）
         """
         try:
             # 1. 多模态处理
@@ -185,10 +321,10 @@ class IntentService:
                     text += " " + ocr_text
                 
             # 2. 特征提取
-            embeddings = self._get_embeddings(text)
+            embeddings = await self._get_embeddings(text)
             
             # 3. 核心意图分类
-            core_intent = await self._classify_core_intent(text)
+            core_intent, core_degraded = await self._classify_core_intent(text)
             
             # 4. 辅助意图检测
             aux_intents = await self._detect_aux_intents(text)
@@ -203,24 +339,39 @@ class IntentService:
             confidence = round(base_score + self._get_risk_bonus(text), 2)
             
             # 7. 风险评估
-            risk_level = await self._assess_risk(text)
+            risk_level, risk_degraded = await self._assess_risk(text)
             
             return IntentResult(
                 core_intent=core_intent.value,
                 aux_intents=[a.value for a in aux_intents],
                 confidence_score=confidence,
                 risk_level=risk_level
-            )
+            ), core_degraded or risk_degraded
 
         except Exception as e:
             logger.error(f"意图识别流程异常: {str(e)}", exc_info=True)
             # 返回默认结果
-            return IntentResult(
-                core_intent=CoreIntentType.PROCUREMENT_CONSULT.value,
-                aux_intents=[AuxIntentType.UNCERTAINTY_DECLARE.value],
-                confidence_score=0.5,
-                risk_level="high"
-            )
+            return _FALLBACK_RESULT, True
+
+    async def _classify_with_attachments(self, text: str, files: List[Dict]) -> IntentResult:
+        """识别带附件文本的意图（结果不缓存）"""
+        result, _ = await self._classify_intent(text, files)
+        return result
+
+    async def _classify_and_cache(self, text: str) -> IntentResult:
+        """识别无附件文本的意图，仅在各步骤均成功时写入缓存（临时故障的默认值不应占用缓存）"""
+        result, degraded = await self._classify_intent(text)
+        if not degraded:
+            await self._cache_intent(text, result)
+        return result
+
+    async def _get_cached_intent(self, text: str) -> Optional[IntentResult]:
+        """读取意图识别缓存，未命中或已过期返回 None"""
+        return await self._intent_cache.aget(text)
+
+    async def _cache_intent(self, text: str, result: IntentResult):
+        """写入意图识别缓存"""
+        await self._intent_cache.aset(text, result)
 
     def _extract_domain_features(self, text: str) -> Dict[str, float]:
         """提取领域特征（增强版）"""
@@ -231,8 +382,10 @@ class IntentService:
             # 核心术语权重更高
             features[f"term_{category}"] = matches * (2.0 if category == "core_terms" else 1.0)
         
-        # 2. 法律条款引用检测
-        features["law_ref"] = 1 if any(c in text for c in ["§", "第", "条"]) else 0
+        # 2. 法律条款引用检测（本地法规库可解析的引用，或“§”“第X条”形式）
+        features["law_ref"] = 1 if (
+            statute_store.find_references(text) or "§" in text or ARTICLE_PATTERN.search(text)
+        ) else 0
         
         # 3. 数值型特征提取
         features["numeric_count"] = len([c for c in text if c.isdigit()])
@@ -245,14 +398,8 @@ class IntentService:
 
     def _calculate_conflict(self, text: str) -> float:
         """计算信息冲突率（增强版）"""
-        conflict_patterns = [
-            (r"(虽然|尽管).*?(但是|然而)", 0.3),    # 转折连词
-            (r"(\d+%?[^-]{0,20}不同[^-]{0,20}\d+%?)", 0.4),  # 数值矛盾
-            (r"(应当|必须).*?(禁止|不得)", 0.5),     # 规范冲突
-            (r"((前者|前者).*?(后者|后者))", 0.2)    # 对立表述
-        ]
         total_score = 0.0
-        for pattern, score in conflict_patterns:
+        for pattern, score in CONFLICT_PATTERNS:
             if re.search(pattern, text):
                 total_score += score
         return min(total_score, 1.0)
@@ -300,8 +447,8 @@ class IntentService:
         # 标准化到0-1范围
         return min(conflict_score / len(aux_intents), 1.0)
 
-    async def _classify_core_intent(self, text: str) -> CoreIntentType:
-        """核心意图分类逻辑"""
+    async def _classify_core_intent(self, text: str) -> Tuple[CoreIntentType, bool]:
+        """核心意图分类逻辑，返回 (核心意图, 是否因模型调用异常退回默认值)"""
         # 1. 领域特征提取
         features = self._extract_domain_features(text)
         
@@ -317,23 +464,25 @@ class IntentService:
                 {"role": "user", "content": text}
             ]
 
-            response = self.oai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                temperature=0.1,
-                max_tokens=10
-            )
+            with INTENT_CALL_LATENCY.time("chat_check"), tracer.span("intent.chat_check"):
+                response = await self._chat_completion(
+                    messages,
+                    temperature=0.1,
+                    max_tokens=10
+                )
 
             result = response.choices[0].message.content.strip().lower()
             if result == "chat":
-                return CoreIntentType.CHAT_GENERAL
+                return CoreIntentType.CHAT_GENERAL, False
+            degraded = False
             
         except Exception as e:
             logger.warning(f"闲聊检测异常: {str(e)}")
+            degraded = True
         
         # 3. 非闲聊情况下，执行原有的规则匹配逻辑
         if any(kw in text for kw in self.domain_terms.get("risk_keywords", [])):
-            return CoreIntentType.RISK_ALERT
+            return CoreIntentType.RISK_ALERT, degraded
             
         # 3. OpenAI分类
         try:
@@ -342,23 +491,23 @@ class IntentService:
                 {"role": "system", "content": self.system_prompt},
                 {"role": "user", "content": f"文本内容：{text}\n\n特征信息：{json.dumps(features, ensure_ascii=False)}"}
             ]
-            response = self.oai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                temperature=0.2,
-                max_tokens=50
-            )
+            with INTENT_CALL_LATENCY.time("core_classify"), tracer.span("intent.core_classify"):
+                response = await self._chat_completion(
+                    messages,
+                    temperature=0.2,
+                    max_tokens=50
+                )
             
             intent_text = response.choices[0].message.content.strip()
             for intent_type in CoreIntentType:
                 if intent_type.value in intent_text:
-                    return intent_type
+                    return intent_type, degraded
                     
-            return CoreIntentType.PROCUREMENT_CONSULT
+            return CoreIntentType.PROCUREMENT_CONSULT, degraded
             
         except Exception as e:
             logger.error(f"OpenAI分类异常: {str(e)}")
-            return CoreIntentType.PROCUREMENT_CONSULT
+            return CoreIntentType.PROCUREMENT_CONSULT, True
 
     async def _detect_aux_intents(self, text: str) -> List[AuxIntentType]:
         """辅助意图检测"""
@@ -379,16 +528,14 @@ class IntentService:
             
         return aux_intents
 
-    async def _assess_risk(self, text: str) -> str:
-        """风险等级评估"""
+    async def _assess_risk(self, text: str) -> Tuple[str, bool]:
+        """风险等级评估，返回 (风险等级, 是否因异常退回 high)"""
         if settings.PROCUREMENT_RISK_MODE == "LOCAL":
             try:
-                with open(settings.LOCAL_RISK_RULES_PATH, 'r', encoding='utf-8') as f:
-                    risk_rules = json.load(f)
-                    return self._apply_local_risk_rules(text, risk_rules)
+                return self._apply_local_risk_rules(text, self._load_risk_rules()), False
             except Exception as e:
                 logger.error(f"本地风险评估失败: {str(e)}")
-                return "high"
+                return "high", True
         else:
             try:
                 messages = [
@@ -396,23 +543,29 @@ class IntentService:
                     {"role": "user", "content": text}
                 ]
                 
-                response = self.oai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=messages,
-                    temperature=0.2,
-                    max_tokens=10
-                )
+                with INTENT_CALL_LATENCY.time("risk_assessment"), tracer.span("intent.risk_assessment"):
+                    response = await self._chat_completion(
+                        messages,
+                        temperature=0.2,
+                        max_tokens=10
+                    )
                 
                 risk_text = response.choices[0].message.content.strip().lower()
                 if "high" in risk_text:
-                    return "high"
+                    return "high", False
                 elif "medium" in risk_text:
-                    return "medium"
-                return "low"
+                    return "medium", False
+                return "low", False
                 
             except Exception as e:
                 logger.error(f"OpenAI风险评估失败: {str(e)}")
-                return "high"
+                return "high", True
+
+    def _load_risk_rules(self) -> dict:
+        """加载本地风险规则（只读取一次）"""
+        if self._risk_rules is None:
+            self._risk_rules = load_json_resource(settings.LOCAL_RISK_RULES_PATH)
+        return self._risk_rules
 
     def _apply_local_risk_rules(self, text: str, rules: dict) -> str:
         """应用本地风险规则"""
@@ -437,5 +590,164 @@ class IntentService:
             return "medium"
         return "low"
 
+    @staticmethod
+    def _contains(series: "pd.Series", pattern) -> "pd.Series":
+        """按正则向量化匹配（规则中的分组只用于匹配，忽略 pandas 的分组提示）"""
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            return series.str.contains(pattern, regex=True)
+
+    def _extract_batch_features(self, texts: List[str]) -> "pd.DataFrame":
+        """
+        对全部文本按列向量化计算本地特征：风险关键词、法条引用、辅助意图与本地风险等级
+        （与单条识别中 _get_risk_bonus、_detect_aux_intents、_apply_local_risk_rules 的规则一致）
+        """
+        import pandas as pd
+        series = pd.Series(texts, dtype="object")
+        features = pd.DataFrame(index=series.index)
+
+        risk_keywords = self.domain_terms.get("risk_keywords", [])
+        risk_matches = sum(
+            (series.str.contains(kw, regex=False) for kw in risk_keywords),
+            pd.Series(0, index=series.index)
+        )
+        features["has_risk_keyword"] = risk_matches > 0
+        features["risk_bonus"] = (risk_matches * 0.15).clip(upper=0.45)
+        # 本地法规库可解析的引用必然包含“第X条”
+        features["law_ref"] = series.str.contains("§", regex=False) | self._contains(series, ARTICLE_PATTERN)
+
+        conflict = sum(
+            (self._contains(series, pattern) * score for pattern, score in CONFLICT_PATTERNS),
+            pd.Series(0.0, index=series.index)
+        ).clip(upper=1.0)
+        features[AuxIntentType.ENHANCED_SEARCH.value] = self._contains(series, "对比|推荐|top")
+        features[AuxIntentType.UNCERTAINTY_DECLARE.value] = conflict > 0.3
+        features[AuxIntentType.DEEP_REASONING.value] = self._contains(series, "详细说明|推导过程")
+
+        if settings.PROCUREMENT_RISK_MODE == "LOCAL":
+            try:
+                rules = self._load_risk_rules()
+                score = pd.Series(0.0, index=series.index)
+                for pattern in rules.get("bid_abnormal_patterns", []):
+                    weight = rules["risk_weights"].get(pattern["risk_level"], 0)
+                    score += self._contains(series, pattern["match_condition"]) * weight
+                for rule in rules.get("compliance_rules", []):
+                    matched = pd.Series(True, index=series.index)
+                    for keyword in rule["check_points"]:
+                        matched &= self._contains(series, rf'\b{keyword}\b')
+                    score -= matched * 0.3
+                features["risk_level"] = pd.cut(
+                    score, [-float("inf"), 0.45, 0.75, float("inf")],
+                    labels=["low", "medium", "high"], right=False
+                ).astype(str)
+            except Exception as e:
+                logger.error(f"本地风险评估失败: {str(e)}")
+                features["risk_level"] = "high"
+        return features
+
+    def _pack_texts(self, indexed_texts: List[tuple]) -> List[List[tuple]]:
+        """按 token 上限与条数上限将 (序号, 文本) 打包为若干组，每组对应一次模型调用"""
+        base_tokens = estimate_tokens(self.batch_system_prompt)
+        packs, current, current_tokens = [], [], base_tokens
+        for index, text in indexed_texts:
+            # 每条文本的输入 token + 序号等格式开销 + 输出一个 JSON 对象的 token
+            tokens = estimate_tokens(text) + BATCH_ITEM_INPUT_OVERHEAD + BATCH_ITEM_OUTPUT_TOKENS
+            if current and (
+                current_tokens + tokens > settings.INTENT_BATCH_MAX_TOKENS
+                or len(current) >= settings.INTENT_BATCH_MAX_ITEMS
+            ):
+                packs.append(current)
+                current, current_tokens = [], base_tokens
+            current.append((index, text))
+            current_tokens += tokens
+        if current:
+            packs.append(current)
+        return packs
+
+    async def _classify_pack(self, pack: List[tuple], law_refs: Dict[int, bool]) -> Dict[int, dict]:
+        """一次模型调用识别一组文本，返回 序号 -> {"core_intent", "risk_level"}"""
+        lines = [
+            json.dumps({"i": index, "text": text, **({"law_ref": True} if law_refs.get(index) else {})},
+                       ensure_ascii=False)
+            for index, text in pack
+        ]
+        messages = [
+            {"role": "system", "content": self.batch_system_prompt},
+            {"role": "user", "content": "\n".join(lines)}
+        ]
+        try:
+            with INTENT_CALL_LATENCY.time("batch"), tracer.span("intent.batch_pack", items=len(pack)):
+                response = await self._chat_completion(
+                    messages,
+                    temperature=0.1,
+                    max_tokens=BATCH_ITEM_OUTPUT_TOKENS * len(pack),
+                    priority=Priority.BACKGROUND
+                )
+            content = response.choices[0].message.content
+            match = re.search(r"\[.*\]", content, re.S)
+            items = json.loads(match.group(0)) if match else []
+            return {int(item["i"]): item for item in items if isinstance(item, dict) and "i" in item}
+        except Exception as e:
+            logger.error(f"批量意图识别调用失败（{len(pack)}条）: {str(e)}")
+            return {}
+
+    @traced("intent.classify_batch")
+    async def classify_batch(self, texts: List[str]) -> List[IntentResult]:
+        """
+        批量意图识别（无附件文本），结果与输入一一对应并写入意图缓存
+
+        本地特征对全部文本向量化计算；未命中缓存的文本去重后按 token 上限打包，
+        每包一次模型调用，输出 JSON 数组。模型未返回某条结果时按采购流程咨询处理。
+        """
+        unique = list(dict.fromkeys(texts))
+        cached = await self._intent_cache.aget_many(unique)
+        results: Dict[str, IntentResult] = {t: r for t, r in zip(unique, cached) if r is not None}
+        misses = [t for t in unique if t not in results]
+        current_span().set_attributes(texts=len(texts), unique_texts=len(unique), cache_hits=len(results))
+
+        if misses:
+            features = self._extract_batch_features(misses)
+            truncated = [(i, t[:settings.INTENT_BATCH_TEXT_CHARS]) for i, t in enumerate(misses)]
+            law_refs = dict(enumerate(features["law_ref"].tolist()))
+            packs = self._pack_texts(truncated)
+            current_span().set_attribute("model_calls", len(packs))
+            outputs: Dict[int, dict] = {}
+            for output in await asyncio.gather(*(self._classify_pack(p, law_refs) for p in packs)):
+                outputs.update(output)
+            policy_updated = await self._check_policy_updates()
+            logger.info(f"批量意图识别：{len(texts)}条，缓存命中{len(texts) - len(misses)}条，模型调用{len(packs)}次")
+
+            intents_by_value = {it.value: it for it in CoreIntentType}
+            aux_columns = [a for a in AuxIntentType]
+            to_cache: Dict[str, IntentResult] = {}
+            for i, row in enumerate(features.itertuples(index=False)):
+                output = outputs.get(i)
+                core_intent = intents_by_value.get((output or {}).get("core_intent"), CoreIntentType.PROCUREMENT_CONSULT)
+                # 与单条识别一致：非闲聊文本含风险关键词时归为风险预警
+                if core_intent != CoreIntentType.CHAT_GENERAL and row.has_risk_keyword:
+                    core_intent = CoreIntentType.RISK_ALERT
+                aux_intents = [a for a in aux_columns if features.at[i, a.value]]
+                if policy_updated:
+                    core_intent = self._adjust_weights(core_intent, aux_intents)
+
+                if settings.PROCUREMENT_RISK_MODE == "LOCAL":
+                    risk_level = row.risk_level
+                else:
+                    risk_level = (output or {}).get("risk_level")
+                    risk_level = risk_level if risk_level in ("low", "medium", "high") else "high"
+
+                result = IntentResult(
+                    core_intent=core_intent.value,
+                    aux_intents=[a.value for a in aux_intents],
+                    confidence_score=round(min(0.85 + len(aux_intents) * 0.05, 0.95) + row.risk_bonus, 2),
+                    risk_level=risk_level
+                )
+                results[misses[i]] = result
+                if output is not None:
+                    to_cache[misses[i]] = result
+            await self._intent_cache.aset_many(to_cache)
+
+        return [results[text] for text in texts]
+
 # 初始化服务实例
-intent_service = IntentService()
+intent_service = LazyService(IntentService, "intent_service")
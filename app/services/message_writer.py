@@ -0,0 +1,166 @@
+"""
+消息写入模块：异步写后（write-behind）队列，批量持久化对话消息
+
+聊天接口只负责入队，后台任务按条数或时间间隔合并为一次批量插入，
+失败时退避重试，不阻塞响应；入队时同步更新进程内的对话历史缓存。
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.services.supabase import supabase_service
+from app.services.history_cache import history_cache
+
+logger = logging.getLogger(__name__)
+
+# 停止信号
+_STOP = object()
+
+
+class MessageWriteBehindQueue:
+    def __init__(
+        self,
+        batch_size: int = None,
+        flush_interval: float = None,
+        max_retries: int = None
+    ):
+        self.batch_size = batch_size or settings.MESSAGE_WRITE_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.MESSAGE_WRITE_FLUSH_INTERVAL
+        self.max_retries = max_retries or settings.MESSAGE_WRITE_MAX_RETRIES
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self) -> None:
+        """在当前事件循环中启动后台写入任务"""
+        loop = asyncio.get_running_loop()
+        if self._task and not self._task.done():
+            if self._task.get_loop() is loop:
+                return
+            # 原事件循环已不再运行（如测试中多次创建循环），将未写入的消息迁移到新队列
+            pending = self._drain(self.pending)
+            self._queue = None
+        else:
+            pending = []
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            for row in pending:
+                self._queue.put_nowait(row)
+        self._task = asyncio.create_task(self._run())
+        logger.info("消息写入队列已启动")
+
+    async def stop(self) -> None:
+        """停止后台任务，写入队列中剩余的消息"""
+        if self._task and not self._task.done():
+            # 哨兵放在队尾，后台任务处理完之前的消息后退出
+            self._queue.put_nowait(_STOP)
+            await self._task
+        self._task = None
+
+        remaining = self._drain(self.pending)
+        if remaining:
+            logger.info(f"消息写入队列停止前写入剩余{len(remaining)}条消息")
+            await self._flush(remaining)
+
+    def enqueue(
+        self,
+        conversation_id: str,
+        content: str,
+        is_user: bool,
+        created_at: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        将一条消息加入写入队列
+
+        消息 id 与 created_at 在服务端生成，使缓存中的记录与最终落库的记录一致。
+
+        Args:
+            conversation_id (str): 对话ID
+            content (str): 消息内容
+            is_user (bool): 是否为用户消息（False 表示 AI 回复）
+            created_at (str, optional): 消息创建时间，默认为当前 UTC 时间
+
+        Returns:
+            dict: 待写入的消息记录
+        """
+        row = {
+            "id": str(uuid.uuid4()),
+            "conversation_id": conversation_id,
+            "content": content,
+            "is_user": is_user,
+            "created_at": created_at or utc_now_iso()
+        }
+        self.start()
+        self._queue.put_nowait(row)
+        history_cache.append(conversation_id, [row])
+        return row
+
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        """非阻塞地取出最多 limit 条消息"""
+        rows = []
+        while self._queue and len(rows) < limit:
+            try:
+                row = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if row is not _STOP:
+                rows.append(row)
+        return rows
+
+    async def _run(self) -> None:
+        """后台循环：攒满 batch_size 条或等待 flush_interval 后批量写入"""
+        loop = asyncio.get_running_loop()
+        while True:
+            row = await self._queue.get()
+            if row is _STOP:
+                return
+            batch = [row]
+            stopping = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        """批量写入消息，失败时按指数退避重试"""
+        for attempt in range(self.max_retries):
+            try:
+                await asyncio.to_thread(supabase_service.save_messages, batch)
+                logger.debug(f"批量写入{len(batch)}条消息成功")
+                return
+            except Exception as e:
+                logger.warning(f"批量写入消息失败 (尝试 {attempt + 1}/{self.max_retries}): {str(e)}")
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep(min(0.5 * (2 ** attempt), 10))
+
+        # 重试耗尽：丢弃该批次，并让相关对话的缓存失效以免与数据库不一致
+        logger.error(f"批量写入消息最终失败，丢弃{len(batch)}条消息")
+        for conversation_id in {row["conversation_id"] for row in batch}:
+            history_cache.invalidate(conversation_id)
+
+
+def utc_now_iso() -> str:
+    """返回当前 UTC 时间的 ISO 字符串"""
+    return datetime.now(timezone.utc).isoformat()
+
+
+# 全局实例
+message_writer = MessageWriteBehindQueue()
@@ -0,0 +1,257 @@
+"""
+进程内指标：延迟直方图与计数器，以 Prometheus 文本格式由 GET /metrics 导出
+
+一次记录只做一次分桶的二分查找和几次加法（持有该指标自己的锁），开销在微秒以下，可在生产环境常开。
+缓存命中、向量批大小、模型路由等已由各组件自行统计的数据，在导出时读取，不重复计数。
+多进程部署时每个工作进程各自统计，指标带 worker 标签（工作进程序号）以便区分。
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# 默认延迟分桶上界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    """分桶直方图：各标签组合维护分桶计数、总和与次数"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各分桶计数..., 超出最大分桶的计数, 总和]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """记录代码块的耗时（包括其中的 await，异常时同样记录）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        bucket_labelnames = self.labelnames + ("le",)
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                label_text = format_labels(bucket_labelnames, labels + (_format_number(bound),))
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_number(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        # 缓存统计来源：返回 {缓存名: {"hits", "misses", 可选 "near_hits" / "far_hits" / "far_errors" / "size"}}
+        self._cache_sources: List[Callable[[], Dict[str, Dict[str, Any]]]] = []
+        # 导出时读取的指标族：(名称, 类型, 说明, 标签名, 返回 [(标签值, 数值)] 的回调)
+        self._families: List[Tuple[str, str, str, Tuple[str, ...], Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]]] = []
+        # 多进程部署时的工作进程序号
+        self.worker: Optional[str] = None
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics[name] = metric
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics[name] = metric
+        return metric
+
+    def register_cache(self, source: Callable[[], Dict[str, Dict[str, Any]]]) -> None:
+        """登记缓存统计来源，导出时读取（命中统计由缓存自身维护，记录路径上没有额外开销）"""
+        self._cache_sources.append(source)
+
+    def register_family(
+        self,
+        name: str,
+        kind: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        source: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]
+    ) -> None:
+        """登记由组件自行统计、导出时读取的指标族（kind 为 counter 或 gauge）"""
+        self._families.append((name, kind, documentation, tuple(labelnames), source))
+
+    def _collect_families(self) -> List[str]:
+        lines: List[str] = []
+        for name, kind, documentation, labelnames, source in self._families:
+            samples = sorted(source())
+            if not samples:
+                continue
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(labelnames, labels)} {_format_number(value)}")
+        return lines
+
+    def _collect_caches(self) -> List[str]:
+        caches: Dict[str, Dict[str, Any]] = {}
+        for source in self._cache_sources:
+            caches.update(source())
+        families = {
+            "cache_hits_total": ("counter", "缓存命中次数（tier：near 近端 / far 远端 / local 进程内）", ["cache", "tier"]),
+            "cache_misses_total": ("counter", "缓存未命中次数", ["cache"]),
+            "cache_remote_errors_total": ("counter", "远端缓存失败或熔断期间跳过的操作次数", ["cache"]),
+            "cache_entries": ("gauge", "进程内缓存条目数", ["cache"]),
+        }
+        samples: Dict[str, List[Tuple[Tuple[str, ...], float]]] = {name: [] for name in families}
+        for name, stats in sorted(caches.items()):
+            if "near_hits" in stats and stats.get("mode") != "local":
+                samples["cache_hits_total"].append(((name, "near"), stats["near_hits"]))
+                samples["cache_hits_total"].append(((name, "far"), stats["far_hits"]))
+            else:
+                samples["cache_hits_total"].append(((name, "local"), stats["hits"]))
+            samples["cache_misses_total"].append(((name,), stats["misses"]))
+            if "far_errors" in stats:
+                samples["cache_remote_errors_total"].append(((name,), stats["far_errors"]))
+            if stats.get("size") is not None:
+                samples["cache_entries"].append(((name,), stats["size"]))
+
+        lines: List[str] = []
+        for family, (kind, documentation, labelnames) in families.items():
+            if not samples[family]:
+                continue
+            lines.append(f"# HELP {family} {documentation}")
+            lines.append(f"# TYPE {family} {kind}")
+            for labels, value in samples[family]:
+                lines.append(f"{family}{format_labels(labelnames, labels)} {_format_number(value)}")
+        return lines
+
+    def render(self) -> str:
+        """导出 Prometheus 文本格式"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        lines.extend(self._collect_families())
+        lines.extend(self._collect_caches())
+        if self.worker is not None:
+            lines = [_add_worker_label(line, self.worker) for line in lines]
+        return "\n".join(lines) + "\n"
+
+
+def _add_worker_label(line: str, worker: str) -> str:
+    if line.startswith("#"):
+        return line
+    name, value = line.rsplit(" ", 1)
+    if name.endswith("}"):
+        return f'{name[:-1]},worker="{worker}"}} {value}'
+    return f'{name}{{worker="{worker}"}} {value}'
+
+
+# 全局实例
+metrics_registry = MetricsRegistry()
+
+STAGE_LATENCY = metrics_registry.histogram(
+    "chat_stage_duration_seconds",
+    "聊天请求各阶段耗时（秒）",
+    ["stage"]
+)
+INTENT_CALL_LATENCY = metrics_registry.histogram(
+    "intent_call_duration_seconds",
+    "意图识别中各次模型调用耗时（秒）",
+    ["call"]
+)
+INGESTION_CHUNK_LATENCY = metrics_registry.histogram(
+    "document_chunk_ingestion_duration_seconds",
+    "文档处理中每个分块的向量化与写入耗时（秒）"
+)
+OUTBOUND_QUEUE_WAIT = metrics_registry.histogram(
+    "outbound_queue_wait_seconds",
+    "出站调用在调度器中的排队时间（秒）",
+    ["provider"]
+)
+RETRIES = metrics_registry.counter(
+    "retries_total",
+    "重试次数（rate_limit：限流后重试出站调用；generation：回复生成失败后整体重试）",
+    ["provider", "reason"]
+)
+PROVIDER_ERRORS = metrics_registry.counter(
+    "provider_errors_total",
+    "提供商调用失败次数（rate_limited：429 限流；error：其他错误）",
+    ["provider", "kind"]
+)
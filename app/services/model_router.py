@@ -0,0 +1,172 @@
+"""
+模型路由模块：按核心意图和风险等级选择模型提供商、模型和输出 token 上限
+
+闲聊等轻量意图使用小而快的模型和较短的输出上限，招标文件生成、投标文件评估等重型意图
+使用更大的模型；高风险请求自动升一档。每条路由记录延迟统计，用于评估路由效果。
+"""
+import logging
+import statistics
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional
+
+from app.config import settings
+from app.services.intentService import CoreIntentType, IntentResult
+from app.services.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# 模型档位，按从小到大排列
+TIERS = ("light", "standard", "heavy")
+
+# 每个延迟统计保留的最近样本数
+LATENCY_WINDOW = 500
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """路由规则"""
+    tier: str
+    max_tokens: int
+    temperature: float
+    provider: Optional[str] = None  # None 表示跟随 MODEL_PROVIDER 设置
+
+
+@dataclass(frozen=True)
+class ResolvedRoute:
+    """解析后的路由，可直接用于创建模型实例"""
+    name: str
+    provider: str
+    model: str
+    max_tokens: Optional[int]
+    temperature: float
+
+
+# 核心意图 -> 路由规则
+ROUTING_TABLE: Dict[CoreIntentType, ModelRoute] = {
+    CoreIntentType.CHAT_GENERAL: ModelRoute("light", 512, 0.7),
+    CoreIntentType.GENERATE_BID: ModelRoute("heavy", 4096, 0.5),
+    CoreIntentType.TEMPLATE_GENERATE: ModelRoute("heavy", 4096, 0.5),
+    CoreIntentType.EVALUATE_BID: ModelRoute("heavy", 4096, 0.3),
+    CoreIntentType.LAW_INTERPRET: ModelRoute("standard", 2048, 0.3),
+    CoreIntentType.RISK_ALERT: ModelRoute("standard", 2048, 0.3),
+    CoreIntentType.SUPPLIER_REVIEW: ModelRoute("standard", 2048, 0.3),
+    CoreIntentType.DATA_VERIFY: ModelRoute("standard", 2048, 0.3),
+    CoreIntentType.PRODUCT_COMPARE: ModelRoute("standard", 2048, 0.5),
+    CoreIntentType.COST_CALCULATE: ModelRoute("standard", 2048, 0.3),
+    CoreIntentType.PROCUREMENT_CONSULT: ModelRoute("standard", 2048, 0.5),
+    CoreIntentType.PROCESS_TRACE: ModelRoute("standard", 2048, 0.5),
+    CoreIntentType.EMERGENCY_HANDLE: ModelRoute("standard", 2048, 0.3),
+}
+
+# 未识别意图时的默认路由
+DEFAULT_ROUTE = ModelRoute("standard", 2048, 0.7)
+
+
+def _tier_models(provider: str) -> Dict[str, str]:
+    """提供商各档位对应的模型"""
+    if provider == "openai":
+        return {
+            "light": settings.ROUTE_OPENAI_LIGHT_MODEL,
+            "standard": settings.MODEL_NAME,
+            "heavy": settings.ROUTE_OPENAI_HEAVY_MODEL,
+        }
+    return {
+        "light": settings.ROUTE_DEEPSEEK_LIGHT_MODEL,
+        "standard": "deepseek-chat",
+        "heavy": settings.ROUTE_DEEPSEEK_HEAVY_MODEL,
+    }
+
+
+class ModelRouter:
+    def __init__(self):
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+
+    def resolve(self, intent_result: Optional[IntentResult]) -> ResolvedRoute:
+        """
+        根据意图识别结果选择模型
+
+        Args:
+            intent_result: 意图识别结果，未启用意图识别时为 None
+
+        Returns:
+            ResolvedRoute: 提供商、模型、输出上限和温度
+        """
+        if intent_result is None:
+            return self.resolve_intent(None)
+        return self.resolve_intent(intent_result.core_intent, intent_result.risk_level)
+
+    def resolve_intent(self, core_intent: Optional[str], risk_level: str = "low") -> ResolvedRoute:
+        """按核心意图值和风险等级选择模型"""
+        if not settings.MODEL_ROUTING_ENABLED:
+            return self._legacy_route()
+
+        rule = DEFAULT_ROUTE
+        name = "default"
+        if core_intent:
+            try:
+                intent = CoreIntentType(core_intent)
+                rule = ROUTING_TABLE.get(intent, DEFAULT_ROUTE)
+                name = intent.name
+            except ValueError:
+                pass
+
+        tier = rule.tier
+        temperature = rule.temperature
+        # 高风险请求升一档模型并降低随机性
+        if risk_level == "high":
+            tier = TIERS[min(TIERS.index(tier) + 1, len(TIERS) - 1)]
+            temperature = min(temperature, 0.3)
+            name = f"{name}:high_risk"
+
+        provider = rule.provider or settings.MODEL_PROVIDER
+        return ResolvedRoute(
+            name=name,
+            provider=provider,
+            model=_tier_models(provider)[tier],
+            max_tokens=rule.max_tokens,
+            temperature=temperature
+        )
+
+    def _legacy_route(self) -> ResolvedRoute:
+        """关闭路由时沿用统一模型配置"""
+        provider = settings.MODEL_PROVIDER
+        model = settings.MODEL_NAME if provider == "openai" else "deepseek-chat"
+        return ResolvedRoute(name="legacy", provider=provider, model=model, max_tokens=None, temperature=0.7)
+
+    def record_latency(self, route: ResolvedRoute, seconds: float) -> None:
+        """记录一次路由调用的耗时"""
+        samples = self._latencies.setdefault(route.name, deque(maxlen=LATENCY_WINDOW))
+        samples.append(seconds)
+        self._counts[route.name] = self._counts.get(route.name, 0) + 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """返回各路由的调用次数与延迟统计（秒）"""
+        result = {}
+        for name, samples in self._latencies.items():
+            ordered = sorted(samples)
+            result[name] = {
+                "count": self._counts[name],
+                "avg": round(statistics.fmean(ordered), 3),
+                "p50": round(ordered[len(ordered) // 2], 3),
+                "p95": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 3),
+            }
+        return result
+
+
+# 全局实例
+model_router = ModelRouter()
+metrics_registry.register_family(
+    "model_route_requests_total", "counter", "各路由的模型调用次数（route 带 :high_risk 后缀表示高风险升档）", ["route"],
+    lambda: [((name,), stats["count"]) for name, stats in model_router.stats().items()]
+)
+metrics_registry.register_family(
+    "model_route_tier_upgrades_total", "counter", "高风险请求升一档模型的调用次数", [],
+    lambda: [((), sum(stats["count"] for name, stats in model_router.stats().items() if name.endswith(":high_risk")))]
+)
+metrics_registry.register_family(
+    "model_route_latency_seconds", "gauge", f"各路由最近{LATENCY_WINDOW}次调用的延迟分位数（秒）", ["route", "quantile"],
+    lambda: [((name, quantile), stats[key]) for name, stats in model_router.stats().items()
+             for quantile, key in (("0.5", "p50"), ("0.95", "p95"))]
+)
@@ -0,0 +1,88 @@
+"""
+文档处理进度推送模块：由文档处理任务直接发布进度事件，前端通过 SSE 订阅
+
+取代轮询 /api/documents/{file_id}/status 的方式；数据库中的 progress 字段仅按检查点写入。
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 终态：收到后文件级订阅自动结束
+TERMINAL_STATUSES = {"completed", "error"}
+
+
+class ProgressBroker:
+    def __init__(self, queue_size: int = 100, max_tracked_files: int = 1000):
+        self.queue_size = queue_size
+        self.max_tracked_files = max_tracked_files
+        # 订阅键（file:<id> / user:<id>）-> 订阅者队列
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # 每个文件最近一次事件，供新订阅者立即获取当前状态
+        self._latest: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def publish(self, file_id: str, user_id: Optional[str], event: Dict[str, Any]) -> None:
+        """
+        发布进度事件
+
+        Args:
+            file_id (str): 文件ID
+            user_id (str, optional): 文件所属用户ID
+            event (dict): 事件内容，包含 status, progress 等字段
+        """
+        event = {"file_id": file_id, **event}
+        self._latest[file_id] = event
+        self._latest.move_to_end(file_id)
+        while len(self._latest) > self.max_tracked_files:
+            self._latest.popitem(last=False)
+
+        keys = [f"file:{file_id}"]
+        if user_id:
+            keys.append(f"user:{user_id}")
+        for key in keys:
+            for queue in self._subscribers.get(key, ()):
+                if queue.full():
+                    # 慢消费者只保留最新进度
+                    queue.get_nowait()
+                queue.put_nowait(event)
+
+    def latest(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """获取文件最近一次进度事件"""
+        return self._latest.get(file_id)
+
+    async def subscribe(self, key: str, heartbeat: float = 15.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        订阅进度事件
+
+        Args:
+            key (str): 订阅键，file:<file_id> 或 user:<user_id>
+            heartbeat (float): 无事件时产出 None 的间隔（秒），用于发送心跳
+
+        Yields:
+            dict | None: 进度事件；None 表示心跳
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(key, set()).add(queue)
+        try:
+            # 文件级订阅先推送当前状态
+            if key.startswith("file:"):
+                latest = self._latest.get(key[len("file:"):])
+                if latest is not None:
+                    yield latest
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            subscribers = self._subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    self._subscribers.pop(key, None)
+
+
+# 全局实例
+progress_broker = ProgressBroker()
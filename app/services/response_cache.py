@@ -0,0 +1,142 @@
+"""
+语义回复缓存模块：为无历史（或历史很短）的首轮问题缓存 AI 回复
+
+缓存按 (系统提示词哈希, 核心意图, 模型提供商) 分桶，桶内按问题向量的余弦相似度匹配，
+超过阈值即直接返回已缓存的回复。支持 TTL、按条目数的 LRU 淘汰，以及设置变更时整体失效。
+"""
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import count
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _CacheEntry:
+    bucket: Hashable
+    question: str
+    embedding: np.ndarray  # 已归一化
+    response: str
+    expires_at: float
+
+
+class SemanticResponseCache:
+    def __init__(
+        self,
+        max_entries: int = None,
+        ttl: float = None,
+        threshold: float = None
+    ):
+        self.max_entries = max_entries or settings.RESPONSE_CACHE_MAX_ENTRIES
+        self.ttl = ttl or settings.RESPONSE_CACHE_TTL
+        self.threshold = threshold or settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD
+        # 条目 id -> 条目，按最近使用排序
+        self._entries: "OrderedDict[int, _CacheEntry]" = OrderedDict()
+        # 桶 -> 条目 id 列表，及对应的向量矩阵（懒构建）
+        self._buckets: Dict[Hashable, List[int]] = {}
+        self._matrices: Dict[Hashable, np.ndarray] = {}
+        self._ids = count()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, bucket: Hashable, embedding: Sequence[float]) -> Optional[str]:
+        """
+        查找语义相近的已缓存回复
+
+        Args:
+            bucket: 分桶键
+            embedding: 问题向量
+
+        Returns:
+            str | None: 命中时返回缓存的回复
+        """
+        self._expire(bucket)
+        ids = self._buckets.get(bucket)
+        if not ids:
+            self.misses += 1
+            return None
+
+        query = _normalize(embedding)
+        matrix = self._matrices.get(bucket)
+        if matrix is None:
+            matrix = np.stack([self._entries[i].embedding for i in ids])
+            self._matrices[bucket] = matrix
+
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            self.misses += 1
+            return None
+
+        entry_id = ids[best]
+        self._entries.move_to_end(entry_id)
+        self.hits += 1
+        logger.info(f"语义回复缓存命中，相似度{scores[best]:.3f}，原问题：{self._entries[entry_id].question[:30]}")
+        return self._entries[entry_id].response
+
+    def store(self, bucket: Hashable, question: str, embedding: Sequence[float], response: str) -> None:
+        """写入一条缓存，超过容量时淘汰最久未使用的条目"""
+        entry_id = next(self._ids)
+        self._entries[entry_id] = _CacheEntry(
+            bucket=bucket,
+            question=question,
+            embedding=_normalize(embedding),
+            response=response,
+            expires_at=time.monotonic() + self.ttl
+        )
+        self._buckets.setdefault(bucket, []).append(entry_id)
+        self._matrices.pop(bucket, None)
+
+        while len(self._entries) > self.max_entries:
+            oldest_id = next(iter(self._entries))
+            self._remove(oldest_id)
+
+    def invalidate(self) -> None:
+        """清空全部缓存（系统提示词或模型提供商变更时调用）"""
+        if self._entries:
+            logger.info(f"语义回复缓存失效，清除{len(self._entries)}条缓存")
+        self._entries.clear()
+        self._buckets.clear()
+        self._matrices.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _expire(self, bucket: Hashable) -> None:
+        """移除桶内已过期的条目"""
+        now = time.monotonic()
+        for entry_id in [i for i in self._buckets.get(bucket, ()) if self._entries[i].expires_at < now]:
+            self._remove(entry_id)
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        ids = self._buckets.get(entry.bucket)
+        if ids is not None:
+            ids.remove(entry_id)
+            if not ids:
+                del self._buckets[entry.bucket]
+        self._matrices.pop(entry.bucket, None)
+
+
+def _normalize(embedding: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# 全局实例
+response_cache = SemanticResponseCache()
+metrics_registry.register_cache(lambda: {"semantic_response": {
+    "hits": response_cache.hits, "misses": response_cache.misses, "size": len(response_cache)
+}})
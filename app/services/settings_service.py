@@ -1,5 +1,6 @@
 from typing import Optional
 from app.config import settings
+from app.services.response_cache import response_cache
 import logging
 from pydantic import BaseModel, Field
 
@@ -38,6 +39,10 @@ class SettingsService:
                 
             if update_data.use_intent_detection is not None:
                 self.settings.USE_INTENT_DETECTION = update_data.use_intent_detection
+
+            # 系统提示词或模型提供商变更后，已缓存的回复不再适用
+            if update_data.model_provider is not None or update_data.system_prompt is not None:
+                response_cache.invalidate()
             # 打印更新后的设置
             # logger.info(f"更新后的设置: {self.settings.dict()}")
             return {
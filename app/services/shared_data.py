@@ -0,0 +1,57 @@
+"""
+多进程部署的只读数据：由主进程在 fork 之前准备一次，各工作进程共享
+
+- 法规索引构建为快照文件，工作进程以 mmap 方式映射，共享操作系统页缓存，物理内存只占一份
+- 领域词典与风险规则在主进程中解析，fork 后以写时复制方式共享
+各服务实例（HTTP 客户端、线程池等）不跨进程共享，仍在工作进程中 fork 之后构造。
+
+可变状态不在工作进程间共享：批量聊天任务与投标文件相似度索引只存在于创建它们的进程，
+多进程部署时这两类接口返回 503；文档进度订阅通过轮询数据库检查点获取其他进程处理的文件进度。
+"""
+import logging
+import os
+import time
+from pathlib import Path
+
+from app.config import settings
+from app.services.api_scheduler import api_scheduler
+from app.services.intentService import load_json_resource
+from app.services.metrics import metrics_registry
+from app.services.statute_store import SNAPSHOT_NAME, build_index
+from app.utils.lazy import initialized_services
+from app.utils.shared_arrays import save_arrays
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_shared_data(directory: str) -> None:
+    """在主进程中准备只读数据，并让（fork 出的）工作进程从该目录映射"""
+    started = time.perf_counter()
+    arrays, meta = build_index(Path(settings.STATUTE_DIR))
+    save_arrays(str(Path(directory) / SNAPSHOT_NAME), arrays, meta)
+    settings.SHARED_DATA_DIR = directory
+
+    for path in (settings.PROCUREMENT_DOMAIN_DICT_PATH, settings.LOCAL_RISK_RULES_PATH):
+        try:
+            load_json_resource(path)
+        except Exception as e:
+            logger.error(f"预加载{path}失败，由各工作进程自行加载: {str(e)}")
+
+    if initialized_services():
+        logger.warning("fork 之前已有服务完成初始化，其客户端与线程池不应在工作进程间共享")
+    logger.info(
+        f"只读数据准备完成（{directory}），法规索引{sum(a.nbytes for a in arrays.values()) / 1024:.0f}KB，"
+        f"耗时{(time.perf_counter() - started) * 1000:.0f}ms"
+    )
+
+
+def init_worker(index: int, workers: int) -> None:
+    """工作进程 fork 之后的初始化"""
+    api_scheduler.partition(workers)
+    metrics_registry.worker = str(index)
+    logger.info(f"工作进程{index}（pid {os.getpid()}）启动，出站额度为总额度的1/{workers}")
+    if index == 0:
+        logger.warning(
+            "多进程部署：批量聊天任务与投标文件相似度索引保存在单个进程内，相应接口返回 503；"
+            "文档进度订阅改为在无事件期间轮询数据库检查点"
+        )
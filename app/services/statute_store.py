@@ -0,0 +1,268 @@
+"""
+本地法规库：按法规名称与条号精确索引、按条文正文全文索引
+
+法规条文以 JSON 文件存放在 resources/statutes 下（每部法规一个文件，带版本与施行日期），
+启动时构建为紧凑的 numpy 数组索引。精确查询在有序条文键上二分查找，全文检索使用二元字（bigram）
+倒排索引，均无需网络。多进程部署时索引由主进程构建为快照，各工作进程以 mmap 方式映射同一份数据。
+"""
+import json
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.utils.lazy import LazyService
+from app.utils.shared_arrays import StringTable, load_arrays, pack_strings, save_arrays
+
+logger = logging.getLogger(__name__)
+
+_CN_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+              "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_CN_UNITS = {"十": 10, "百": 100, "千": 1000}
+
+# 共享数据目录中法规索引快照的子目录名
+SNAPSHOT_NAME = "statutes"
+
+ARTICLE_PATTERN = re.compile(r"第([零〇一二两三四五六七八九十百千\d]+)条")
+
+# 紧跟在法规名称后、构成另一部法规名称的后缀（如“政府采购法实施条例”不是“政府采购法”）
+_DERIVED_LAW_SUFFIX = "(?:实施条例|实施细则|实施办法|条例|细则)?"
+
+
+def parse_chinese_number(text: str) -> int:
+    """将“二十二”“一百零五”“22”等条号解析为整数"""
+    if text.isdigit():
+        return int(text)
+    total, current = 0, 0
+    for char in text:
+        if char in _CN_DIGITS:
+            current = _CN_DIGITS[char]
+        elif char in _CN_UNITS:
+            # “十二”省略了前面的“一”
+            total += (current or 1) * _CN_UNITS[char]
+            current = 0
+        else:
+            raise ValueError(f"无法解析的条号: {text}")
+    return total + current
+
+
+@dataclass(frozen=True)
+class Article:
+    """法规条文"""
+    law: str
+    short_name: str
+    label: str  # 原文条号，如“第二十二条”
+    number: int
+    text: str
+    version: str
+
+    def format(self) -> str:
+        return f"《{self.short_name}》{self.label}（{self.version}）：{self.text}"
+
+
+def _bigrams(text: str) -> Set[str]:
+    text = re.sub(r"[\s\W_]+", "", text)
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _gram_key(gram: str) -> int:
+    """二元字编码为整数（Unicode 码位不超过 21 位）"""
+    return (ord(gram[0]) << 21) | ord(gram[1])
+
+
+def build_index(statute_dir: Path) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """
+    读取法规 JSON 文件并构建索引
+
+    Returns:
+        (数组, 元数据)：条文按 (法规序号 << 32 | 条号) 排序；全文索引为按二元字编码排序的
+        倒排表（gram_offsets 划分 postings 中各二元字的条文下标）；元数据为法规列表与别名
+    """
+    laws: List[Dict[str, str]] = []
+    law_index: Dict[str, int] = {}
+    aliases: Dict[str, str] = {}
+    # 条文键 -> (原文条号, 正文)
+    articles: Dict[int, Tuple[str, str]] = {}
+    for path in sorted(Path(statute_dir).glob("*.json")):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"法规文件{path.name}加载失败: {str(e)}")
+            continue
+
+        short_name = data["short_name"]
+        if short_name not in law_index:
+            law_index[short_name] = len(laws)
+            laws.append({"short_name": short_name})
+        law_idx = law_index[short_name]
+        laws[law_idx].update(law=data["law"], version=data.get("version", ""))
+        for alias in {short_name, data["law"], *data.get("aliases", [])}:
+            aliases[alias] = short_name
+        for label, text in data["articles"].items():
+            number = parse_chinese_number(ARTICLE_PATTERN.fullmatch(label).group(1))
+            articles[(law_idx << 32) | number] = (label, text)
+
+    keys = sorted(articles)
+    postings: Dict[int, List[int]] = {}
+    for i, key in enumerate(keys):
+        for gram in _bigrams(articles[key][1]):
+            postings.setdefault(_gram_key(gram), []).append(i)
+    gram_keys = sorted(postings)
+    gram_offsets = np.zeros(len(gram_keys) + 1, dtype=np.int64)
+    gram_offsets[1:] = np.cumsum([len(postings[g]) for g in gram_keys], dtype=np.int64)
+
+    arrays = {
+        "article_keys": np.array(keys, dtype=np.int64),
+        **pack_strings((articles[k][0] for k in keys), "labels"),
+        **pack_strings((articles[k][1] for k in keys), "texts"),
+        "gram_keys": np.array(gram_keys, dtype=np.uint64),
+        "gram_offsets": gram_offsets,
+        "postings": np.array([i for g in gram_keys for i in postings[g]], dtype=np.int32),
+    }
+    return arrays, {"laws": laws, "aliases": aliases}
+
+
+class StatuteStore:
+    def __init__(self, statute_dir: str = None, snapshot_dir: str = None):
+        """
+        Args:
+            statute_dir: 法规 JSON 目录，默认读取配置
+            snapshot_dir: 索引快照目录；未指定法规目录时默认使用共享数据目录中的快照，
+                快照存在则以 mmap 方式映射（多进程共享同一份内存），否则从 JSON 构建
+        """
+        self.statute_dir = Path(statute_dir or settings.STATUTE_DIR)
+        if snapshot_dir is None and statute_dir is None and settings.SHARED_DATA_DIR:
+            snapshot_dir = str(Path(settings.SHARED_DATA_DIR) / SNAPSHOT_NAME)
+        loaded = load_arrays(snapshot_dir) if snapshot_dir else None
+        if loaded is None:
+            self._arrays, self._meta = build_index(self.statute_dir)
+            source = "加载本地法规库"
+        else:
+            self._arrays, self._meta = loaded
+            source = "从共享快照映射本地法规库"
+
+        self._laws: List[Dict[str, str]] = self._meta["laws"]
+        self._law_index = {law["short_name"]: i for i, law in enumerate(self._laws)}
+        # 别名 -> 法规简称
+        self._aliases: Dict[str, str] = self._meta["aliases"]
+        self._keys = self._arrays["article_keys"]
+        self._labels = StringTable(self._arrays, "labels")
+        self._texts = StringTable(self._arrays, "texts")
+        self._gram_keys = self._arrays["gram_keys"]
+        self._gram_offsets = self._arrays["gram_offsets"]
+        self._postings = self._arrays["postings"]
+        # 最长匹配优先：别名按长度降序，并连同可能的后缀一起匹配，
+        # 匹配到的完整名称不在别名表中时（库中没有的法规）不归属任何法规
+        alternation = "|".join(re.escape(a) for a in sorted(self._aliases, key=len, reverse=True))
+        self._law_pattern = re.compile(f"(?:{alternation}){_DERIVED_LAW_SUFFIX}") if alternation else None
+        logger.info(f"成功{source}，包含{len(self._laws)}部法规，{len(self._keys)}条条文")
+
+    def save_snapshot(self, directory: str) -> None:
+        """将索引保存为快照，供其他进程以 mmap 方式映射"""
+        save_arrays(directory, self._arrays, self._meta)
+
+    def _article(self, index: int) -> Article:
+        key = int(self._keys[index])
+        law = self._laws[key >> 32]
+        return Article(
+            law=law["law"],
+            short_name=law["short_name"],
+            label=self._labels[index],
+            number=key & 0xFFFFFFFF,
+            text=self._texts[index],
+            version=law["version"]
+        )
+
+    def _get(self, short_name: str, number: int) -> Optional[Article]:
+        key = (self._law_index[short_name] << 32) | number
+        index = int(np.searchsorted(self._keys, key))
+        if index < len(self._keys) and self._keys[index] == key:
+            return self._article(index)
+        return None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def versions(self) -> Dict[str, str]:
+        """各法规的版本"""
+        return {law["short_name"]: law["version"] for law in self._laws}
+
+    def lookup(self, law: str, article: object) -> Optional[Article]:
+        """
+        按法规名称（或别名）与条号精确查询
+
+        Args:
+            law: 法规名称或别名，如“政府采购法”“87号令”
+            article: 条号，如 22、“二十二”、“第二十二条”
+        """
+        short_name = self._aliases.get(law)
+        if short_name is None:
+            return None
+        if isinstance(article, str):
+            match = ARTICLE_PATTERN.fullmatch(article)
+            article = parse_chinese_number(match.group(1) if match else article)
+        return self._get(short_name, article)
+
+    def find_references(self, text: str) -> List[Article]:
+        """
+        找出文本中引用的法规条文：每个“第X条”归属于其前方最近一次提到的法规
+
+        例如“政府采购法第二十二条和第二十六条”返回两条条文；前方最近提到的是库中没有的法规
+        （如“政府采购法实施条例”）时不返回。
+        """
+        if self._law_pattern is None:
+            return []
+        mentions = [(m.start(), self._aliases.get(m.group(0))) for m in self._law_pattern.finditer(text)]
+        if not mentions:
+            return []
+
+        found: List[Article] = []
+        for match in ARTICLE_PATTERN.finditer(text):
+            preceding = [law for pos, law in mentions if pos < match.start()]
+            if not preceding or preceding[-1] is None:
+                continue
+            try:
+                number = parse_chinese_number(match.group(1))
+            except ValueError:
+                continue
+            article = self._get(preceding[-1], number)
+            if article is not None and article not in found:
+                found.append(article)
+        return found
+
+    def search(self, query: str, limit: int = 3, min_score: float = 0.3) -> List[Tuple[Article, float]]:
+        """
+        按条文正文全文检索
+
+        Returns:
+            [(条文, 得分)]：得分为查询二元字在条文中出现的比例，按得分降序
+        """
+        grams = _bigrams(query)
+        if not grams:
+            return []
+        query_keys = np.fromiter((_gram_key(g) for g in grams), dtype=np.uint64, count=len(grams))
+        positions = np.searchsorted(self._gram_keys, query_keys)
+        inside = positions < len(self._gram_keys)
+        positions = positions[inside]
+        positions = positions[self._gram_keys[positions] == query_keys[inside]]
+        if not len(positions):
+            return []
+        hits = np.concatenate([
+            self._postings[self._gram_offsets[p]:self._gram_offsets[p + 1]] for p in positions
+        ])
+        indexes, counts = np.unique(hits, return_counts=True)
+        ranked: List[Tuple[Article, float]] = []
+        for i in np.lexsort((indexes, -counts)):
+            score = counts[i] / len(grams)
+            if score < min_score or len(ranked) >= limit:
+                break
+            ranked.append((self._article(int(indexes[i])), round(float(score), 3)))
+        return ranked
+
+# 全局实例
+statute_store = LazyService(StatuteStore, "statute_store")
@@ -3,20 +3,118 @@ Supabase 服务模块：封装 Supabase 客户端及数据库操作
 包括获取对话历史消息和保存新消息的功能
 """
 from datetime import datetime
-from supabase import create_client, Client
 from app.config import settings
+from app.services.cache import cache_manager
+from app.services.tracing import current_span, traced
+from app.utils.lazy import LazyService
 import logging
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 分页读取文档块时每页的条数（需不超过 PostgREST 的 max-rows，否则超出部分被静默截断）
+DOCUMENT_CHUNK_PAGE_SIZE = 500
+
+def create_client(url: str, key: str):
+    """创建 Supabase 客户端（客户端库较重，首次使用时才导入）"""
+    from supabase import create_client as _create_client
+    return _create_client(url, key)
+
 class SupabaseService:
     def __init__(self):
         # 初始化 Supabase 客户端，传入配置项
-        self.client: Client = create_client(
+        self.client = create_client(
             settings.SUPABASE_URL,
             settings.SUPABASE_SERVICE_KEY
         )
+        # 对话所有者缓存：conversation_id -> user_id
+        self._owner_cache = cache_manager.namespace(
+            "conversation_owner",
+            ttl=settings.CONVERSATION_OWNER_CACHE_TTL,
+            max_entries=settings.CONVERSATION_OWNER_CACHE_SIZE
+        )
+
+    def _get_cached_owner(self, conversation_id: str):
+        """读取对话所有者缓存，未命中或已过期返回 None"""
+        return self._owner_cache.get(conversation_id)
+
+    def _cache_owner(self, conversation_id: str, owner_id: str):
+        """写入对话所有者缓存"""
+        self._owner_cache.set(conversation_id, owner_id)
+
+    @traced("supabase.check_conversation_access")
+    def check_conversation_access(self, conversation_id: str, user_id: str):
+        """
+        验证用户是否有权访问指定对话（优先使用所有者缓存）
+
+        Args:
+            conversation_id (str): 对话ID
+            user_id (str): 用户ID
+
+        Raises:
+            Exception: 当对话属于其他用户时抛出异常
+        """
+        owner_id = self._get_cached_owner(conversation_id)
+        current_span().set_attribute("cache_hit", owner_id is not None)
+        if owner_id is None:
+            # 查询 conversations 表中该对话的所有者 user_id
+            conversations = self.client.table('conversations') \
+                .select('user_id') \
+                .eq('id', conversation_id) \
+                .execute() \
+                .data
+
+            if not conversations:
+                return
+            owner_id = conversations[0].get('user_id')
+            self._cache_owner(conversation_id, owner_id)
+
+        if owner_id != user_id:
+            raise Exception("无权访问此对话")
+
+    @traced("supabase.select_messages")
+    def _select_messages(self, conversation_id: str, user_id: str = None, created_at: str = None):
+        """
+        查询对话消息，需要权限验证时通过一次关联查询同时取回所有者和消息
+
+        所有者已在缓存中时直接查询 messages 表；否则从 conversations 表内嵌查询 messages，
+        一次往返完成权限校验与消息读取。
+        """
+        current_span().set_attribute("incremental", bool(created_at))
+        if user_id and self._get_cached_owner(conversation_id) is None:
+            current_span().set_attribute("joined_access_check", True)
+            query = self.client.table('conversations') \
+                .select('user_id,messages(id,content,is_user,created_at)') \
+                .eq('id', conversation_id)
+            if created_at:
+                query = query.gte('messages.created_at', created_at)
+            conversations = query \
+                .order('created_at', foreign_table='messages') \
+                .execute() \
+                .data
+
+            # 对话不存在时没有可返回的消息（messages 依赖 conversations 外键）
+            if not conversations:
+                return []
+
+            owner_id = conversations[0].get('user_id')
+            self._cache_owner(conversation_id, owner_id)
+            if owner_id != user_id:
+                raise Exception("无权访问此对话")
+            return conversations[0].get('messages') or []
+
+        if user_id:
+            self.check_conversation_access(conversation_id, user_id)
+
+        query = self.client.table('messages') \
+            .select('id,content,is_user,created_at') \
+            .eq('conversation_id', conversation_id)
+        if created_at:
+            query = query.gte('created_at', created_at)
+        return query \
+            .order('created_at') \
+            .execute() \
+            .data
 
     def get_conversation_messages(self, conversation_id: str, user_id: str = None):
         """
@@ -27,52 +125,102 @@ class SupabaseService:
             user_id (str, optional): 用户ID，用于权限验证。如果为None，则跳过权限验证
 
         Returns:
-            list: 消息列表，每条消息包含 content, is_user, created_at 字段
+            list: 消息列表，每条消息包含 id, content, is_user, created_at 字段
 
         Raises:
             Exception: 当查询失败或用户无权访问时抛出异常
         """
         try:
-            # 如果提供了user_id，先验证用户权限
+            return self._select_messages(conversation_id, user_id)
+        except Exception as e:
+            self._log_query_error(e, "获取对话消息失败", "conversations")
+            raise Exception(f"获取对话消息失败: {self._format_error(e)}")
+
+    def get_messages_since(self, conversation_id: str, created_at: str, user_id: str = None):
+        """
+        按 created_at 键集增量获取对话消息（包含等于该时间戳的消息，由调用方按 id 去重）
+
+        Args:
+            conversation_id (str): 对话ID
+            created_at (str): 已获取的最后一条消息的创建时间
+            user_id (str, optional): 用户ID，用于权限验证。如果为None，则跳过权限验证
+
+        Returns:
+            list: 消息列表，每条消息包含 id, content, is_user, created_at 字段
+        """
+        try:
+            return self._select_messages(conversation_id, user_id, created_at)
+        except Exception as e:
+            self._log_query_error(e, "增量获取对话消息失败", "messages")
+            raise Exception(f"增量获取对话消息失败: {self._format_error(e)}")
+
+    @traced("supabase.get_messages_page")
+    def get_messages_page(
+        self,
+        conversation_id: str,
+        limit: int,
+        after_created_at: str = None,
+        after_id: str = None,
+        user_id: str = None
+    ):
+        """
+        按 (created_at, id) 键集分页获取对话消息
+
+        Args:
+            conversation_id (str): 对话ID
+            limit (int): 每页最大条数
+            after_created_at (str, optional): 上一页最后一条消息的创建时间
+            after_id (str, optional): 上一页最后一条消息的ID
+            user_id (str, optional): 用户ID，用于权限验证。如果为None，则跳过权限验证
+
+        Returns:
+            list: 消息列表，每条消息包含 id, content, is_user, created_at 字段
+        """
+        try:
             if user_id:
-                # 验证用户权限：查询 conversations 表中该对话的所有者 user_id
-                conversation_result = self.client.table('conversations') \
-                    .select('user_id') \
-                    .eq('id', conversation_id) \
-                    .execute()
-
-                conversations = conversation_result.data
-
-                if conversations and len(conversations) > 0:
-                    if conversations[0].get('user_id') != user_id:
-                        raise Exception("无权访问此对话")
-
-            # 查询 messages 表，选取需要的字段，按创建时间排序
-            messages = self.client.table('messages') \
-                .select('content,is_user,created_at') \
-                .eq('conversation_id', conversation_id) \
+                self.check_conversation_access(conversation_id, user_id)
+
+            query = self.client.table('messages') \
+                .select('id,content,is_user,created_at') \
+                .eq('conversation_id', conversation_id)
+            if after_created_at and after_id:
+                query = query.or_(
+                    f'created_at.gt."{after_created_at}",'
+                    f'and(created_at.eq."{after_created_at}",id.gt."{after_id}")'
+                )
+            elif after_created_at:
+                query = query.gt('created_at', after_created_at)
+
+            return query \
                 .order('created_at') \
+                .order('id') \
+                .limit(limit) \
                 .execute() \
                 .data
+        except Exception as e:
+            self._log_query_error(e, "分页获取对话消息失败", "messages")
+            raise Exception(f"分页获取对话消息失败: {self._format_error(e)}")
 
-            return messages
+    def _format_error(self, e: Exception) -> str:
+        """格式化 PostgREST 错误信息"""
+        error_data = getattr(e, 'error', {})
+        error_code = error_data.get('code', 'unknown')
+        error_message = error_data.get('message', str(e))
+        return f"错误码={error_code}, 信息={error_message}"
 
-        except Exception as e:
-            error_data = getattr(e, 'error', {})
-            error_code = error_data.get('code', 'unknown')
-            error_message = error_data.get('message', str(e))
-            error_details = error_data.get('details', None)
-
-            logger.error(
-                f"获取对话消息失败:\n"
-                f"错误码: {error_code}\n"
-                f"错误信息: {error_message}\n" 
-                f"详细信息: {error_details}\n"
-                f"表: conversations\n"
-                f"操作: select"
-            )
-            raise Exception(f"获取对话消息失败: 错误码={error_code}, 信息={error_message}")
+    def _log_query_error(self, e: Exception, title: str, table: str):
+        """记录查询失败的详细日志"""
+        error_data = getattr(e, 'error', {})
+        logger.error(
+            f"{title}:\n"
+            f"错误码: {error_data.get('code', 'unknown')}\n"
+            f"错误信息: {error_data.get('message', str(e))}\n"
+            f"详细信息: {error_data.get('details', None)}\n"
+            f"表: {table}\n"
+            f"操作: select"
+        )
 
+    @traced("supabase.update_file_status")
     async def update_file_status(self, file_id: str, status: str, error_message: str = None):
         """更新文件处理状态"""
         update_data = {
@@ -94,6 +242,7 @@ class SupabaseService:
             logger.error(f"更新文件状态失败: {str(e)}")
             raise e
 
+    @traced("supabase.update_file_progress")
     async def update_file_progress(self, file_id: str, progress: int):
         """更新文件处理进度"""
         try:
@@ -105,6 +254,7 @@ class SupabaseService:
             raise e
 
 
+    @traced("supabase.store_document_chunk")
     async def store_document_chunk(self, file_id: str, user_id: str, content: str, embedding: list):
         """存储文档块及其向量"""
         try:
@@ -143,6 +293,43 @@ class SupabaseService:
             logger.error(f"存储文档块失败: {str(e)}")
             raise
 
+    @traced("supabase.get_document_chunks")
+    def get_document_chunks(self, file_id: str, user_id: str):
+        """
+        按入库顺序获取文件的全部文档块内容
+
+        文档块按顺序逐个写入，created_at 即入库顺序（id 仅用于区分同一时间戳）；
+        按页读取直到取完，避免单次查询被 max-rows 截断。
+
+        Args:
+            file_id (str): 文件ID
+            user_id (str): 用户ID，只返回该用户的文档块
+
+        Returns:
+            list: 文档块内容列表
+        """
+        try:
+            contents = []
+            while True:
+                start = len(contents)
+                page = self.client.table('document_chunks') \
+                    .select('id,content') \
+                    .eq('file_id', file_id) \
+                    .eq('user_id', user_id) \
+                    .order('created_at') \
+                    .order('id') \
+                    .range(start, start + DOCUMENT_CHUNK_PAGE_SIZE - 1) \
+                    .execute() \
+                    .data or []
+                contents.extend(row['content'] for row in page)
+                if len(page) < DOCUMENT_CHUNK_PAGE_SIZE:
+                    break
+            return contents
+        except Exception as e:
+            self._log_query_error(e, "获取文档块失败", "document_chunks")
+            raise Exception(f"获取文档块失败: {self._format_error(e)}")
+
+    @traced("supabase.save_message")
     def save_message(self, conversation_id: str, content: str, is_user: bool):
         """
         保存一条消息记录到 messages 表中
@@ -172,5 +359,25 @@ class SupabaseService:
 
         return result[0] if result else None
 
+    @traced("supabase.save_messages")
+    def save_messages(self, rows: list):
+        """
+        批量保存消息记录到 messages 表中（一次插入请求）
+
+        Args:
+            rows (list): 消息记录列表，每条包含 id, conversation_id, content, is_user, created_at 字段
+
+        Returns:
+            list: 插入的消息记录
+        """
+        if not rows:
+            return []
+
+        current_span().set_attribute("rows", len(rows))
+        return self.client.table('messages') \
+            .insert(rows) \
+            .execute() \
+            .data
+
 # 全局实例化，后续模块可直接导入使用
-supabase_service = SupabaseService()
\ No newline at end of file
+supabase_service = LazyService(SupabaseService, "supabase_service")
\ No newline at end of file
@@ -0,0 +1,346 @@
+"""
+请求追踪：每个请求一个 trace ID，各处理阶段记录为 span（耗时、属性、事件），整条链路结束后交给导出器
+
+当前 span 保存在 contextvars 中，随 await、asyncio 任务与 asyncio.to_thread 自动传递，无需逐层传参。
+未配置导出器（TRACING_EXPORTER=none）时仍生成 trace ID 并通过 X-Trace-Id 响应头返回，但不记录 span。
+
+    with tracer.span("chat.match_documents", cache_hit=False) as span:
+        ...
+        span.set_attribute("match_count", len(docs))
+"""
+import functools
+import inspect
+import logging
+import queue
+import re
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.config import settings
+from app.utils.serialization import dumps, ndjson_line
+
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = "X-Trace-Id"
+# 沿用请求中携带的 trace ID 时的格式限制
+_TRACE_ID_PATTERN = re.compile(r"^[0-9A-Za-z\-]{8,64}$")
+
+
+class _Trace:
+    """一条追踪链路：根 span 结束时整体导出，之后结束的 span 不再记录"""
+    __slots__ = ("trace_id", "spans", "recording")
+
+    def __init__(self, trace_id: str, recording: bool):
+        self.trace_id = trace_id
+        self.spans: List["Span"] = []
+        self.recording = recording
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "events",
+                 "start_time", "_started", "duration", "error")
+
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.events: List[Dict[str, Any]] = []
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        """记录 span 内的时间点事件（如重试）"""
+        self.events.append({
+            "name": name,
+            "offset_ms": round((time.perf_counter() - self._started) * 1000, 3),
+            **attributes
+        })
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._started
+        if self.trace.recording:
+            self.trace.spans.append(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+            "events": self.events,
+        }
+
+
+class _NoopSpan:
+    """不记录时使用的空 span，调用方无需判断是否在追踪中"""
+    trace_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes: Any) -> None:
+        pass
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class SpanExporter(ABC):
+    """导出器接口：接收一条链路的全部 span（按结束顺序，根 span 在最后）；在事件循环中调用，不应阻塞"""
+
+    @abstractmethod
+    def export(self, spans: List[Span]) -> None:
+        """导出一条链路"""
+
+
+class ConsoleSpanExporter(SpanExporter):
+    """按调用层级输出到日志，便于本地调试"""
+
+    def export(self, spans: List[Span]) -> None:
+        children: Dict[Optional[str], List[Span]] = {}
+        for span in sorted(spans, key=lambda s: s._started):
+            children.setdefault(span.parent_id, []).append(span)
+        span_ids = {span.span_id for span in spans}
+        roots = [span for span in spans if span.parent_id not in span_ids]
+        lines = []
+
+        def walk(span: Span, depth: int) -> None:
+            status = f" 错误: {span.error}" if span.error else ""
+            attributes = f" {dumps(span.attributes).decode('utf-8')}" if span.attributes else ""
+            lines.append(f"{'  ' * depth}{span.name} {span.duration * 1000:.1f}ms{attributes}{status}")
+            for child in children.get(span.span_id, []):
+                walk(child, depth + 1)
+
+        for root in roots:
+            walk(root, 0)
+        logger.info(f"trace {spans[-1].trace_id}:\n" + "\n".join(lines))
+
+
+class JsonlSpanExporter(SpanExporter):
+    """
+    每个 span 一行 JSON 追加写入文件（一条链路一次写入，多进程追加不会交错）
+
+    编码在调用方完成，文件写入交给后台线程，不阻塞事件循环。线程在首次导出时启动（fork 之后）。
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._queue: "queue.Queue[bytes]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        self._queue.put(b"".join(ndjson_line(span.to_dict()) for span in spans))
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+                    self._writer.start()
+
+    def _write_loop(self) -> None:
+        while True:
+            data = self._queue.get()
+            try:
+                with open(self.path, "ab") as f:
+                    f.write(data)
+            except Exception as e:
+                logger.error(f"写入追踪文件失败: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """等待已导出的链路全部写入文件"""
+        self._queue.join()
+
+
+def create_exporter(name: str) -> Optional[SpanExporter]:
+    """按配置名称创建导出器，none 或空表示不记录 span"""
+    name = (name or "none").lower()
+    if name == "none":
+        return None
+    if name == "console":
+        return ConsoleSpanExporter()
+    if name == "jsonl":
+        return JsonlSpanExporter(settings.TRACING_FILE)
+    raise ValueError(f"不支持的追踪导出器: {name}")
+
+
+class Tracer:
+    def __init__(self):
+        self._exporter: Optional[SpanExporter] = None
+        self._configured = False
+
+    @property
+    def exporter(self) -> Optional[SpanExporter]:
+        if not self._configured:
+            self._exporter = create_exporter(settings.TRACING_EXPORTER)
+            self._configured = True
+        return self._exporter
+
+    def set_exporter(self, exporter: Optional[SpanExporter]) -> None:
+        """替换导出器（自定义后端或测试），None 表示不记录 span"""
+        self._exporter = exporter
+        self._configured = True
+
+    def start_trace(self, name: str, trace_id: Optional[str] = None, **attributes: Any) -> Span:
+        """开始一条新链路并返回根 span（不改变当前上下文），由 finish_trace 结束"""
+        if not trace_id or not _TRACE_ID_PATTERN.match(trace_id):
+            trace_id = uuid.uuid4().hex
+        return Span(_Trace(trace_id, self.exporter is not None), name, None, attributes)
+
+    def finish_trace(self, root: Span) -> None:
+        """结束根 span 并导出整条链路（可重复调用，只导出一次）"""
+        trace = root.trace
+        if root.duration is not None and not trace.recording:
+            return
+        root.end()
+        if not trace.recording:
+            return
+        trace.recording = False
+        try:
+            self._exporter.export(trace.spans)
+        except Exception as e:
+            logger.error(f"导出追踪数据失败: {str(e)}")
+
+    @contextmanager
+    def trace(self, name: str, trace_id: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+        """
+        开始一条新链路，代码块内的 span 都属于该链路；结束时导出
+
+        在已有链路中调用时另起一条链路（如请求结束后继续运行的后台任务），可传入原 trace ID 以便关联。
+        """
+        root = self.start_trace(name, trace_id, **attributes)
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish_trace(root)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Any]:
+        """在当前链路中记录一个子 span；不在链路中或不记录时返回空 span"""
+        parent = _current_span.get()
+        if parent is None or not parent.trace.recording:
+            yield NOOP_SPAN
+            return
+        span = Span(parent.trace, name, parent.span_id, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+
+def current_span() -> Any:
+    """当前 span（不在链路中时返回空 span）"""
+    span = _current_span.get()
+    if span is None or not span.trace.recording:
+        return NOOP_SPAN
+    return span
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+def traced(name: str):
+    """将函数（同步或异步）的每次调用记录为 span"""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TraceMiddleware:
+    """
+    ASGI 中间件：每个 HTTP 请求一条链路，trace ID 通过 X-Trace-Id 响应头返回（请求中携带时沿用）
+
+    响应体发送完毕即结束链路；请求结束后运行的后台任务需自行开启链路。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for key, value in scope.get("headers", []):
+            if key == b"x-trace-id":
+                incoming = value.decode("latin-1")
+                break
+        with tracer.trace("http.request", trace_id=incoming, method=scope["method"], path=scope["path"]) as root:
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    root.set_attribute("status_code", message["status"])
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (TRACE_HEADER.lower().encode("latin-1"), root.trace_id.encode("latin-1"))
+                    ]
+                await send(message)
+                if message["type"] == "http.response.body" and not message.get("more_body", False):
+                    tracer.finish_trace(root)
+
+            await self.app(scope, receive, send_with_trace_id)
+
+
+# 全局实例
+tracer = Tracer()
@@ -0,0 +1,253 @@
+"""
+网络搜索模块：异步、带缓存、去重的搜索阶段
+
+GeneralSearch 与 ProductSearch 两个来源并发执行，各自有超时；结果按规范化查询缓存（TTL），
+近似重复的摘要按字符 shingle 的 Jaccard 相似度去除（对应系统提示词中“去除重复或相似部分”），
+最终只把不超过 token 预算的摘要注入提示词。
+"""
+import asyncio
+import logging
+import re
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.services.api_scheduler import estimate_tokens
+from app.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# 计算摘要相似度时的 shingle 长度（字符）；中文按字切分，3 字较稳健
+SHINGLE_SIZE = 3
+
+# 商品搜索限定的电商站点
+PRODUCT_SEARCH_TEMPLATE = "site:https://www.1688.com/ OR site:jd.com OR site:https://www.yiwugo.com/ {query} 销量排行"
+
+
+@dataclass(frozen=True)
+class SearchResult:
+    """单条搜索结果"""
+    title: str
+    snippet: str
+    url: str
+    source: str
+
+
+class SearchBackend(ABC):
+    """搜索后端接口"""
+
+    @abstractmethod
+    async def search(self, query: str, max_results: int) -> List[Dict[str, str]]:
+        """返回 [{"title", "snippet", "link"}, ...]"""
+
+
+class DuckDuckGoBackend(SearchBackend):
+    """DuckDuckGo 搜索（同步接口在线程池中执行）"""
+
+    def __init__(self, query_template: str = "{query}"):
+        from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
+
+        self.query_template = query_template
+        self.wrapper = DuckDuckGoSearchAPIWrapper(region="cn-zh", time="m", safesearch="moderate")
+
+    async def search(self, query: str, max_results: int) -> List[Dict[str, str]]:
+        return await asyncio.to_thread(
+            self.wrapper.results, self.query_template.format(query=query), max_results
+        )
+
+
+class LocalSearchBackend(SearchBackend):
+    """本地替身后端：在内存文档中按关键词匹配，用于测试和离线环境"""
+
+    def __init__(self, documents: Iterable[Dict[str, str]] = (), delay: float = 0.0):
+        self.documents = list(documents)
+        self.delay = delay
+        self.calls = 0
+
+    async def search(self, query: str, max_results: int) -> List[Dict[str, str]]:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        terms = [t for t in normalize_query(query).split() if t]
+        matched = [
+            doc for doc in self.documents
+            if any(term in (doc.get("title", "") + doc.get("snippet", "")).lower() for term in terms)
+        ]
+        return matched[:max_results]
+
+
+def normalize_query(query: str) -> str:
+    """规范化查询：小写、去标点、合并空白，作为缓存键"""
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return " ".join(query.split())
+
+
+def _shingles(text: str) -> Set[str]:
+    text = re.sub(r"\s+", "", text.lower())
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def dedupe_results(results: List[SearchResult], threshold: float) -> List[SearchResult]:
+    """
+    去除近似重复的结果：与已保留结果的 shingle Jaccard 相似度不低于阈值即丢弃
+
+    Args:
+        results: 按优先级排列的结果
+        threshold: 相似度阈值（0~1）
+    """
+    kept: List[Tuple[SearchResult, Set[str]]] = []
+    seen_urls = set()
+    for result in results:
+        if result.url and result.url in seen_urls:
+            continue
+        shingles = _shingles(result.snippet or result.title)
+        duplicate = False
+        for _, other in kept:
+            union = len(shingles | other)
+            if union and len(shingles & other) / union >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append((result, shingles))
+            seen_urls.add(result.url)
+    return [result for result, _ in kept]
+
+
+def build_digest(results: List[SearchResult], max_tokens: int) -> str:
+    """将结果整理为不超过 token 预算的摘要"""
+    lines = []
+    used = 0
+    for i, result in enumerate(results, 1):
+        line = f"{i}. [{result.source}] {result.title}：{result.snippet}"
+        if result.url:
+            line += f"（{result.url}）"
+        cost = estimate_tokens(line)
+        if used + cost > max_tokens:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
+
+
+class WebSearchService:
+    def __init__(
+        self,
+        sources: Optional[Dict[str, SearchBackend]] = None,
+        timeout: float = None,
+        cache_ttl: float = None,
+        cache_size: int = None
+    ):
+        """
+        Args:
+            sources: 来源名称 -> 搜索后端，默认按 WEB_SEARCH_BACKEND 创建 GeneralSearch / ProductSearch
+            timeout: 每个来源的超时（秒）
+        """
+        self._sources = sources
+        self.timeout = timeout or settings.WEB_SEARCH_TIMEOUT
+        self.cache_ttl = cache_ttl or settings.WEB_SEARCH_CACHE_TTL
+        self.cache_size = cache_size or settings.WEB_SEARCH_CACHE_SIZE
+        # (来源, 规范化查询) -> (过期时刻, 结果)
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, List[SearchResult]]]" = OrderedDict()
+        self.flight = SingleFlight("网络搜索")
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.timeouts = 0
+
+    @property
+    def sources(self) -> Dict[str, SearchBackend]:
+        # 首次使用时再创建后端，避免未启用搜索时导入搜索依赖
+        if self._sources is None:
+            if settings.WEB_SEARCH_BACKEND == "local":
+                self._sources = {"GeneralSearch": LocalSearchBackend(), "ProductSearch": LocalSearchBackend()}
+            else:
+                self._sources = {
+                    "GeneralSearch": DuckDuckGoBackend(),
+                    "ProductSearch": DuckDuckGoBackend(PRODUCT_SEARCH_TEMPLATE),
+                }
+        return self._sources
+
+    async def search(self, query: str, timeout: Optional[float] = None) -> List[SearchResult]:
+        """
+        并发查询所有来源，合并去重后返回
+
+        Args:
+            query: 查询文本
+            timeout: 本次每个来源的超时上限，默认 WEB_SEARCH_TIMEOUT
+        """
+        normalized = normalize_query(query)
+        if not normalized:
+            return []
+        per_source_timeout = min(self.timeout, timeout) if timeout else self.timeout
+        batches = await asyncio.gather(*(
+            self._search_source(name, backend, normalized, per_source_timeout)
+            for name, backend in self.sources.items()
+        ))
+        merged = [result for batch in batches for result in batch]
+        return dedupe_results(merged, settings.WEB_SEARCH_DEDUP_THRESHOLD)
+
+    async def build_context(
+        self, query: str, max_tokens: int = None, timeout: Optional[float] = None
+    ) -> str:
+        """返回可直接注入提示词的搜索摘要，无结果时为空字符串"""
+        results = await self.search(query, timeout)
+        return build_digest(results, max_tokens or settings.WEB_SEARCH_DIGEST_TOKENS)
+
+    async def _search_source(
+        self, name: str, backend: SearchBackend, normalized: str, timeout: float
+    ) -> List[SearchResult]:
+        key = (name, normalized)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached[1]
+        self.cache_misses += 1
+
+        try:
+            results = await asyncio.wait_for(
+                self.flight.do(key, lambda: self._fetch(name, backend, normalized)),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning(f"{name} 搜索超过{timeout:.1f}秒，跳过该来源")
+            return []
+        except Exception as e:
+            logger.error(f"{name} 搜索失败: {str(e)}")
+            return []
+
+        self._cache[key] = (time.monotonic() + self.cache_ttl, results)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return results
+
+    async def _fetch(self, name: str, backend: SearchBackend, normalized: str) -> List[SearchResult]:
+        raw = await backend.search(normalized, settings.WEB_SEARCH_MAX_RESULTS)
+        return [
+            SearchResult(
+                title=item.get("title", "").strip(),
+                snippet=item.get("snippet", "").strip(),
+                url=item.get("link", ""),
+                source=name
+            )
+            for item in raw
+            if item.get("snippet") or item.get("title")
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "cache_entries": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "timeouts": self.timeouts,
+        }
+
+
+# 全局实例
+web_search_service = WebSearchService()
@@ -0,0 +1,100 @@
+"""
+准入控制的单元测试
+"""
+import asyncio
+import pytest
+
+from app.services.admission_control import AdmissionController, AdmissionRejected
+
+
+@pytest.mark.asyncio
+async def test_per_user_rate_limit():
+    """
+    测试单个用户超出突发额度后返回 429，其他用户不受影响
+    """
+    controller = AdmissionController(user_rpm=60, user_burst=2, max_concurrent=10)
+
+    for _ in range(2):
+        async with controller.admit("user-1"):
+            pass
+
+    with pytest.raises(AdmissionRejected) as exc_info:
+        async with controller.admit("user-1"):
+            pass
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.retry_after >= 1
+
+    async with controller.admit("user-2"):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_bounded_queue_and_max_wait():
+    """
+    测试并发槽位用完后排队，队列已满或等待超时返回 503
+    """
+    controller = AdmissionController(user_rpm=600, user_burst=10, max_concurrent=1, max_queue=1, max_wait=0.05)
+    release = asyncio.Event()
+
+    async def hold():
+        async with controller.admit("holder"):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+
+    async def queued():
+        async with controller.admit("waiter"):
+            pass
+
+    waiter = asyncio.create_task(queued())
+    await asyncio.sleep(0)
+
+    # 队列已满
+    with pytest.raises(AdmissionRejected) as exc_info:
+        async with controller.admit("third"):
+            pass
+    assert exc_info.value.status_code == 503
+
+    # 排队超时
+    with pytest.raises(AdmissionRejected):
+        await waiter
+    release.set()
+    await holder
+    assert controller.stats()["inflight"] == 0
+    assert controller.stats()["rejected_overloaded"] == 2
+
+
+@pytest.mark.asyncio
+async def test_slot_handed_to_waiter():
+    """
+    测试槽位释放后直接转交给排队的请求
+    """
+    controller = AdmissionController(user_rpm=600, user_burst=10, max_concurrent=1, max_queue=5, max_wait=1.0)
+    order = []
+
+    async def work(name):
+        async with controller.admit(name):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(work("a"), work("b"), work("c"))
+    assert order == ["a", "b", "c"]
+    assert controller.stats()["inflight"] == 0
+
+
+def test_degradation_by_latency():
+    """
+    测试平均耗时升高时依次关闭网络搜索、文档检索、意图识别
+    """
+    controller = AdmissionController(latency_target=10.0)
+    assert controller.disabled_stages() == []
+
+    controller._record_latency(5.0)
+    assert controller.disabled_stages() == ["web_search"]
+
+    controller._record_latency(7.0)
+    assert controller.disabled_stages() == ["web_search", "retrieval"]
+
+    controller._record_latency(12.0)
+    assert controller.disabled_stages() == ["web_search", "retrieval", "intent_detection"]
@@ -0,0 +1,100 @@
+"""
+出站调用调度器的单元测试
+"""
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+
+from app.services.api_scheduler import OutboundScheduler, Priority, estimate_tokens
+
+
+class _RateLimitError(Exception):
+    def __init__(self, retry_after: str):
+        super().__init__("rate limited")
+        self.status_code = 429
+        self.response = MagicMock(headers={"retry-after": retry_after})
+
+
+@pytest.mark.asyncio
+async def test_interactive_calls_run_before_background():
+    """
+    测试额度不足时排队的交互请求优先于后台请求放行
+    """
+    # 每分钟 60 次请求 -> 每秒补充 1 次
+    scheduler = OutboundScheduler(limits={"openai": (60, 1000000)}, max_retries=0)
+    scheduler._state("openai").requests.tokens = 0.0
+    order = []
+
+    async def call(name, priority):
+        await scheduler.acquire("openai", 1, priority)
+        order.append(name)
+
+    background = asyncio.ensure_future(call("后台", Priority.BACKGROUND))
+    await asyncio.sleep(0)
+    interactive = asyncio.ensure_future(call("交互", Priority.INTERACTIVE))
+    await asyncio.wait_for(asyncio.gather(background, interactive), timeout=5)
+
+    assert order == ["交互", "后台"]
+
+
+@pytest.mark.asyncio
+async def test_run_honours_retry_after():
+    """
+    测试 429 时按 Retry-After 暂停后重试
+    """
+    scheduler = OutboundScheduler(limits={"openai": (6000, 1000000)}, max_retries=2)
+    attempts = 0
+
+    async def call():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise _RateLimitError("0.05")
+        return "ok"
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    assert await scheduler.run("openai", call) == "ok"
+    assert loop.time() - started >= 0.05
+    assert scheduler.stats()["openai"]["rate_limited"] == 1
+
+
+def test_estimate_tokens():
+    """
+    测试 token 估算
+    """
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("招标公告") == 4
+    assert estimate_tokens("abcdefgh") == 2
+
+
+@pytest.mark.asyncio
+async def test_priority_floor_demotes_interactive_calls():
+    """
+    测试设置最低优先级的任务中，声明为交互式的调用按后台优先级排队
+    """
+    from app.services.api_scheduler import priority_floor
+
+    scheduler = OutboundScheduler(limits={"openai": (60, 1000000)}, max_retries=0)
+    scheduler._state("openai").requests.tokens = 0.0
+    order = []
+
+    async def call(name, floor):
+        priority_floor.set(floor)
+        await scheduler.acquire("openai", 1, Priority.INTERACTIVE)
+        order.append(name)
+
+    batch = asyncio.ensure_future(call("批量", Priority.BACKGROUND))
+    await asyncio.sleep(0)
+    online = asyncio.ensure_future(call("在线", Priority.INTERACTIVE))
+    await asyncio.wait_for(asyncio.gather(batch, online), timeout=5)
+
+    assert order == ["在线", "批量"]
+
+
+def test_partition_splits_limits_across_workers():
+    scheduler = OutboundScheduler(limits={"openai": (100, 9000), "deepseek": (2, 10)})
+    scheduler._state("openai")
+    scheduler.partition(4)
+    assert scheduler.limits == {"openai": (25, 2250), "deepseek": (1, 2)}
+    assert scheduler._state("openai").requests.capacity == 25
@@ -0,0 +1,108 @@
+"""
+批量聊天任务的单元测试
+"""
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.services.api_scheduler import Priority, priority_floor
+from app.services.batch_chat import BatchChatService, BatchRejected
+
+
+def _fake_generate(state):
+    async def generate(message, history, user_id=None, deadline=None):
+        assert history == []
+        assert priority_floor.get() == Priority.BACKGROUND
+        state["running"] += 1
+        state["peak"] = max(state["peak"], state["running"])
+        await asyncio.sleep(0.01 * int(message.split("-")[1]))
+        state["running"] -= 1
+        if message.endswith("-3"):
+            raise Exception("生成回复失败")
+        return f"答复{message}"
+    return generate
+
+
+async def _collect(service, job, after=0):
+    return [line async for line in service.stream(job, after)]
+
+
+@pytest.mark.asyncio
+async def test_batch_runs_with_bounded_concurrency():
+    """
+    测试条目有界并发执行、结果按完成顺序输出、单条失败不影响其他条目
+    """
+    service = BatchChatService(concurrency=3, max_items=100, job_ttl=60)
+    state = {"running": 0, "peak": 0}
+    items = [{"id": f"q{i}", "message": f"问题-{i}"} for i in (5, 1, 3, 2, 4, 6)]
+
+    with patch("app.services.batch_chat.chat_service.generate_response", side_effect=_fake_generate(state)):
+        job = service.submit("user-1", items)
+        lines = await _collect(service, job)
+
+    assert lines[0] == {"job_id": job.job_id, "total": 6, "completed": 0}
+    results = lines[1:-1]
+    assert len(results) == 6
+    assert results[0]["id"] == "q1"  # 最快完成的先输出
+    assert {r["id"]: r["status"] for r in results}["q3"] == "error"
+    assert lines[-1] == {"job_id": job.job_id, "status": "completed", "total": 6,
+                         "completed": 6, "succeeded": 5, "failed": 1}
+    assert state["peak"] == 3
+    assert priority_floor.get() == Priority.INTERACTIVE
+
+
+@pytest.mark.asyncio
+async def test_resume_replays_and_extends_job():
+    """
+    测试凭任务 ID 重新订阅时重放已完成结果，续跑时只处理新增条目
+    """
+    service = BatchChatService(concurrency=4, max_items=100, job_ttl=60)
+    state = {"running": 0, "peak": 0}
+
+    with patch("app.services.batch_chat.chat_service.generate_response",
+               side_effect=_fake_generate(state)) as generate:
+        job = service.submit("user-1", ["问题-1", "问题-2"])
+        await _collect(service, job)
+        assert service.get(job.job_id, "user-2") is None
+
+        replay = await _collect(service, service.get(job.job_id, "user-1"), after=1)
+        assert len(replay) == 3  # 概况 + 第2条结果 + 汇总
+
+        service.submit("user-1", ["问题-1", "问题-2", "问题-4"], job_id=job.job_id)
+        lines = await _collect(service, job, after=2)
+
+    assert [line["id"] for line in lines[1:-1]] == ["2"]
+    assert lines[-1]["completed"] == 3
+    assert generate.call_count == 3
+
+
+def test_submit_validation():
+    service = BatchChatService(concurrency=2, max_items=2, job_ttl=60)
+    with pytest.raises(ValueError):
+        service.submit("user-1", [])
+    with pytest.raises(ValueError):
+        service.submit("user-1", [{"id": "a", "message": "x"}, {"id": "a", "message": "y"}])
+    with pytest.raises(BatchRejected) as exc_info:
+        service.submit("user-1", ["a", "b", "c"])
+    assert exc_info.value.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_submit_with_unknown_or_foreign_job_id_is_rejected():
+    """
+    测试续跑其他用户或不存在的任务时返回 404，且不会覆盖原任务
+    """
+    service = BatchChatService(concurrency=2, max_items=10, job_ttl=60)
+    state = {"running": 0, "peak": 0}
+
+    with patch("app.services.batch_chat.chat_service.generate_response", side_effect=_fake_generate(state)):
+        job = service.submit("alice", ["问题-1"])
+        for user_id, job_id in (("mallory", job.job_id), ("alice", "client-chosen-id")):
+            with pytest.raises(BatchRejected) as exc_info:
+                service.submit(user_id, ["问题-2"], job_id=job_id)
+            assert exc_info.value.status_code == 404
+        await _collect(service, job)
+
+    assert service.get(job.job_id, "alice") is job
+    assert service.get("client-chosen-id", "alice") is None
@@ -0,0 +1,89 @@
+"""
+长投标文件 map-reduce 评估的单元测试
+"""
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.services.bid_evaluation import (
+    BidEvaluationService, group_chunks, parse_findings, OTHER_FINDINGS, _MAP_PROMPT, _REDUCE_PROMPT
+)
+
+
+def test_group_chunks_respects_token_limit():
+    chunks = ["甲" * 400, "乙" * 400, "丙" * 400, "丁" * 1500]
+    groups = group_chunks(chunks, 1000)
+    assert [len(g) for g in groups] == [801, 400, 1500]
+
+
+def test_parse_findings():
+    text = '评审结果如下：{"形式合规性": ["缺少授权书"], "风险提示": "报价偏低", "其它": ["x"]}'
+    assert parse_findings(text) == {"形式合规性": ["缺少授权书"], "风险提示": ["报价偏低"], OTHER_FINDINGS: ["x"]}
+    assert parse_findings("无法解析的输出") == {OTHER_FINDINGS: ["无法解析的输出"]}
+
+
+async def _collect(service, chunks, invoke):
+    with patch("app.services.bid_evaluation.supabase_service.get_document_chunks", return_value=chunks), \
+            patch.object(service, "_invoke", side_effect=invoke):
+        return [event async for event in service.evaluate("file-1", "user-1")]
+
+
+@pytest.mark.asyncio
+async def test_map_reduce_with_bounded_concurrency():
+    """
+    测试各组并发评估且不超过并发上限，某组失败不影响汇总
+    """
+    service = BidEvaluationService(model=object(), concurrency=3, group_tokens=1000, reduce_tokens=100000)
+    running, peak = 0, 0
+
+    async def invoke(prompt, variables):
+        nonlocal running, peak
+        if prompt is _REDUCE_PROMPT:
+            assert "第1组缺少授权书" in variables["findings"]
+            return "评估报告"
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        if variables["index"] == 5:
+            raise RuntimeError("模型调用失败")
+        return json.dumps({"形式合规性": [f"第{variables['index']}组缺少授权书"], "风险提示": []}, ensure_ascii=False)
+
+    events = await _collect(service, ["内容" * 400] * 10, invoke)
+
+    map_events = [e for e in events if e["stage"] == "map"]
+    assert map_events[-1] == {"stage": "map", "total": 10, "completed": 10, "failed": 1}
+    assert peak == 3
+    done = events[-1]
+    assert done["stage"] == "done"
+    assert done["report"] == "评估报告"
+    assert done["failed_groups"] == [5]
+    assert len(done["findings"]["形式合规性"]) == 9
+
+
+@pytest.mark.asyncio
+async def test_findings_condensed_before_reduce():
+    """
+    测试发现超出汇总上限时先分批压缩
+    """
+    service = BidEvaluationService(model=object(), concurrency=4, group_tokens=500, reduce_tokens=300)
+
+    async def invoke(prompt, variables):
+        if prompt is _MAP_PROMPT:
+            return json.dumps({"技术响应度": [f"第{variables['index']}组偏离" + "详" * 40]}, ensure_ascii=False)
+        if prompt is _REDUCE_PROMPT:
+            return "评估报告"
+        return "- 多处技术偏离"
+
+    events = await _collect(service, ["内容" * 200] * 12, invoke)
+
+    assert any(e["stage"] == "reduce" and not e.get("final") for e in events)
+    assert events[-1]["findings"]["技术响应度"] == ["多处技术偏离"]
+
+
+@pytest.mark.asyncio
+async def test_missing_file_content():
+    events = await _collect(BidEvaluationService(model=object()), [], None)
+    assert events == [{"stage": "error", "error": "文件没有可评估的内容，请确认文件已处理完成"}]
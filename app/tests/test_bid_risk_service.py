@@ -0,0 +1,105 @@
+"""
+投标表批量风险分析的单元测试
+"""
+import time
+
+import pandas as pd
+
+from app.services.bid_risk_service import BidRiskService
+from app.utils.serialization import dumps
+
+service = BidRiskService()
+
+
+def _bidders(n: int = 8) -> pd.DataFrame:
+    return pd.DataFrame({
+        "bidder": [f"供应商{i}" for i in range(n)],
+        "quote": [100.0] * n,
+        "submitted_at": pd.date_range("2024-05-01 09:00", periods=n, freq="3h", tz="UTC").astype(str),
+        "credit_code": ["913200001234567890"] * n,
+        "issuer_region_code": ["320100"] * n,
+        "cert_issued_at": pd.date_range("2024-04-01", periods=n, freq="1D", tz="UTC").astype(str),
+        "deposit_bank": [f"银行{i}" for i in range(n)],
+    })
+
+
+def _flagged(result, rule):
+    return sorted(f["bidder"] for f in result["flags"] if f["rule"] == rule)
+
+
+def test_clean_table_has_no_flags():
+    result = service.analyze(_bidders())
+    assert result["flags"] == []
+    assert result["bidders"] == []
+    assert result["skipped_rules"] == []
+
+
+def test_cross_bidder_rules():
+    """
+    测试基准价偏差、证书时间聚集、开户行集中度、信用代码区划不一致
+    """
+    df = _bidders(10)
+    df.loc[1, "quote"] = 102.0  # 偏离基准价约2%
+    df.loc[2, "cert_issued_at"] = "2024-04-03T00:04:00+00:00"  # 与供应商2原时间相差4分钟
+    df.loc[[3, 4, 5, 6, 7, 8, 9], "deposit_bank"] = "某农商行"
+    df.loc[0, "credit_code"] = "914400001234567890"  # 广东登记、江苏发证
+
+    result = service.analyze(df, benchmark_price=100.0)
+
+    assert _flagged(result, "benchmark_deviation") == ["供应商1"]
+    assert _flagged(result, "cert_time_cluster") == []
+    assert _flagged(result, "deposit_bank_concentration") == [f"供应商{i}" for i in range(3, 10)]
+    assert _flagged(result, "issuer_region_mismatch") == ["供应商0"]
+    case_refs = {f["rule"]: f["case_ref"] for f in result["flags"]}
+    assert "京财监督〔2023〕42号" in case_refs["deposit_bank_concentration"]
+
+    df.loc[3, "cert_issued_at"] = "2024-04-03T00:04:00+00:00"
+    df.loc[2, "cert_issued_at"] = "2024-04-03T00:00:00+00:00"
+    assert _flagged(service.analyze(df), "cert_time_cluster") == ["供应商2", "供应商3"]
+
+
+def test_benchmark_rule_needs_seven_bidders():
+    df = _bidders(5)
+    df.loc[1, "quote"] = 102.0
+    assert _flagged(service.analyze(df, benchmark_price=100.0), "benchmark_deviation") == []
+
+
+def test_similar_documents_and_unbalanced_pricing():
+    """
+    测试相似投标文件（时间差<2小时）与不平衡报价
+    """
+    df = _bidders(3)
+    df.loc[1, "submitted_at"] = "2024-05-01T09:30:00+00:00"
+    pairs = pd.DataFrame([
+        {"bidder_a": "供应商0", "bidder_b": "供应商1", "similarity": 0.92},
+        {"bidder_a": "供应商0", "bidder_b": "供应商2", "similarity": 0.95},  # 时间相差6小时
+    ])
+    items = pd.DataFrame([
+        {"bidder": "供应商2", "item": "服务器", "unit_price": 400.0, "market_price": 100.0},
+        {"bidder": "供应商2", "item": "交换机", "unit_price": 10.0, "market_price": 100.0},
+    ])
+    result = service.analyze(df, items=items, similar_pairs=pairs, benchmark_price=100.0)
+
+    assert _flagged(result, "similar_documents") == ["供应商0", "供应商1"]
+    assert _flagged(result, "unbalanced_pricing") == ["供应商2"]
+    summary = {b["bidder"]: b for b in result["bidders"]}
+    assert summary["供应商0"]["risk_level"] == "medium"
+
+
+def test_missing_columns_are_skipped():
+    result = service.analyze(pd.DataFrame({"投标人": ["甲", "乙"], "报价": [1.0, 2.0]}))
+    assert {s["rule"] for s in result["skipped_rules"]} == {
+        "similar_documents", "issuer_region_mismatch", "cert_time_cluster", "deposit_bank_concentration"
+    }
+
+
+def test_hundreds_of_bidders_in_milliseconds():
+    df = _bidders(500)
+    df["deposit_bank"] = "同一银行"
+    started = time.perf_counter()
+    result = service.analyze(df)
+    elapsed = time.perf_counter() - started
+
+    assert len(result["bidders"]) == 500
+    assert elapsed < 0.2
+    dumps(result)  # 结果可直接序列化
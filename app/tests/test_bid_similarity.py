@@ -0,0 +1,81 @@
+"""
+投标文件相似度检测的单元测试
+"""
+import random
+
+import numpy as np
+
+from app.services.bid_similarity import BidSimilarityService, MinHasher, estimate_similarity
+
+_VOCAB = ["项目", "设备", "服务器", "交换机", "运维", "响应", "技术", "方案", "质量", "保障", "售后",
+          "人员", "培训", "进度", "计划", "验收", "标准", "安全", "网络", "存储", "备份", "监控"]
+
+
+def _document(seed: int, length: int = 600) -> str:
+    rng = random.Random(seed)
+    return "".join(rng.choice(_VOCAB) for _ in range(length))
+
+
+def _mutate(text: str, ratio: float, seed: int) -> str:
+    rng = random.Random(seed)
+    chars = list(text)
+    for i in rng.sample(range(len(chars)), int(len(chars) * ratio)):
+        chars[i] = "改"
+    return "".join(chars)
+
+
+def _chunks(text: str, size: int = 1000):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_signature_estimates_jaccard():
+    """
+    测试签名确定且估算值接近真实 Jaccard
+    """
+    hasher = MinHasher(num_perm=256, shingle_size=5)
+    a = _document(1)
+    b = _mutate(a, 0.02, seed=2)
+    assert np.array_equal(hasher.signature(a), MinHasher(256, 5).signature(a))
+    assert estimate_similarity(hasher.signature(a), hasher.signature(a + "，。 ")) == 1.0
+
+    shingles_a, shingles_b = set(hasher.shingles(a)), set(hasher.shingles(b))
+    exact = len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+    assert abs(estimate_similarity(hasher.signature(a), hasher.signature(b)) - exact) < 0.1
+
+
+def test_similar_pairs_within_project():
+    """
+    测试只返回同一项目内超过阈值的文件对，并附带投标人
+    """
+    service = BidSimilarityService(num_perm=128, bands=16)
+    base = _document(10, 1500)
+    service.add_document("p1", "f1", _chunks(base), bidder="甲公司")
+    service.add_document("p1", "f2", _chunks(_mutate(base, 0.01, seed=11)), bidder="乙公司")
+    service.add_document("p1", "f3", _chunks(_document(12, 1500)), bidder="丙公司")
+    service.add_document("p2", "f4", _chunks(base), bidder="丁公司")
+
+    pairs = service.similar_pairs("p1", threshold=0.8)
+    assert [(p["file_a"], p["file_b"]) for p in pairs] == [("f1", "f2")]
+    assert {pairs[0]["bidder_a"], pairs[0]["bidder_b"]} == {"甲公司", "乙公司"}
+    assert pairs[0]["similarity"] >= 0.8
+    assert pairs[0]["matched_chunks"] >= 1
+    assert service.similar_pairs("missing") == []
+
+    service.remove_document("p1", "f2")
+    assert service.similar_pairs("p1", threshold=0.8) == []
+    assert service.document_count("p1") == 2
+
+
+def test_partial_copy_found_by_chunks():
+    """
+    测试整体相似度不高、但有章节雷同的文件通过分块索引被发现
+    """
+    service = BidSimilarityService(num_perm=128, bands=16)
+    shared = _document(20)[:1000]
+    service.add_document("p1", "f1", _chunks(_document(21, 1500)[:2000] + shared), bidder="甲公司")
+    service.add_document("p1", "f2", _chunks(_document(22, 1500)[:2000] + shared), bidder="乙公司")
+
+    pairs = service.similar_pairs("p1", threshold=0.85)
+    assert len(pairs) == 1
+    assert pairs[0]["document_similarity"] < 0.85
+    assert pairs[0]["max_chunk_similarity"] >= 0.85
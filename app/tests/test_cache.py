@@ -0,0 +1,148 @@
+"""
+分层缓存的单元测试（远端使用本地替身服务器）
+"""
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.config import settings
+from app.services.cache import CacheManager, CacheNamespace, LocalLRU, RemoteCache, RespClient
+from app.services.cache_server import LocalCacheServer
+from app.services.document_service import DocumentService
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = LocalCacheServer(port=0)
+    server.start_in_thread()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _manager(server, mode: str) -> CacheManager:
+    with patch.object(settings, "CACHE_MODE", mode), \
+            patch.object(settings, "CACHE_REMOTE_URL", server.url):
+        manager = CacheManager()
+        manager._get_remote()
+    return manager
+
+
+def _namespace(manager: CacheManager, mode: str, **kwargs) -> CacheNamespace:
+    with patch.object(settings, "CACHE_MODE", mode):
+        return manager.namespace("test", ttl=kwargs.pop("ttl", 60), max_entries=100, **kwargs)
+
+
+def test_local_lru_evicts_least_recently_used_and_expires():
+    lru = LocalLRU(max_entries=2)
+    lru.set("a", 1, ttl=60)
+    lru.set("b", 2, ttl=60)
+    assert lru.get("a") == 1
+    lru.set("c", 3, ttl=60)
+    assert lru.get("b") is None and lru.get("a") == 1 and lru.evictions == 1
+
+    lru.set("d", 4, ttl=0.01)
+    time.sleep(0.02)
+    assert lru.get("d") is None
+
+
+def test_resp_client_against_stand_in_server(server):
+    client = RespClient(server.url, timeout=1.0, pool_size=2)
+    assert client.execute(("SET", "k", "值", "PX", 60000), ("MGET", "k", "missing")) == ["OK", [b"\xe5\x80\xbc", None]]
+    assert client.execute(("DEL", "k", "missing"), ("EXISTS", "k")) == [1, 0]
+    client.close()
+
+
+def test_remote_namespaces_share_entries_across_nodes(server):
+    """
+    测试两个节点（各自的缓存管理器）通过远端共享条目，有效期由远端控制
+    """
+    node_a = _namespace(_manager(server, "remote"), "remote")
+    node_b = _namespace(_manager(server, "remote"), "remote")
+
+    node_a.set("问题", {"answer": [1, 2]})
+    assert node_b.get("问题") == {"answer": [1, 2]}
+    assert node_b.get_many(["问题", "不存在"]) == [{"answer": [1, 2]}, None]
+
+    node_a.set("短期", "x", ttl=0.01)
+    time.sleep(0.05)
+    assert node_b.get("短期") is None
+
+    long_key = "长" * 500
+    node_a.set(long_key, 1)
+    assert node_b.get(long_key) == 1
+    assert node_b.stats()["far_hits"] == 3 and node_b.stats()["misses"] == 2
+
+
+def test_tiered_near_cache_is_bounded_by_near_ttl(server):
+    """
+    测试 tiered 模式下远端命中回填近端，近端副本在 CACHE_NEAR_TTL 后重新读取远端
+    """
+    with patch.object(settings, "CACHE_NEAR_TTL", 0.05):
+        node_a = _namespace(_manager(server, "tiered"), "tiered")
+        node_b = _namespace(_manager(server, "tiered"), "tiered")
+
+    node_a.set("owner", "user-1")
+    assert node_b.get("owner") == "user-1"
+    assert node_b.get("owner") == "user-1"
+    assert (node_b.stats()["far_hits"], node_b.stats()["near_hits"]) == (1, 1)
+
+    node_a.delete("owner")
+    assert node_b.get("owner") == "user-1"  # 近端副本尚未过期
+    time.sleep(0.06)
+    assert node_b.get("owner") is None
+
+
+def test_namespace_without_near_tier_sees_updates_immediately(server):
+    manager = _manager(server, "tiered")
+    node_a = _namespace(manager, "tiered", near=False)
+    node_b = _namespace(_manager(server, "tiered"), "tiered", near=False)
+    assert node_a.mode == "remote"
+
+    node_a.set("version", "v1")
+    assert node_b.get("version") == "v1"
+    node_a.set("version", "v2")
+    assert node_b.get("version") == "v2"
+
+
+def test_unavailable_remote_is_treated_as_miss():
+    remote = RemoteCache("redis://127.0.0.1:1/0", timeout=0.05, pool_size=1, retry_interval=60)
+    namespace = CacheNamespace("test", ttl=60, max_entries=10, mode="tiered", remote=remote)
+
+    namespace.set("k", "v")
+    assert namespace.get("k") == "v"  # 近端仍可用
+    assert namespace.get("other") is None
+    assert not remote.available and remote.errors == 1
+    assert namespace.stats()["far_errors"] == 2  # 写入失败 + 熔断期间跳过的读取
+
+
+@pytest.mark.asyncio
+async def test_async_interface_with_custom_codec(server):
+    encode = lambda values: ",".join(map(str, values)).encode()
+    decode = lambda data: [int(v) for v in data.decode().split(",")]
+    node_a = _namespace(_manager(server, "tiered"), "tiered", encode=encode, decode=decode)
+    node_b = _namespace(_manager(server, "tiered"), "tiered", encode=encode, decode=decode)
+
+    await node_a.aset_many({"a": [1, 2], "b": [3], "none": None})
+    assert await node_b.aget_many(["a", "b", "none"]) == [[1, 2], [3], None]
+    await node_a.adelete("a")
+    assert await node_a.aget("a") is None
+
+
+@pytest.mark.asyncio
+async def test_document_version_requires_shared_backend_with_multiple_workers(server):
+    """
+    测试 local 模式下多进程部署时不提供文档版本（调用方不缓存检索结果），共享缓存时各节点看到同一版本
+    """
+    service = DocumentService()
+    with patch.object(settings, "WEB_WORKERS", 2):
+        assert await service.document_version("user-1") is None
+
+        node_a, node_b = DocumentService(), DocumentService()
+        for node in (node_a, node_b):
+            node._document_versions = _namespace(_manager(server, "tiered"), "tiered", near=False)
+        await node_a._bump_document_version("user-1")
+        version = await node_b.document_version("user-1")
+        assert version not in (None, "0") and version == await node_a.document_version("user-1")
+
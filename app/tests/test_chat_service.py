@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
 import pytest
 from unittest.mock import patch, AsyncMock
 from app.services.chat_service import ChatService
@@ -69,3 +70,117 @@ async def test_generate_response_error():
         
         assert "生成回复失败" in str(exc_info.value)
         assert "API调用失败" in str(exc_info.value)
+
+def _intent_result(core_intent):
+    from app.services.intentService import IntentResult
+    return IntentResult(core_intent=core_intent, aux_intents=[], confidence_score=0.9, risk_level="low")
+
+async def _run_speculative(core_intent):
+    """意图识别耗时 50ms 的情况下执行一次生成，返回 (回复, 服务, 模型调用次数)"""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from app.config import settings
+
+    service = ChatService()
+    models = []
+
+    def get_model(route=None):
+        model = FakeListChatModel(responses=[f"回复{len(models) + 1}"], sleep=0.02)
+        models.append(model)
+        return model
+
+    async def classify(text, files=None, deadline=None):
+        await asyncio.sleep(0.05)
+        return _intent_result(core_intent)
+
+    with patch.object(settings, "SPECULATIVE_GENERATION_ENABLED", True), \
+            patch.object(settings, "USE_INTENT_DETECTION", True), \
+            patch.object(settings, "USE_WEB_SEARCH", False), \
+            patch.object(settings, "RESPONSE_CACHE_ENABLED", False), \
+            patch.object(service, "_get_model", side_effect=get_model), \
+            patch("app.services.chat_service.intent_service.classify_intent", side_effect=classify):
+        response = await service.generate_response("你好", [{"content": "在吗", "is_user": True}])
+    return response, service, len(models)
+
+@pytest.mark.asyncio
+async def test_speculative_generation_hit():
+    """测试识别为通用闲聊时沿用推测生成的结果"""
+    response, service, model_count = await _run_speculative("通用闲聊")
+
+    assert response == "回复1"
+    # 推测生成与确认意图后各创建一次模型，但只有推测生成发出请求
+    assert model_count == 2
+    assert service.speculation_stats()["hit_rate"] == 1.0
+    assert service.speculation_stats()["wasted_tokens"] == 0
+
+@pytest.mark.asyncio
+async def test_speculative_generation_miss():
+    """测试识别为其他意图时取消推测生成并按意图重新生成"""
+    response, service, model_count = await _run_speculative("采购流程咨询")
+
+    assert response == "回复2"
+    stats = service.speculation_stats()
+    assert stats["started"] == 1
+    assert stats["hits"] == 0
+    assert stats["wasted_tokens"] > 0
+
+async def _run_with_response_cache(deadline):
+    """启用语义回复缓存执行一次生成，返回模拟的回复缓存"""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from app.config import settings
+
+    service = ChatService()
+    with patch.object(settings, "SPECULATIVE_GENERATION_ENABLED", False), \
+            patch.object(settings, "USE_INTENT_DETECTION", False), \
+            patch.object(settings, "USE_WEB_SEARCH", False), \
+            patch.object(settings, "RESPONSE_CACHE_ENABLED", True), \
+            patch.object(service, "_get_model", return_value=FakeListChatModel(responses=["回复"])), \
+            patch.object(service, "_embed_query", AsyncMock(return_value=[0.1, 0.2])), \
+            patch("app.services.chat_service.response_cache") as cache:
+        cache.lookup.return_value = None
+        assert await service.generate_response("投标保证金比例是多少？", [], deadline=deadline) == "回复"
+    return cache
+
+@pytest.mark.asyncio
+async def test_degraded_response_is_not_cached():
+    """测试有阶段被跳过（如检索超时）时回复不写入语义缓存"""
+    from app.utils.deadline import Deadline
+
+    cache = await _run_with_response_cache(Deadline(30))
+    cache.store.assert_called_once()
+
+    deadline = Deadline(30)
+    deadline.skip("retrieval")
+    cache = await _run_with_response_cache(deadline)
+    cache.store.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_generation_retries_are_counted_under_routed_provider():
+    """测试回复生成重试按路由实际使用的提供商计数"""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from app.config import settings
+    from app.services.metrics import RETRIES
+    from app.services.model_router import ResolvedRoute
+
+    service = ChatService()
+    route = ResolvedRoute(name="CHAT_GENERAL", provider="openai", model="gpt-4o-mini", max_tokens=512, temperature=0.7)
+    before = (RETRIES.value("openai", "generation"), RETRIES.value("deepseek", "generation"))
+    with patch.object(settings, "MODEL_PROVIDER", "deepseek"), \
+            patch.object(settings, "SPECULATIVE_GENERATION_ENABLED", False), \
+            patch.object(settings, "USE_INTENT_DETECTION", False), \
+            patch.object(settings, "USE_WEB_SEARCH", False), \
+            patch.object(settings, "RESPONSE_CACHE_ENABLED", False), \
+            patch("app.services.chat_service.model_router.resolve", return_value=route), \
+            patch.object(service, "_get_model", side_effect=[
+                FakeListChatModel(responses=["  "]), FakeListChatModel(responses=["回复"])
+            ]):
+        assert await service.generate_response("你好", []) == "回复"
+
+    assert RETRIES.value("openai", "generation") == before[0] + 1
+    assert RETRIES.value("deepseek", "generation") == before[1]
+
+@pytest.mark.asyncio
+async def test_retrieval_timeout_without_deadline():
+    """测试未设时间预算时检索内部抛出的超时按检索失败处理，返回空列表"""
+    service = ChatService()
+    with patch.object(service, "_match_documents", AsyncMock(side_effect=asyncio.TimeoutError())):
+        assert await service._get_relevant_docs("投标保证金", "user_1") == []
@@ -0,0 +1,57 @@
+"""
+请求截止时间与降级的单元测试
+"""
+import asyncio
+import pytest
+from unittest.mock import patch
+
+from app.utils.deadline import Deadline
+from app.services.intentService import intent_service
+from app.services.chat_service import ChatService
+
+
+def test_stage_budget_respects_reserve():
+    """
+    测试可选阶段的超时受阶段上限与预留时间约束，不足时记录跳过
+    """
+    deadline = Deadline(10.0)
+    assert deadline.stage_budget("intent_detection", 3.0, reserve=2.0) == 3.0
+    assert 4.0 < deadline.stage_budget("retrieval", 6.0, reserve=5.0) <= 5.0
+    assert deadline.stage_budget("retrieval", 6.0, reserve=9.8) is None
+    assert deadline.skipped_stages == ["retrieval"]
+
+
+@pytest.mark.asyncio
+async def test_intent_detection_skipped_on_low_budget():
+    """
+    测试剩余时间不足时跳过意图识别并返回 None
+    """
+    deadline = Deadline(1.0)
+    with patch.object(intent_service, "_classify_intent") as mock_classify:
+        result = await intent_service.classify_intent("投标保证金比例", deadline=deadline)
+
+    assert result is None
+    mock_classify.assert_not_called()
+    assert deadline.skipped_stages == ["intent_detection"]
+
+
+@pytest.mark.asyncio
+async def test_retrieval_timeout_records_skip():
+    """
+    测试文档检索超时后返回空列表并记录跳过
+    """
+    service = ChatService()
+
+    async def slow_match(query, user_id):
+        await asyncio.sleep(1)
+        return [{"content": "片段"}]
+
+    deadline = Deadline(5.0)
+    with patch("app.services.chat_service.settings") as mock_settings, \
+            patch.object(service, "_match_documents", side_effect=slow_match):
+        mock_settings.RETRIEVAL_STAGE_TIMEOUT = 0.6
+        mock_settings.GENERATION_RESERVE_SECONDS = 0.0
+        docs = await service._get_relevant_docs("投标保证金", "user-1", deadline)
+
+    assert docs == []
+    assert deadline.skipped_stages == ["retrieval"]
@@ -0,0 +1,52 @@
+"""
+向量嵌入微批服务的单元测试
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.services.embedding_service import EmbeddingService
+
+
+def _fake_client():
+    client = MagicMock()
+    client.aembed_documents = AsyncMock(side_effect=lambda texts: [[float(len(t))] for t in texts])
+    return client
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_are_batched():
+    """
+    测试时间窗口内的并发请求合并为一次批量调用，相同文本只发送一次
+    """
+    service = EmbeddingService(max_wait_ms=5, max_batch_size=64)
+    client = _fake_client()
+    service._clients["m"] = client
+
+    results = await asyncio.gather(
+        service.embed_query("招标", "m"),
+        service.embed_query("投标保证金", "m"),
+        service.embed_query("招标", "m")
+    )
+
+    assert results == [[2.0], [5.0], [2.0]]
+    client.aembed_documents.assert_awaited_once_with(["招标", "投标保证金"])
+    assert service.stats()["batches"] == 1
+    assert service.stats()["max_batch_size"] == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_size_limit_and_errors():
+    """
+    测试达到批大小上限立即发送，失败时异常分发给所有调用方
+    """
+    service = EmbeddingService(max_wait_ms=1000, max_batch_size=2)
+    client = _fake_client()
+    service._clients["m"] = client
+
+    results = await asyncio.wait_for(service.embed_documents(["a", "bb"], "m"), timeout=0.5)
+    assert results == [[1.0], [2.0]]
+
+    client.aembed_documents = AsyncMock(side_effect=Exception("限流"))
+    with pytest.raises(Exception, match="限流"):
+        await asyncio.wait_for(service.embed_documents(["a", "b"], "m"), timeout=0.5)
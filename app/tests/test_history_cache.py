@@ -0,0 +1,88 @@
+"""
+对话历史缓存的单元测试
+"""
+import pytest
+from unittest.mock import MagicMock, patch
+from langchain_core.messages import HumanMessage, AIMessage
+
+from app.services.history_cache import ConversationHistoryCache
+
+
+@pytest.fixture
+def mock_supabase_service():
+    """
+    创建模拟的 Supabase 服务
+    """
+    mock_service = MagicMock()
+    with patch('app.services.history_cache.supabase_service', mock_service):
+        yield mock_service
+
+
+@pytest.mark.asyncio
+async def test_get_history_incremental(mock_supabase_service):
+    """
+    测试首次全量加载、后续仅增量追加新消息
+    """
+    mock_supabase_service.get_conversation_messages.return_value = [
+        {"id": "m1", "content": "你好", "is_user": True, "created_at": "2024-01-01T00:00:00+00:00"},
+        {"id": "m2", "content": "你好，有什么可以帮你？", "is_user": False, "created_at": "2024-01-01T00:00:01+00:00"},
+    ]
+    cache = ConversationHistoryCache(max_bytes=1024 * 1024)
+
+    history = await cache.get_history("conv_1", "user_1")
+    assert history == [HumanMessage(content="你好"), AIMessage(content="你好，有什么可以帮你？")]
+
+    # 键集查询包含边界时间戳的消息，应按 id 去重
+    mock_supabase_service.get_messages_since.return_value = [
+        {"id": "m2", "content": "你好，有什么可以帮你？", "is_user": False, "created_at": "2024-01-01T00:00:01+00:00"},
+        {"id": "m3", "content": "投标保证金比例是多少？", "is_user": True, "created_at": "2024-01-01T00:00:02+00:00"},
+    ]
+    history = await cache.get_history("conv_1", "user_1")
+
+    assert len(history) == 3
+    assert history[-1] == HumanMessage(content="投标保证金比例是多少？")
+    assert mock_supabase_service.get_conversation_messages.call_count == 1
+    mock_supabase_service.get_messages_since.assert_called_once_with(
+        "conv_1", "2024-01-01T00:00:01+00:00", "user_1"
+    )
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_by_bytes(mock_supabase_service):
+    """
+    测试超过字节上限时淘汰最久未使用的对话
+    """
+    mock_supabase_service.get_conversation_messages.return_value = [
+        {"id": "m1", "content": "x" * 100, "is_user": True, "created_at": "2024-01-01T00:00:00+00:00"},
+    ]
+    cache = ConversationHistoryCache(max_bytes=400)
+
+    await cache.get_history("conv_1")
+    await cache.get_history("conv_2")
+    await cache.get_history("conv_3")
+
+    assert len(cache) == 2
+    assert cache.total_bytes <= 400
+    assert "conv_1" not in cache._entries
+
+
+@pytest.mark.asyncio
+async def test_history_is_not_cached_with_multiple_workers(mock_supabase_service):
+    """
+    测试多进程部署时每轮全量读取，本进程写入的消息不会推进游标
+    """
+    mock_supabase_service.get_conversation_messages.return_value = [
+        {"id": "m1", "content": "你好", "is_user": True, "created_at": "2024-01-01T00:00:00+00:00"},
+    ]
+    cache = ConversationHistoryCache(max_bytes=1024 * 1024)
+
+    with patch('app.services.history_cache.settings.WEB_WORKERS', 2):
+        assert await cache.get_history("conv_1") == [HumanMessage(content="你好")]
+        cache.append("conv_1", [
+            {"id": "m3", "content": "本进程的回复", "is_user": False, "created_at": "2024-01-01T00:00:02+00:00"},
+        ])
+        await cache.get_history("conv_1")
+
+    assert len(cache) == 0
+    assert mock_supabase_service.get_conversation_messages.call_count == 2
+    mock_supabase_service.get_messages_since.assert_not_called()
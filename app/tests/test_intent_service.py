@@ -0,0 +1,124 @@
+"""
+意图识别服务的单元测试（批量识别与结果缓存）
+"""
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.config import settings
+from app.services.api_scheduler import estimate_tokens
+from app.services.intentService import IntentService, CoreIntentType, AuxIntentType
+
+
+def _completion(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def service():
+    service = IntentService()
+    service.domain_terms = {"risk_keywords": ["围标", "串标"]}
+    return service
+
+
+def test_batch_features_match_single_rules(service):
+    """
+    测试向量化特征与单条识别的规则一致
+    """
+    texts = ["请对比三家供应商并推荐", "虽然报价最低，但是资质不全，疑似围标串标", "政府采购法第二十二条", "你好"]
+    features = service._extract_batch_features(texts)
+
+    for i, text in enumerate(texts):
+        assert features.at[i, "risk_bonus"] == pytest.approx(service._get_risk_bonus(text))
+        assert features.at[i, AuxIntentType.UNCERTAINTY_DECLARE.value] == (service._calculate_conflict(text) > 0.3)
+    assert features["law_ref"].tolist() == [False, False, True, False]
+    assert features[AuxIntentType.ENHANCED_SEARCH.value].tolist() == [True, False, False, False]
+
+
+def test_pack_texts_respects_limits(service):
+    texts = [(i, "采购" * 10) for i in range(10)]
+    with patch.object(settings, "INTENT_BATCH_MAX_TOKENS", 100000), \
+            patch.object(settings, "INTENT_BATCH_MAX_ITEMS", 3):
+        assert [len(p) for p in service._pack_texts(texts)] == [3, 3, 3, 1]
+
+    # 每条约 20 + 42 token，上限只够放下系统提示词加两条
+    limit = estimate_tokens(service.batch_system_prompt) + 130
+    with patch.object(settings, "INTENT_BATCH_MAX_TOKENS", limit):
+        packs = service._pack_texts(texts)
+    assert [len(p) for p in packs] == [2, 2, 2, 2, 2]
+    assert [i for p in packs for i, _ in p] == list(range(10))
+
+
+@pytest.mark.asyncio
+async def test_classify_batch_packs_and_caches(service):
+    """
+    测试批量识别去重打包为一次调用、结果写入缓存、单条识别直接命中缓存
+    """
+    calls = []
+
+    async def chat_completion(messages, temperature, max_tokens, priority=None):
+        lines = [json.loads(line) for line in messages[1]["content"].splitlines()]
+        calls.append(lines)
+        intents = {"你好": "通用闲聊", "招标公告怎么发布": "采购流程咨询", "发现疑似围标": "采购流程咨询"}
+        return _completion(json.dumps(
+            [{"i": line["i"], "core_intent": intents[line["text"]], "risk_level": "low"} for line in lines],
+            ensure_ascii=False
+        ))
+
+    texts = ["你好", "招标公告怎么发布", "你好", "发现疑似围标"]
+    with patch.object(service, "_chat_completion", side_effect=chat_completion), \
+            patch.object(settings, "PROCUREMENT_RISK_MODE", "LOCAL"):
+        results = await service.classify_batch(texts)
+        assert len(calls) == 1 and len(calls[0]) == 3
+
+        assert [r.core_intent for r in results] == [
+            CoreIntentType.CHAT_GENERAL.value,
+            CoreIntentType.PROCUREMENT_CONSULT.value,
+            CoreIntentType.CHAT_GENERAL.value,
+            CoreIntentType.RISK_ALERT.value,
+        ]
+        assert results[3].confidence_score == 1.0
+
+        # 再次批量识别与单条识别均命中缓存
+        assert await service.classify_batch(["你好"]) == [results[0]]
+        assert await service.classify_intent("招标公告怎么发布") == results[1]
+        assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_missing_batch_output_is_not_cached(service):
+    async def chat_completion(messages, temperature, max_tokens, priority=None):
+        return _completion("无法识别")
+
+    with patch.object(service, "_chat_completion", side_effect=chat_completion):
+        results = await service.classify_batch(["需要什么资质"])
+    assert results[0].core_intent == CoreIntentType.PROCUREMENT_CONSULT.value
+    assert await service._get_cached_intent("需要什么资质") is None
+
+
+@pytest.mark.asyncio
+async def test_degraded_classification_is_not_cached(service):
+    """
+    测试模型调用异常时退回的默认意图与风险等级不写入缓存，各步骤成功后才缓存
+    """
+    failing = True
+
+    async def chat_completion(messages, temperature, max_tokens, priority=None):
+        if failing and "风险等级" in messages[0]["content"]:
+            raise RuntimeError("rate limited")
+        return _completion("procurement" if max_tokens == 10 else CoreIntentType.SUPPLIER_REVIEW.value)
+
+    with patch.object(settings, "PROCUREMENT_RISK_MODE", "LLM"), \
+            patch.object(service, "_chat_completion", side_effect=chat_completion), \
+            patch.object(service, "_get_embeddings", return_value=[]), \
+            patch.object(service, "_check_policy_updates", return_value=False):
+        result = await service.classify_intent("供应商需要哪些资质")
+        assert result.risk_level == "high"
+        assert await service._get_cached_intent("供应商需要哪些资质") is None
+
+        failing = False
+        result = await service.classify_intent("供应商需要哪些资质")
+    assert result.risk_level == "low"
+    assert await service._get_cached_intent("供应商需要哪些资质") == result
@@ -8,7 +8,10 @@ import uvicorn
 import asyncio
 import threading
 import time
-from app.main import app
+import json
+from unittest.mock import patch
+from app.config import settings
+from app.main import _progress_event_stream, app
 
 client = TestClient(app)
 
@@ -110,3 +113,114 @@ async def test_chat_with_background_tasks():
         # 测试完成后停止服务器
         # 注意：在实际生产环境中应该优雅地关闭服务器
         pass  # 由于是daemon线程，主线程结束后会自动终止
+
+def test_get_chat_history_paginated():
+    """
+    测试对话历史键集分页
+    """
+    page = [
+        {"id": "m1", "content": "你好", "is_user": True, "created_at": "2024-01-01T00:00:00+00:00"},
+        {"id": "m2", "content": "你好！", "is_user": False, "created_at": "2024-01-01T00:00:01+00:00"}
+    ]
+    with patch('app.main.supabase_service') as mock_service:
+        mock_service.get_messages_page.return_value = page
+        response = client.get("/api/chat/conv_123/history?limit=2")
+
+    assert response.status_code == 200
+    assert response.json()["messages"] == page
+    assert response.json()["next_cursor"] == {
+        "after_created_at": "2024-01-01T00:00:01+00:00",
+        "after_id": "m2"
+    }
+    mock_service.get_messages_page.assert_called_once_with("conv_123", 2, None, None)
+
+def test_get_chat_history_rejects_invalid_cursor():
+    """
+    测试分页游标格式无效或只提供 after_id 时返回 400，有效游标规范化后传给数据库查询
+    """
+    message_id = "6f1c0a52-8d0e-4c5b-9a51-0d2f3c1b7e44"
+    with patch('app.main.supabase_service') as mock_service:
+        mock_service.get_messages_page.return_value = []
+        for query in (
+            f"after_id={message_id}",
+            f"after_created_at=yesterday&after_id={message_id}",
+            "after_created_at=2024-01-01T00:00:01Z&after_id=m2),id.gt.0",
+        ):
+            assert client.get(f"/api/chat/conv_123/history?limit=2&{query}").status_code == 400
+        mock_service.get_messages_page.assert_not_called()
+
+        response = client.get(f"/api/chat/conv_123/history?limit=2&after_created_at=2024-01-01T00:00:01Z&after_id={message_id}")
+    assert response.status_code == 200
+    mock_service.get_messages_page.assert_called_once_with(
+        "conv_123", 2, "2024-01-01T00:00:01+00:00", message_id
+    )
+
+def test_get_chat_history_ndjson_export():
+    """
+    测试对话历史 NDJSON 流式导出
+    """
+    page = [{"id": "m1", "content": "你好", "is_user": True, "created_at": "2024-01-01T00:00:00+00:00"}]
+    with patch('app.main.supabase_service') as mock_service:
+        mock_service.get_messages_page.return_value = page
+        response = client.get("/api/chat/conv_123/history?format=ndjson")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in response.text.splitlines()] == page
+
+def test_bid_risk_analysis_csv():
+    """
+    测试以 CSV 提交投标表进行批量风险分析
+    """
+    csv_content = "投标人,报价,保证金开户行\n甲,100,某农商行\n乙,101,某农商行\n丙,99,某银行\n"
+    response = client.post("/api/risk/bid-analysis", content=csv_content.encode("utf-8"),
+                           headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["bidder_count"] == 3
+    assert {f["bidder"] for f in data["flags"] if f["rule"] == "deposit_bank_concentration"} == {"甲", "乙"}
+
+    response = client.post("/api/risk/bid-analysis", json={"bidders": [{"报价": 1}]})
+    assert response.status_code == 400
+
+    response = client.post("/api/risk/bid-analysis", json=[{"投标人": "甲", "报价": 100}])
+    assert response.status_code == 400
+
+def test_evaluate_bid_rejects_non_object_body():
+    """
+    测试长投标文件评估的请求体不是 JSON 对象时返回 400
+    """
+    assert client.post("/api/evaluations/bid", json=["file_1", "user_1"]).status_code == 400
+    assert client.post("/api/evaluations/bid", json="file_1").status_code == 400
+
+@pytest.mark.asyncio
+async def test_progress_stream_polls_database_with_multiple_workers():
+    """
+    测试多进程部署时，文件由其他工作进程处理（本进程无进度事件）也能通过轮询推送进度与终态
+    """
+    snapshots = iter([
+        {"status": "processing", "progress": 10, "error": None, "processed_at": None},
+        {"status": "processing", "progress": 10, "error": None, "processed_at": None},
+        {"status": "processing", "progress": 60, "error": None, "processed_at": None},
+        {"status": "completed", "progress": 100, "error": None, "processed_at": "2024-01-01"},
+    ])
+    with patch.object(settings, "WEB_WORKERS", 2), \
+            patch.object(settings, "PROGRESS_POLL_INTERVAL", 0.01), \
+            patch("app.main._fetch_file_status", side_effect=lambda file_id: next(snapshots)):
+        chunks = [chunk async for chunk in _progress_event_stream("file:remote_file", "remote_file")]
+
+    events = [json.loads(chunk[len(b"data: "):]) for chunk in chunks if chunk.startswith(b"data: ")]
+    assert [(e["status"], e["progress"]) for e in events] == [
+        ("processing", 10), ("processing", 60), ("completed", 100)
+    ]
+
+def test_process_local_endpoints_unavailable_with_multiple_workers():
+    """
+    测试多进程部署时，状态只在单个进程内的批量任务、相似度索引与设置更新接口返回 503
+    """
+    with patch.object(settings, "WEB_WORKERS", 2):
+        assert client.post("/api/settings", json={"useWebSearch": True}).status_code == 503
+        assert client.post("/api/batch/chat", json={"user_id": "u1", "items": ["问题"]}).status_code == 503
+        assert client.get("/api/batch/chat/job_1?user_id=u1").status_code == 503
+        assert client.get("/api/projects/p1/similar-bids").status_code == 503
+
@@ -0,0 +1,49 @@
+"""
+消息写后队列的单元测试
+"""
+import pytest
+from unittest.mock import MagicMock, patch
+
+from app.services.message_writer import MessageWriteBehindQueue
+
+
+@pytest.fixture
+def mock_supabase_service():
+    """
+    创建模拟的 Supabase 服务
+    """
+    mock_service = MagicMock()
+    with patch('app.services.message_writer.supabase_service', mock_service):
+        yield mock_service
+
+
+@pytest.mark.asyncio
+async def test_enqueue_batches_messages(mock_supabase_service):
+    """
+    测试多条消息合并为一次批量插入
+    """
+    writer = MessageWriteBehindQueue(batch_size=10, flush_interval=0.05, max_retries=3)
+    writer.enqueue("conv_1", "你好", True)
+    writer.enqueue("conv_1", "你好！", False)
+    await writer.stop()
+
+    mock_supabase_service.save_messages.assert_called_once()
+    rows = mock_supabase_service.save_messages.call_args[0][0]
+    assert [row["content"] for row in rows] == ["你好", "你好！"]
+    assert all(row["id"] and row["created_at"] for row in rows)
+
+
+@pytest.mark.asyncio
+async def test_flush_retries_on_failure(mock_supabase_service):
+    """
+    测试批量写入失败后重试
+    """
+    mock_supabase_service.save_messages.side_effect = [Exception("网络错误"), []]
+    writer = MessageWriteBehindQueue(batch_size=1, flush_interval=0.01, max_retries=3)
+
+    with patch('app.services.message_writer.asyncio.sleep') as mock_sleep:
+        mock_sleep.return_value = None
+        writer.enqueue("conv_1", "你好", True)
+        await writer.stop()
+
+    assert mock_supabase_service.save_messages.call_count == 2
@@ -0,0 +1,84 @@
+"""
+进程内指标与 Prometheus 文本导出的单元测试
+"""
+import pytest
+
+from app.services.metrics import MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("stage_seconds", "阶段耗时", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "embedding")
+
+    text = registry.render()
+    assert "# TYPE stage_seconds histogram" in text
+    assert 'stage_seconds_bucket{stage="embedding",le="0.1"} 2' in text
+    assert 'stage_seconds_bucket{stage="embedding",le="1.0"} 3' in text
+    assert 'stage_seconds_bucket{stage="embedding",le="+Inf"} 4' in text
+    assert 'stage_seconds_sum{stage="embedding"} 3.65' in text
+    assert 'stage_seconds_count{stage="embedding"} 4' in text
+    assert histogram.count("embedding") == 4
+
+
+def test_histogram_timer_records_on_exception():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("call_seconds", "调用耗时", ["call"])
+    with pytest.raises(ValueError):
+        with histogram.time("core_intent"):
+            raise ValueError("失败")
+    assert histogram.count("core_intent") == 1
+
+
+def test_counters_caches_and_worker_label():
+    registry = MetricsRegistry()
+    retries = registry.counter("retries_total", "重试次数", ["provider", "reason"])
+    retries.inc("openai", "rate_limit")
+    retries.inc("openai", "rate_limit")
+    registry.register_cache(lambda: {
+        "intent": {"mode": "tiered", "hits": 3, "misses": 1, "near_hits": 2, "far_hits": 1, "far_errors": 0, "size": 5},
+        "history": {"hits": 4, "misses": 2, "size": None},
+    })
+    registry.worker = "1"
+
+    lines = registry.render().splitlines()
+    assert 'retries_total{provider="openai",reason="rate_limit",worker="1"} 2' in lines
+    assert 'cache_hits_total{cache="intent",tier="near",worker="1"} 2' in lines
+    assert 'cache_hits_total{cache="intent",tier="far",worker="1"} 1' in lines
+    assert 'cache_hits_total{cache="history",tier="local",worker="1"} 4' in lines
+    assert 'cache_misses_total{cache="history",worker="1"} 2' in lines
+    assert 'cache_entries{cache="intent",worker="1"} 5' in lines
+    assert not any(line.startswith('cache_entries{cache="history"') for line in lines)
+
+
+def test_registered_families_are_read_at_render():
+    registry = MetricsRegistry()
+    counts = {"CHAT_GENERAL": 2}
+    registry.register_family(
+        "route_requests_total", "counter", "路由调用次数", ["route"],
+        lambda: [((name,), count) for name, count in counts.items()]
+    )
+    registry.register_family("idle_total", "counter", "无样本时不导出", [], lambda: [])
+
+    counts["RISK_ALERT:high_risk"] = 1
+    text = registry.render()
+    assert "# TYPE route_requests_total counter" in text
+    assert 'route_requests_total{route="CHAT_GENERAL"} 2' in text
+    assert 'route_requests_total{route="RISK_ALERT:high_risk"} 1' in text
+    assert "idle_total" not in text
+
+
+def test_service_stats_are_exported():
+    from app.services.embedding_service import embedding_service
+    from app.services.metrics import metrics_registry
+    from app.services.model_router import model_router, ResolvedRoute
+
+    embedding_service._record_batch(3)
+    model_router.record_latency(ResolvedRoute("RISK_ALERT:high_risk", "openai", "gpt-4o", 2048, 0.3), 1.5)
+
+    lines = metrics_registry.render().splitlines()
+    assert any(line.startswith('embedding_batches_total{size="4"}') for line in lines)
+    assert any(line.startswith('model_route_requests_total{route="RISK_ALERT:high_risk"}') for line in lines)
+    assert any(line.startswith("model_route_tier_upgrades_total ") for line in lines)
+    assert any(line.startswith('model_route_latency_seconds{route="RISK_ALERT:high_risk",quantile="0.95"}') for line in lines)
@@ -0,0 +1,69 @@
+"""
+模型路由的单元测试
+"""
+from unittest.mock import patch
+
+from app.services.intentService import IntentResult
+from app.services.model_router import ModelRouter
+
+
+def _intent(core_intent: str, risk_level: str = "low") -> IntentResult:
+    return IntentResult(core_intent=core_intent, aux_intents=[], confidence_score=0.9, risk_level=risk_level)
+
+
+def test_route_by_intent():
+    """
+    测试闲聊走轻量档、标书生成走重型档
+    """
+    router = ModelRouter()
+    with patch("app.services.model_router.settings") as mock_settings:
+        mock_settings.MODEL_ROUTING_ENABLED = True
+        mock_settings.MODEL_PROVIDER = "openai"
+        mock_settings.MODEL_NAME = "gpt-4o-mini"
+        mock_settings.ROUTE_OPENAI_LIGHT_MODEL = "gpt-4o-mini"
+        mock_settings.ROUTE_OPENAI_HEAVY_MODEL = "gpt-4o"
+
+        chat = router.resolve(_intent("通用闲聊"))
+        assert (chat.name, chat.model, chat.max_tokens) == ("CHAT_GENERAL", "gpt-4o-mini", 512)
+
+        bid = router.resolve(_intent("项目招标信息生成"))
+        assert (bid.model, bid.max_tokens) == ("gpt-4o", 4096)
+
+        # 高风险升一档，未知意图走默认路由
+        risky = router.resolve(_intent("采购流程咨询", risk_level="high"))
+        assert (risky.name, risky.model, risky.temperature) == ("PROCUREMENT_CONSULT:high_risk", "gpt-4o", 0.3)
+        assert router.resolve(_intent("未知意图")).name == "default"
+        assert router.resolve(None).name == "default"
+
+
+def test_routing_disabled_uses_legacy_model():
+    """
+    测试关闭路由时沿用统一模型配置
+    """
+    router = ModelRouter()
+    with patch("app.services.model_router.settings") as mock_settings:
+        mock_settings.MODEL_ROUTING_ENABLED = False
+        mock_settings.MODEL_PROVIDER = "deepseek"
+
+        route = router.resolve(_intent("项目招标信息生成"))
+        assert (route.name, route.provider, route.model, route.max_tokens) == ("legacy", "deepseek", "deepseek-chat", None)
+
+
+def test_latency_stats():
+    """
+    测试按路由统计延迟
+    """
+    router = ModelRouter()
+    with patch("app.services.model_router.settings") as mock_settings:
+        mock_settings.MODEL_ROUTING_ENABLED = False
+        mock_settings.MODEL_PROVIDER = "deepseek"
+        route = router.resolve(None)
+
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        router.record_latency(route, seconds)
+
+    stats = router.stats()["legacy"]
+    assert stats["count"] == 4
+    assert stats["avg"] == 0.25
+    assert stats["p50"] == 0.3
+    assert stats["p95"] == 0.4
@@ -0,0 +1,44 @@
+"""
+文档处理进度推送的单元测试
+"""
+import asyncio
+import pytest
+
+from app.services.progress_service import ProgressBroker
+
+
+@pytest.mark.asyncio
+async def test_subscribe_receives_latest_and_new_events():
+    """
+    测试文件级订阅先收到当前状态，再收到后续事件
+    """
+    broker = ProgressBroker()
+    broker.publish("file_1", "user_1", {"status": "processing", "progress": 10})
+
+    stream = broker.subscribe("file:file_1")
+    assert (await stream.__anext__())["progress"] == 10
+
+    next_event = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0)
+    broker.publish("file_1", "user_1", {"status": "processing", "progress": 50})
+    assert (await next_event)["progress"] == 50
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_user_subscription_and_heartbeat():
+    """
+    测试用户级订阅与心跳
+    """
+    broker = ProgressBroker()
+    stream = broker.subscribe("user:user_1", heartbeat=0.01)
+
+    assert await stream.__anext__() is None
+
+    next_event = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0)
+    broker.publish("file_2", "user_1", {"status": "completed", "progress": 100})
+    event = await next_event
+    assert event == {"file_id": "file_2", "status": "completed", "progress": 100}
+    await stream.aclose()
+    assert "user:user_1" not in broker._subscribers
@@ -0,0 +1,49 @@
+"""
+语义回复缓存的单元测试
+"""
+from unittest.mock import patch
+
+from app.services.response_cache import SemanticResponseCache
+
+BUCKET = ("prompt_hash", "采购流程咨询", "deepseek", None)
+
+
+def test_lookup_by_similarity():
+    """
+    测试相似问题命中、不相似问题未命中
+    """
+    cache = SemanticResponseCache(max_entries=10, ttl=60, threshold=0.95)
+    cache.store(BUCKET, "投标保证金比例是多少？", [1.0, 0.0, 0.0], "不得超过采购项目预算金额的2%")
+
+    assert cache.lookup(BUCKET, [0.99, 0.05, 0.0]) == "不得超过采购项目预算金额的2%"
+    assert cache.lookup(BUCKET, [0.0, 1.0, 0.0]) is None
+    assert cache.lookup(("other", "采购流程咨询", "openai", None), [1.0, 0.0, 0.0]) is None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 2}
+
+
+def test_ttl_and_lru_eviction():
+    """
+    测试过期淘汰与容量淘汰
+    """
+    cache = SemanticResponseCache(max_entries=2, ttl=60, threshold=0.95)
+    cache.store(BUCKET, "问题1", [1.0, 0.0], "回复1")
+    cache.store(BUCKET, "问题2", [0.0, 1.0], "回复2")
+    cache.store(BUCKET, "问题3", [0.7, 0.7], "回复3")
+
+    assert len(cache) == 2
+    assert cache.lookup(BUCKET, [1.0, 0.0]) is None
+
+    with patch('app.services.response_cache.time.monotonic', return_value=1e12):
+        assert cache.lookup(BUCKET, [0.0, 1.0]) is None
+    assert len(cache) == 0
+
+
+def test_invalidate():
+    """
+    测试设置变更时整体失效
+    """
+    cache = SemanticResponseCache(max_entries=10, ttl=60, threshold=0.95)
+    cache.store(BUCKET, "问题", [1.0, 0.0], "回复")
+    cache.invalidate()
+
+    assert cache.lookup(BUCKET, [1.0, 0.0]) is None
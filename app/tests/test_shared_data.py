@@ -0,0 +1,37 @@
+"""
+多进程部署只读数据的单元测试
+"""
+from unittest.mock import patch
+
+import numpy as np
+
+from app.config import settings
+from app.services.shared_data import prepare_shared_data
+from app.services.statute_store import SNAPSHOT_NAME, StatuteStore
+from app.utils.shared_arrays import StringTable, load_arrays, pack_strings, save_arrays
+
+
+def test_string_table_round_trip(tmp_path):
+    strings = ["第一条", "", "供应商参加政府采购活动", "abc"]
+    save_arrays(str(tmp_path), pack_strings(strings, "texts"), {"count": len(strings)})
+    arrays, meta = load_arrays(str(tmp_path))
+
+    table = StringTable(arrays, "texts")
+    assert isinstance(arrays["texts_blob"], np.memmap)
+    assert [table[i] for i in range(len(table))] == strings
+    assert meta == {"count": 4}
+    assert load_arrays(str(tmp_path / "missing")) is None
+
+
+def test_workers_map_snapshot_prepared_before_fork(tmp_path):
+    """
+    测试主进程准备快照后，默认构造的法规库从共享目录映射
+    """
+    with patch.object(settings, "SHARED_DATA_DIR", ""):
+        prepare_shared_data(str(tmp_path))
+        assert settings.SHARED_DATA_DIR == str(tmp_path)
+        assert (tmp_path / SNAPSHOT_NAME / "manifest.json").exists()
+
+        store = StatuteStore()
+        assert isinstance(store._keys, np.memmap)
+        assert store.lookup("政府采购法", 22).label == "第二十二条"
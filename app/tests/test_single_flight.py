@@ -0,0 +1,65 @@
+"""
+请求合并工具的单元测试
+"""
+import asyncio
+import pytest
+
+from app.utils.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    """
+    测试相同 key 的并发调用只执行一次
+    """
+    flight = SingleFlight("测试")
+    executions = 0
+
+    async def work():
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0.01)
+        return "结果"
+
+    results = await asyncio.gather(*[flight.do("问题", work) for _ in range(5)])
+
+    assert results == ["结果"] * 5
+    assert executions == 1
+    assert flight.stats() == {"calls": 1, "coalesced": 4, "max_coalesced": 4, "inflight": 0}
+
+
+@pytest.mark.asyncio
+async def test_exception_propagates_to_all_waiters():
+    """
+    测试异常传播给所有等待者，且完成后不再合并
+    """
+    flight = SingleFlight("测试")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("调用失败")
+
+    results = await asyncio.gather(*[flight.do("问题", fail) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_leader_cancellation_does_not_cancel_followers():
+    """
+    测试发起者被取消时其他等待者仍能拿到结果
+    """
+    flight = SingleFlight("测试")
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return 42
+
+    leader = asyncio.ensure_future(flight.do("k", work))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(flight.do("k", work))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == 42
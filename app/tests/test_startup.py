@@ -0,0 +1,82 @@
+"""
+启动耗时的单元测试：导入 app.main 不应构造服务或导入重量级依赖
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.utils import lazy
+from app.utils.lazy import LazyService
+
+# 导入 app.main 的耗时上限（秒），原先全部服务在导入时构造约需 3 秒；
+# 耗时受机器负载影响，仅在设置 CHECK_IMPORT_TIME=1 时检查
+IMPORT_TIME_BUDGET = 2.0
+
+# 只应在首次使用相应功能时导入的依赖
+DEFERRED_MODULES = ("pandas", "openai", "langchain_openai", "langchain_community", "supabase")
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+from app.utils.lazy import initialized_services
+print(json.dumps({
+    "elapsed": elapsed,
+    "loaded": [m for m in %r if m in sys.modules],
+    "initialized": len(initialized_services()),
+}))
+""" % (DEFERRED_MODULES,)
+
+
+def _probe() -> dict:
+    root = Path(__file__).resolve().parents[2]
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=root, env=dict(os.environ), capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_is_lazy():
+    probe = _probe()
+    assert probe["loaded"] == []
+    assert probe["initialized"] == 0
+
+
+@pytest.mark.skipif(os.environ.get("CHECK_IMPORT_TIME") != "1", reason="耗时检查需设置 CHECK_IMPORT_TIME=1")
+def test_import_within_time_budget():
+    assert _probe()["elapsed"] < IMPORT_TIME_BUDGET
+
+
+@pytest.fixture
+def isolated_registry():
+    """测试中创建的 LazyService 不留在全局注册表中，避免影响 warm_up / initialized_services"""
+    registered = list(lazy._registry)
+    yield
+    lazy._registry[:] = registered
+
+
+def test_lazy_service_constructs_once_on_first_access(isolated_registry):
+    created = []
+
+    class Service:
+        value = 1
+
+        def __init__(self):
+            created.append(self)
+
+    service = LazyService(Service, "test_service")
+    assert not service.initialized and created == []
+
+    assert service.value == 1
+    service.value = 2
+    assert service.resolve().value == 2
+    del service.value
+    assert service.value == 1
+    assert len(created) == 1
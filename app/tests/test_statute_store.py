@@ -0,0 +1,88 @@
+"""
+本地法规库的单元测试
+"""
+import numpy as np
+import pytest
+
+from app.services.statute_store import StatuteStore, parse_chinese_number, statute_store
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("二", 2), ("十", 10), ("十二", 12), ("二十二", 22), ("一百零五", 105), ("37", 37),
+])
+def test_parse_chinese_number(text, expected):
+    assert parse_chinese_number(text) == expected
+
+
+def test_exact_lookup_by_alias_and_number():
+    """
+    测试按法规别名与各种条号写法精确查询
+    """
+    article = statute_store.lookup("政府采购法", 22)
+    assert article.label == "第二十二条"
+    assert article.text.startswith("供应商参加政府采购活动应当具备下列条件")
+    assert statute_store.lookup("财政部令第87号", "第三十七条") == statute_store.lookup("87号令", "37")
+    assert statute_store.lookup("政府采购法", 999) is None
+    assert statute_store.lookup("不存在的法", 1) is None
+
+
+def test_find_references_attaches_to_preceding_law():
+    """
+    测试条号归属于其前方最近提到的法规，且长名称优先匹配
+    """
+    text = "请对比招标投标法实施条例第四十条与87号令第37条，另外政府采购法第二十二条怎么理解？"
+    refs = statute_store.find_references(text)
+    assert [(a.short_name, a.label) for a in refs] == [
+        ("招标投标法实施条例", "第四十条"),
+        ("87号令", "第三十七条"),
+        ("政府采购法", "第二十二条"),
+    ]
+    assert statute_store.find_references("第二十二条是什么意思") == []
+
+
+def test_find_references_ignores_laws_not_in_store():
+    """
+    测试库中没有的法规（名称以已收录法规名开头）不被误认为已收录的法规
+    """
+    assert statute_store.find_references("政府采购法实施条例第二十六条") == []
+    assert statute_store.find_references("中华人民共和国政府采购法实施条例第二十六条怎么规定的") == []
+    refs = statute_store.find_references("政府采购法实施条例第二十六条与招标投标法实施条例第二十六条有何不同")
+    assert [(a.short_name, a.label) for a in refs] == [("招标投标法实施条例", "第二十六条")]
+
+
+def test_fulltext_search():
+    """
+    测试按条文正文检索
+    """
+    results = statute_store.search("投标保证金从同一单位的账户转出")
+    assert results[0][0].short_name in {"招标投标法实施条例", "87号令"}
+    assert all(score >= 0.3 for _, score in results)
+
+
+def test_load_custom_directory(tmp_path):
+    """
+    测试从指定目录加载法规文件
+    """
+    (tmp_path / "demo.json").write_text(
+        '{"law": "示例法", "short_name": "示例法", "version": "v1", "articles": {"第一条": "示例条文。"}}',
+        encoding="utf-8"
+    )
+    store = StatuteStore(str(tmp_path))
+    assert len(store) == 1
+    assert store.lookup("示例法", 1).format() == "《示例法》第一条（v1）：示例条文。"
+
+
+def test_snapshot_is_memory_mapped(tmp_path):
+    """
+    测试索引快照以 mmap 方式映射后查询结果与直接加载一致
+    """
+    source = StatuteStore()
+    source.save_snapshot(str(tmp_path))
+    mapped = StatuteStore(snapshot_dir=str(tmp_path))
+
+    assert isinstance(mapped._postings, np.memmap)
+    assert len(mapped) == len(source)
+    assert mapped.versions() == source.versions()
+    assert mapped.lookup("87号令", 37) == source.lookup("87号令", 37)
+    query = "投标保证金从同一单位的账户转出"
+    assert mapped.search(query) == source.search(query)
@@ -3,7 +3,7 @@ Supabase 服务模块的单元测试
 """
 import pytest
 from unittest.mock import MagicMock, patch
-from app.services.supabase import SupabaseService
+from app.services.supabase import DOCUMENT_CHUNK_PAGE_SIZE, SupabaseService
 
 @pytest.fixture
 def mock_supabase_client():
@@ -23,20 +23,14 @@ def test_get_conversation_messages_success(mock_supabase_client):
         {"content": "测试消息1", "is_user": True, "created_at": "2024-01-01"},
         {"content": "测试回复1", "is_user": False, "created_at": "2024-01-01"}
     ]
-    test_conversation = {"user_id": "test_user"}
-    
-    # 设置模拟响应
-    messages_response = MagicMock()
-    messages_response.data = test_messages
-    messages_response.error = None
     
+    # 设置模拟响应：一次关联查询同时返回对话所有者和消息
     conversation_response = MagicMock()
-    conversation_response.data = test_conversation
+    conversation_response.data = [{"user_id": "test_user", "messages": test_messages}]
     conversation_response.error = None
     
     # 配置模拟客户端的行为
-    mock_supabase_client.table().select().eq().order().execute.return_value = messages_response
-    mock_supabase_client.table().select().eq().single().execute.return_value = conversation_response
+    mock_supabase_client.table().select().eq().order().execute.return_value = conversation_response
     
     # 执行测试
     service = SupabaseService()
@@ -45,21 +39,39 @@ def test_get_conversation_messages_success(mock_supabase_client):
     # 验证结果
     assert result == test_messages
 
-def test_get_conversation_messages_unauthorized(mock_supabase_client):
+def test_get_conversation_messages_uses_owner_cache(mock_supabase_client):
     """
-    测试无权访问对话的情况
+    测试所有者缓存命中后不再关联查询 conversations 表
     """
-    # 设置模拟响应：消息存在但用户不匹配
+    test_messages = [{"id": "m1", "content": "测试消息1", "is_user": True, "created_at": "2024-01-01"}]
+    
+    conversation_response = MagicMock()
+    conversation_response.data = [{"user_id": "test_user", "messages": test_messages}]
+    mock_supabase_client.table().select().eq().order().execute.return_value = conversation_response
+    
+    service = SupabaseService()
+    service.get_conversation_messages("test_conv_id", "test_user")
+    
+    mock_supabase_client.table.reset_mock()
     messages_response = MagicMock()
-    messages_response.data = []
-    messages_response.error = None
+    messages_response.data = test_messages
+    mock_supabase_client.table().select().eq().order().execute.return_value = messages_response
+    
+    result = service.get_conversation_messages("test_conv_id", "test_user")
     
+    assert result == test_messages
+    mock_supabase_client.table.assert_called_with('messages')
+
+def test_get_conversation_messages_unauthorized(mock_supabase_client):
+    """
+    测试无权访问对话的情况
+    """
+    # 设置模拟响应：对话存在但用户不匹配
     conversation_response = MagicMock()
-    conversation_response.data = {"user_id": "other_user"}  # 不同的用户
+    conversation_response.data = [{"user_id": "other_user", "messages": []}]  # 不同的用户
     conversation_response.error = None
     
-    mock_supabase_client.table().select().eq().order().execute.return_value = messages_response
-    mock_supabase_client.table().select().eq().single().execute.return_value = conversation_response
+    mock_supabase_client.table().select().eq().order().execute.return_value = conversation_response
     
     # 执行测试，应该抛出异常
     service = SupabaseService()
@@ -109,3 +121,29 @@ def test_save_message_error(mock_supabase_client):
     service = SupabaseService()
     with pytest.raises(Exception, match="保存消息失败"):
         service.save_message("test_conv_id", "测试消息", True)
+
+
+def test_get_document_chunks_reads_every_page(mock_supabase_client):
+    """
+    测试文档块超过一页时按页读取直到取完，并按入库时间排序
+    """
+    rows = [{"id": i, "content": f"块{i}"} for i in range(DOCUMENT_CHUNK_PAGE_SIZE * 2 + 7)]
+    requested = []
+
+    def fetch_range(start, end):
+        requested.append((start, end))
+        page = MagicMock()
+        page.execute.return_value.data = rows[start:end + 1]
+        return page
+
+    query = mock_supabase_client.table().select().eq().eq().order().order()
+    query.range.side_effect = fetch_range
+
+    service = SupabaseService()
+    assert service.get_document_chunks("file-1", "user-1") == [row["content"] for row in rows]
+    assert requested == [
+        (0, DOCUMENT_CHUNK_PAGE_SIZE - 1),
+        (DOCUMENT_CHUNK_PAGE_SIZE, DOCUMENT_CHUNK_PAGE_SIZE * 2 - 1),
+        (DOCUMENT_CHUNK_PAGE_SIZE * 2, DOCUMENT_CHUNK_PAGE_SIZE * 3 - 1),
+    ]
+    mock_supabase_client.table().select().eq().eq().order.assert_called_with('created_at')
@@ -0,0 +1,93 @@
+"""
+请求追踪的单元测试：span 层级与属性、跨任务/线程传递、JSONL 导出与 X-Trace-Id 响应头
+"""
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services.tracing import JsonlSpanExporter, TraceMiddleware, current_span, traced, tracer
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer.set_exporter(JsonlSpanExporter(str(path)))
+    yield path
+    tracer.set_exporter(None)
+
+
+def _read_spans(path):
+    tracer.exporter.flush()
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+@traced("db.query")
+def _query(rows: int) -> int:
+    current_span().set_attribute("rows", rows)
+    return rows
+
+
+@pytest.mark.asyncio
+async def test_spans_nest_across_tasks_and_threads(trace_file):
+    with tracer.trace("request") as root:
+        with tracer.span("stage", cache_hit=False) as stage:
+            await asyncio.gather(asyncio.to_thread(_query, 3), asyncio.to_thread(_query, 5))
+            stage.add_event("retry", attempt=2)
+        with pytest.raises(ValueError):
+            with tracer.span("failing"):
+                raise ValueError("失败")
+
+    spans = {(s["name"], s["attributes"].get("rows")): s for s in _read_spans(trace_file)}
+    assert len(spans) == 5 and {s["trace_id"] for s in spans.values()} == {root.trace_id}
+    stage_span = spans[("stage", None)]
+    assert stage_span["parent_id"] == spans[("request", None)]["span_id"]
+    assert stage_span["events"][0]["name"] == "retry"
+    assert spans[("db.query", 3)]["parent_id"] == stage_span["span_id"]
+    assert spans[("db.query", 5)]["parent_id"] == stage_span["span_id"]
+    assert spans[("failing", None)]["status"] == "error"
+    assert spans[("request", None)]["status"] == "ok"
+
+
+def test_spans_outside_a_trace_are_not_recorded(trace_file):
+    with tracer.span("orphan") as span:
+        span.set_attribute("ignored", True)
+    assert _query(1) == 1
+    tracer.exporter.flush()
+    assert not trace_file.exists()
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(TraceMiddleware)
+
+    @app.get("/work")
+    async def work():
+        with tracer.span("work.stage", items=2):
+            pass
+        return {"ok": True}
+
+    return app
+
+
+def test_middleware_returns_trace_id_header(trace_file):
+    client = TestClient(_app())
+
+    response = client.get("/work")
+    trace_id = response.headers["X-Trace-Id"]
+    spans = _read_spans(trace_file)
+    assert [s["name"] for s in spans] == ["work.stage", "http.request"]
+    assert {s["trace_id"] for s in spans} == {trace_id}
+    assert spans[1]["attributes"]["status_code"] == 200
+
+    # 请求中携带的 trace ID 被沿用，格式不合法时重新生成
+    assert client.get("/work", headers={"X-Trace-Id": "client-trace-0001"}).headers["X-Trace-Id"] == "client-trace-0001"
+    assert client.get("/work", headers={"X-Trace-Id": "bad id"}).headers["X-Trace-Id"] != "bad id"
+
+
+def test_trace_id_is_returned_without_exporter():
+    tracer.set_exporter(None)
+    response = TestClient(_app()).get("/work")
+    assert len(response.headers["X-Trace-Id"]) == 32
@@ -0,0 +1,80 @@
+"""
+网络搜索阶段的单元测试
+"""
+import pytest
+
+from app.services.web_search import (
+    LocalSearchBackend,
+    SearchResult,
+    WebSearchService,
+    build_digest,
+    dedupe_results,
+    normalize_query,
+)
+
+GENERAL_DOCS = [
+    {"title": "政府采购法", "snippet": "投标保证金不得超过采购项目预算金额的百分之二。", "link": "https://a.example/1"},
+    {"title": "转载", "snippet": "投标保证金不得超过采购项目预算金额的百分之二！", "link": "https://b.example/2"},
+    {"title": "无关", "snippet": "今日天气晴", "link": "https://c.example/3"},
+]
+PRODUCT_DOCS = [
+    {"title": "投标保证金保险", "snippet": "保函替代现金保证金，降低资金占用。", "link": "https://shop.example/1"},
+]
+
+
+def test_normalize_query():
+    assert normalize_query("  投标保证金？  比例！") == "投标保证金 比例"
+    assert normalize_query("GPU  Server") == "gpu server"
+
+
+def test_dedupe_near_duplicate_snippets():
+    """
+    测试近似重复的摘要只保留一条
+    """
+    results = [
+        SearchResult(d["title"], d["snippet"], d["link"], "GeneralSearch") for d in GENERAL_DOCS
+    ]
+    kept = dedupe_results(results, threshold=0.6)
+    assert [r.url for r in kept] == ["https://a.example/1", "https://c.example/3"]
+
+
+def test_digest_respects_token_budget():
+    results = [SearchResult("标题", "摘" * 100, "", "GeneralSearch") for _ in range(5)]
+    digest = build_digest(results, max_tokens=250)
+    assert digest.count("\n") + 1 == 2
+
+
+@pytest.mark.asyncio
+async def test_search_merges_sources_and_caches():
+    """
+    测试两个来源并发查询、合并去重，且相同规范化查询命中缓存
+    """
+    general = LocalSearchBackend(GENERAL_DOCS)
+    product = LocalSearchBackend(PRODUCT_DOCS)
+    service = WebSearchService({"GeneralSearch": general, "ProductSearch": product}, timeout=1.0, cache_ttl=60)
+
+    results = await service.search("投标保证金")
+    assert [(r.source, r.url) for r in results] == [
+        ("GeneralSearch", "https://a.example/1"),
+        ("ProductSearch", "https://shop.example/1"),
+    ]
+
+    await service.search("投标保证金？")
+    assert (general.calls, product.calls) == (1, 1)
+    assert service.stats()["cache_hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_source_times_out():
+    """
+    测试超时的来源被跳过，不影响其他来源
+    """
+    service = WebSearchService(
+        {"GeneralSearch": LocalSearchBackend(GENERAL_DOCS), "ProductSearch": LocalSearchBackend(PRODUCT_DOCS, delay=1.0)},
+        timeout=0.05
+    )
+    context = await service.build_context("投标保证金", max_tokens=500)
+
+    assert "GeneralSearch" in context
+    assert "ProductSearch" not in context
+    assert service.stats()["timeouts"] == 1
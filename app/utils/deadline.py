@@ -0,0 +1,75 @@
+"""
+请求截止时间：在一次请求的各处理阶段之间传递剩余时间预算
+
+各阶段根据剩余预算决定是否执行、以多长超时执行；因预算不足被跳过或超时的可选阶段
+记录在 skipped_stages 中，便于在响应中说明本次回复经过了哪些降级。
+"""
+import time
+from typing import Iterable, List, Optional
+
+
+# 可选阶段可用时间低于该值时直接跳过（秒）
+MIN_STAGE_SECONDS = 0.5
+
+
+class DeadlineExceeded(Exception):
+    """请求已超过截止时间"""
+
+
+class Deadline:
+    def __init__(self, budget: float, disabled_stages: Iterable[str] = ()):
+        """
+        Args:
+            budget: 从现在起的总时间预算（秒）
+            disabled_stages: 无论剩余时间多少都直接跳过的阶段（如过载降级）
+        """
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+        self.disabled_stages = set(disabled_stages)
+        self.skipped_stages: List[str] = []
+
+    def remaining(self) -> float:
+        """剩余时间（秒），已过期时为 0"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def allows(self, min_remaining: float) -> bool:
+        """剩余时间是否足以执行一个需要保留 min_remaining 秒的阶段"""
+        return self.remaining() > min_remaining
+
+    def timeout(self, stage_timeout: Optional[float] = None, reserve: float = 0.0) -> float:
+        """
+        计算阶段超时：不超过阶段自身上限，也不超过扣除预留后的剩余时间
+
+        Args:
+            stage_timeout: 阶段自身的超时上限
+            reserve: 需要为后续阶段预留的时间
+        """
+        available = max(0.0, self.remaining() - reserve)
+        if stage_timeout is None:
+            return available
+        return min(stage_timeout, available)
+
+    def stage_budget(self, stage: str, stage_timeout: float, reserve: float = 0.0) -> Optional[float]:
+        """
+        为可选阶段分配超时，阶段已被关闭或剩余时间不足时记录跳过
+
+        Returns:
+            float | None: 阶段超时（秒），None 表示应跳过该阶段
+        """
+        if stage in self.disabled_stages:
+            self.skip(stage)
+            return None
+        timeout = self.timeout(stage_timeout, reserve)
+        if timeout < MIN_STAGE_SECONDS:
+            self.skip(stage)
+            return None
+        return timeout
+
+    def skip(self, stage: str) -> None:
+        """记录被跳过的阶段"""
+        if stage not in self.skipped_stages:
+            self.skipped_stages.append(stage)
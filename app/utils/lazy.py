@@ -0,0 +1,70 @@
+"""
+延迟构造的全局服务：模块导入时只登记构造函数，首次访问属性时才创建实例
+
+各服务模块仍以 `xxx_service = LazyService(...)` 的形式导出全局实例，调用方的导入方式不变；
+导入 app.main 不再创建客户端、加载词典或导入重量级依赖。应用启动后由 warm_up() 在后台线程
+中预先构造，首个请求通常无需等待。
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, List
+
+logger = logging.getLogger(__name__)
+
+_registry: List["LazyService"] = []
+
+
+class LazyService:
+    """服务实例的代理，首次访问属性时构造（线程安全）"""
+
+    def __init__(self, factory: Callable[[], Any], name: str):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+        _registry.append(self)
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def resolve(self) -> Any:
+        """返回服务实例，尚未构造时先构造"""
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    started = time.perf_counter()
+                    instance = self._factory()
+                    object.__setattr__(self, "_instance", instance)
+                    logger.info(f"{self._name} 初始化完成，耗时{(time.perf_counter() - started) * 1000:.0f}ms")
+        return instance
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.resolve(), name, value)
+
+    def __delattr__(self, name: str) -> None:
+        delattr(self.resolve(), name)
+
+    def __repr__(self) -> str:
+        state = "已初始化" if self.initialized else "未初始化"
+        return f"<LazyService {self._name}（{state}）>"
+
+
+def warm_up() -> None:
+    """构造所有已登记的服务（在线程池中调用，单个服务失败不影响其他服务）"""
+    for service in list(_registry):
+        try:
+            service.resolve()
+        except Exception as e:
+            logger.error(f"{service._name} 预初始化失败: {str(e)}")
+
+
+def initialized_services() -> List[Any]:
+    """已构造的服务实例"""
+    return [service._instance for service in _registry if service.initialized]
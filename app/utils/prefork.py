@@ -0,0 +1,108 @@
+"""
+预 fork 多进程服务：主进程监听端口并准备只读数据，再 fork 出多个 uvicorn 工作进程共享监听套接字
+
+fork 之前执行 gc.freeze()，主进程中已创建的对象不再被垃圾回收扫描，
+避免回收时改写对象头导致写时复制的内存页在每个工作进程中被复制一份。
+退出的工作进程（如达到 limit_max_requests）由主进程补足；收到 SIGTERM / SIGINT 时通知全部工作进程退出。
+"""
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Any, Callable, Dict, Optional
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+# 工作进程异常退出后重新拉起前的等待时间（秒），避免启动即崩溃时频繁重启
+RESTART_DELAY = 1.0
+
+
+def _listen(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve(
+    app: Any,
+    workers: int,
+    host: str,
+    port: int,
+    before_fork: Optional[Callable[[], None]] = None,
+    after_fork: Optional[Callable[[int, int], None]] = None,
+    **uvicorn_options: Any
+) -> None:
+    """
+    以 workers 个工作进程运行 ASGI 应用
+
+    Args:
+        before_fork: 在主进程中、fork 之前执行（准备共享的只读数据）
+        after_fork: 在每个工作进程中执行，参数为 (工作进程序号, 工作进程数)
+        uvicorn_options: 传给 uvicorn.Config 的其他参数
+    """
+    sock = _listen(host, port)
+    if before_fork:
+        before_fork()
+    gc.freeze()
+
+    children: Dict[int, int] = {}  # pid -> 工作进程序号
+    stopping = False
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                if after_fork:
+                    after_fork(index, workers)
+                server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, **uvicorn_options))
+                server.run(sockets=[sock])
+            except BaseException as e:
+                logger.error(f"工作进程{index}异常退出: {str(e)}")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = index
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info(f"主进程{os.getpid()}监听 {host}:{port}，启动{workers}个工作进程")
+    for index in range(workers):
+        spawn(index)
+
+    try:
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = children.pop(pid, None)
+            if index is None or stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            logger.warning(f"工作进程{index}（pid {pid}）已退出（退出码{code}），重新启动")
+            if code != 0:
+                time.sleep(RESTART_DELAY)
+            if not stopping:
+                spawn(index)
+    finally:
+        sock.close()
+        logger.info("全部工作进程已退出")
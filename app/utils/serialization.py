@@ -0,0 +1,29 @@
+"""
+JSON 序列化工具：统一使用 orjson 进行快速编码
+"""
+import asyncio
+from typing import Any
+
+import orjson
+
+# 超过该条目数的列表在线程池中编码，避免阻塞事件循环
+OFFLOAD_THRESHOLD = 200
+
+
+def dumps(data: Any) -> bytes:
+    """将数据编码为 UTF-8 JSON 字节串（不转义中文）"""
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+
+def ndjson_line(data: Any) -> bytes:
+    """编码为一行 NDJSON"""
+    return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+
+
+async def dumps_async(data: Any, item_count: int = None) -> bytes:
+    """大数据量时在线程池中编码，item_count 未指定时取列表长度"""
+    if item_count is None:
+        item_count = len(data) if isinstance(data, list) else 0
+    if item_count > OFFLOAD_THRESHOLD:
+        return await asyncio.to_thread(dumps, data)
+    return dumps(data)
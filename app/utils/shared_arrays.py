@@ -0,0 +1,66 @@
+"""
+只读数据的内存映射存储：一组 numpy 数组以 .npy 文件保存在同一目录，按需以 mmap 方式打开
+
+多个工作进程映射同一组文件时共享操作系统页缓存，数据在物理内存中只有一份，
+打开时也无需反序列化。字符串列表打包为 UTF-8 字节块与偏移数组后同样可以映射。
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+MANIFEST = "manifest.json"
+
+
+def save_arrays(directory: str, arrays: Dict[str, np.ndarray], meta: Optional[Dict] = None) -> None:
+    """保存数组与元数据；清单最后写入，读取方看到清单时数组文件均已写完"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(directory / f"{name}.npy", np.ascontiguousarray(array))
+    manifest = directory / MANIFEST
+    temp = manifest.with_suffix(".tmp")
+    temp.write_text(json.dumps({"arrays": list(arrays), "meta": meta or {}}, ensure_ascii=False), encoding="utf-8")
+    os.replace(temp, manifest)
+
+
+def load_arrays(directory: str) -> Optional[Tuple[Dict[str, np.ndarray], Dict]]:
+    """
+    以只读 mmap 方式打开 save_arrays 保存的数组
+
+    Returns:
+        (数组, 元数据)；目录中没有清单时返回 None
+    """
+    directory = Path(directory)
+    manifest = directory / MANIFEST
+    if not manifest.exists():
+        return None
+    data = json.loads(manifest.read_text(encoding="utf-8"))
+    arrays = {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in data["arrays"]}
+    return arrays, data["meta"]
+
+
+def pack_strings(strings: Iterable[str], prefix: str) -> Dict[str, np.ndarray]:
+    """将字符串列表打包为 {prefix}_blob（UTF-8 字节）与 {prefix}_offsets 两个数组"""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return {f"{prefix}_blob": blob, f"{prefix}_offsets": offsets}
+
+
+class StringTable:
+    """pack_strings 打包的字符串列表，按下标读取时才解码"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], prefix: str):
+        self._blob = arrays[f"{prefix}_blob"]
+        self._offsets = arrays[f"{prefix}_offsets"]
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return self._blob[start:end].tobytes().decode("utf-8")
@@ -0,0 +1,69 @@
+"""
+请求合并（single-flight）工具：相同 key 的并发调用共享同一个进行中的任务
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        # key -> [进行中的任务, 被合并的调用方数量]
+        self._inflight: Dict[Hashable, list] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.max_coalesced = 0
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行 fn，若相同 key 的调用正在进行则等待其结果
+
+        实际工作在独立任务中运行，发起者被取消不会影响其他等待者。
+
+        Args:
+            key: 合并键，相同 key 视为相同请求
+            fn: 返回协程的无参函数
+
+        Returns:
+            fn 的执行结果（异常同样会传播给所有等待者）
+        """
+        call = self._inflight.get(key)
+        if call is not None:
+            call[1] += 1
+            self.coalesced += 1
+            return await asyncio.shield(call[0])
+
+        task = asyncio.ensure_future(fn())
+        call = [task, 0]
+        self._inflight[key] = call
+        self.calls += 1
+        task.add_done_callback(lambda _: self._finish(key, call))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, call: list) -> None:
+        """任务完成后移除并记录合并数量"""
+        if self._inflight.get(key) is call:
+            del self._inflight[key]
+        waiters = call[1]
+        if waiters:
+            self.max_coalesced = max(self.max_coalesced, waiters)
+            logger.info(f"{self.name}: 本次调用合并了{waiters}个相同的并发请求")
+        # 所有调用方均已取消时避免出现未获取的异常告警
+        if not call[0].cancelled():
+            call[0].exception()
+
+    def stats(self) -> Dict[str, int]:
+        """返回合并统计"""
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "max_coalesced": self.max_coalesced,
+            "inflight": self.inflight
+        }
@@ -1,14 +1,37 @@
+import shutil
+import tempfile
 
 import uvicorn
+from app.config import settings
 from app.main import app
 
+UVICORN_OPTIONS = dict(
+    log_level="info",
+    timeout_keep_alive=30,
+    limit_concurrency=1000,  # 兜底上限；聊天请求的排队与拒绝由准入控制处理
+    limit_max_requests=10000
+)
+
 if __name__ == "__main__":
-    uvicorn.run(
-        app,
-        host="0.0.0.0",
-        port=3000,
-        log_level="info",
-        timeout_keep_alive=30,
-        limit_concurrency=100,
-        limit_max_requests=10000
-    )
+    if settings.WEB_WORKERS > 1:
+        # 多进程部署：只读数据由主进程准备一次，各工作进程共享
+        from app.services.shared_data import init_worker, prepare_shared_data
+        from app.utils.prefork import serve
+
+        temporary = not settings.SHARED_DATA_DIR
+        shared_dir = settings.SHARED_DATA_DIR or tempfile.mkdtemp(prefix="ai_chat_shared_")
+        try:
+            serve(
+                app,
+                workers=settings.WEB_WORKERS,
+                host="0.0.0.0",
+                port=3000,
+                before_fork=lambda: prepare_shared_data(shared_dir),
+                after_fork=init_worker,
+                **UVICORN_OPTIONS
+            )
+        finally:
+            if temporary:
+                shutil.rmtree(shared_dir, ignore_errors=True)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=3000, **UVICORN_OPTIONS)